@@ -0,0 +1,412 @@
+"""
+Módulo de índice local de avisos de segurança (updateinfo.xml do dnf)
+
+Os metadados que o dnf já baixou para /var/cache/dnf (ou /var/cache/libdnf5)
+incluem o updateinfo.xml de cada repositório. Este módulo lê esses arquivos
+com um parser XML em streaming (memória constante mesmo com dezenas de MB)
+e grava avisos, CVEs, severidades e NEVRAs corrigidos em um SQLite indexado
+no diretório de estado. O índice só é reconstruído quando o conjunto de
+arquivos de metadados muda (caminho, tamanho e mtime), e casar os pacotes
+instalados contra ele é uma consulta local, sem rede e sem subir o dnf.
+
+No Fedora o dnf4/dnf5 usa zchunk por padrão e o updateinfo.xml.zck é o
+único arquivo baixado; ele é descomprimido com o unzck (pacote zchunk).
+Sem o unzck, o índice é reportado como indisponível em vez de vazio
+(alternativa: zchunk=False no dnf.conf, para o dnf baixar o .xml.xz).
+"""
+import bz2
+import glob
+import gzip
+import hashlib
+import lzma
+import os
+import re
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+import xml.etree.ElementTree as ET
+from contextlib import contextmanager
+from typing import Dict, List, Any, Optional, Iterator, Tuple
+
+from .packages import compare_evr, format_nevra, newest_by_name_arch, package_evr
+from .state import get_state_path
+
+# Import condicional do zstandard (metadados .zst do dnf5)
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+    zstandard = None
+
+
+ADVISORY_CACHE_DIRS = ["/var/cache/dnf", "/var/cache/libdnf5"]
+
+INDEX_FILE = "advisories.sqlite"
+
+# Incrementar quando o esquema mudar força a reconstrução
+INDEX_SCHEMA_VERSION = "1"
+
+CVE_PATTERN = re.compile(r'CVE-\d{4}-\d{4,}')
+
+# Sufixo do diretório de cache do dnf: <repoid>-<hash de 16 hex>
+REPO_DIR_SUFFIX = re.compile(r'-[0-9a-f]{16}$')
+
+INSERT_BATCH_SIZE = 5000
+
+# Ordem de severidade dos avisos do Fedora/RHEL
+SEVERITY_ORDER = {
+    "Critical": 0,
+    "Important": 1,
+    "Moderate": 2,
+    "Low": 3,
+    "None": 4
+}
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE advisories (
+    id TEXT PRIMARY KEY,
+    type TEXT,
+    severity TEXT,
+    title TEXT,
+    issued TEXT,
+    repo TEXT
+);
+CREATE TABLE advisory_packages (
+    advisory_id TEXT,
+    name TEXT,
+    epoch INTEGER,
+    version TEXT,
+    release TEXT,
+    arch TEXT
+);
+CREATE TABLE advisory_cves (advisory_id TEXT, cve TEXT);
+"""
+
+INDEXES = """
+CREATE INDEX idx_packages_name ON advisory_packages (name);
+CREATE INDEX idx_cves_advisory ON advisory_cves (advisory_id);
+CREATE INDEX idx_cves_cve ON advisory_cves (cve);
+"""
+
+
+def find_updateinfo_files(cache_dirs: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Localiza o updateinfo mais recente de cada repositório em cache
+
+    Returns:
+        Lista de {repo, path, size, mtime_ns}
+    """
+    by_repo = {}
+    for cache_dir in cache_dirs or ADVISORY_CACHE_DIRS:
+        for path in glob.glob(os.path.join(cache_dir, "*", "repodata", "*updateinfo.xml*")):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            repo = REPO_DIR_SUFFIX.sub("", os.path.basename(os.path.dirname(os.path.dirname(path))))
+            current = by_repo.get(repo)
+            if current is None or st.st_mtime_ns > current["mtime_ns"]:
+                by_repo[repo] = {"repo": repo, "path": path, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+    return sorted(by_repo.values(), key=lambda f: f["repo"])
+
+
+def metadata_fingerprint(files: List[Dict[str, Any]]) -> str:
+    """Hash do conjunto de arquivos de metadados (muda quando o dnf baixa novos)"""
+    digest = hashlib.sha256(INDEX_SCHEMA_VERSION.encode())
+    for f in files:
+        digest.update(f"{f['path']}\0{f['size']}\0{f['mtime_ns']}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+@contextmanager
+def _unzck_stream(path: str):
+    """Conteúdo de um arquivo zchunk via unzck --stdout (sem arquivo temporário)"""
+    proc = subprocess.Popen(["unzck", "--stdout", path], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        yield proc.stdout
+    finally:
+        proc.stdout.close()
+        returncode = proc.wait()
+    if returncode != 0:
+        raise RuntimeError(f"unzck falhou ({returncode}) em {path}")
+
+
+def open_metadata(path: str):
+    """Abre arquivo de metadados descomprimindo conforme a extensão"""
+    if path.endswith(".zck"):
+        return _unzck_stream(path)
+    if path.endswith(".gz"):
+        return gzip.open(path, 'rb')
+    if path.endswith(".xz") or path.endswith(".lzma"):
+        return lzma.open(path, 'rb')
+    if path.endswith(".bz2"):
+        return bz2.open(path, 'rb')
+    if path.endswith(".zst"):
+        if not ZSTD_AVAILABLE:
+            raise RuntimeError("zstandard não instalado (necessário para metadados .zst)")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    return open(path, 'rb')
+
+
+def iter_updateinfo(stream) -> Iterator[Dict[str, Any]]:
+    """
+    Percorre os <update> de um updateinfo.xml em streaming
+
+    Cada elemento é descartado assim que processado, então a memória usada
+    não depende do tamanho do arquivo.
+    """
+    context = ET.iterparse(stream, events=("start", "end"))
+    root = None
+
+    for event, elem in context:
+        if root is None and event == "start":
+            root = elem
+        if event != "end" or elem.tag != "update":
+            continue
+
+        advisory_id = (elem.findtext("id") or "").strip()
+        if advisory_id:
+            issued = elem.find("issued")
+            cves = set()
+            for reference in elem.iter("reference"):
+                for value in (reference.get("id", ""), reference.get("title", ""), reference.get("href", "")):
+                    cves.update(CVE_PATTERN.findall(value))
+
+            packages = []
+            for package in elem.iter("package"):
+                arch = package.get("arch", "")
+                if arch == "src":
+                    continue
+                epoch = package.get("epoch", "0")
+                packages.append((
+                    package.get("name", ""),
+                    int(epoch) if epoch.isdigit() else 0,
+                    package.get("version", ""),
+                    package.get("release", ""),
+                    arch
+                ))
+
+            yield {
+                "id": advisory_id,
+                "type": elem.get("type", "unknown"),
+                "severity": (elem.findtext("severity") or "None").strip() or "None",
+                "title": (elem.findtext("title") or "").strip(),
+                "issued": issued.get("date", "") if issued is not None else "",
+                "cves": sorted(cves),
+                "packages": packages
+            }
+
+        elem.clear()
+        if root is not None:
+            root.clear()
+
+
+def build_index(files: List[Dict[str, Any]], db_path: str, fingerprint: str) -> Dict[str, Any]:
+    """
+    Reconstrói o índice SQLite a partir dos updateinfo em cache
+
+    Grava em arquivo temporário exclusivo e troca de forma atômica, então um
+    leitor concorrente nunca vê um índice pela metade e duas construções
+    simultâneas (--prefetch e auditoria) não se atropelam. Se algum
+    repositório falhou, o fingerprint não é gravado e a próxima execução
+    tenta de novo.
+    """
+    directory, name = os.path.split(db_path)
+    fd, tmp_path = tempfile.mkstemp(prefix=f"{name}.", suffix=".tmp", dir=directory or ".")
+    os.close(fd)
+
+    stats = {"advisories": 0, "packages": 0, "cves": 0, "errors": []}
+    try:
+        _build_index_into(files, tmp_path, fingerprint, stats)
+        os.replace(tmp_path, db_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return stats
+
+
+def _build_index_into(files: List[Dict[str, Any]], tmp_path: str, fingerprint: str,
+                      stats: Dict[str, Any]) -> None:
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.executescript(SCHEMA)
+
+        for f in files:
+            advisories, packages, cves = [], [], []
+            try:
+                with open_metadata(f["path"]) as stream:
+                    for update in iter_updateinfo(stream):
+                        advisories.append((update["id"], update["type"], update["severity"],
+                                           update["title"], update["issued"], f["repo"]))
+                        packages.extend((update["id"],) + p for p in update["packages"])
+                        cves.extend((update["id"], cve) for cve in update["cves"])
+
+                        if len(packages) >= INSERT_BATCH_SIZE:
+                            _insert_batch(conn, advisories, packages, cves, stats)
+                            advisories, packages, cves = [], [], []
+            except (OSError, ET.ParseError, RuntimeError, EOFError, lzma.LZMAError) as e:
+                stats["errors"].append({"repo": f["repo"], "error": str(e)})
+            _insert_batch(conn, advisories, packages, cves, stats)
+
+        conn.executescript(INDEXES)
+        if not stats["errors"]:
+            conn.execute("INSERT INTO meta VALUES ('fingerprint', ?)", (fingerprint,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _insert_batch(conn: sqlite3.Connection, advisories: list, packages: list, cves: list,
+                  stats: Dict[str, Any]) -> None:
+    # O mesmo aviso pode aparecer em mais de um repositório (updates e updates-testing)
+    conn.executemany("INSERT OR IGNORE INTO advisories VALUES (?, ?, ?, ?, ?, ?)", advisories)
+    conn.executemany("INSERT INTO advisory_packages VALUES (?, ?, ?, ?, ?, ?)", packages)
+    conn.executemany("INSERT INTO advisory_cves VALUES (?, ?)", cves)
+    stats["advisories"] += len(advisories)
+    stats["packages"] += len(packages)
+    stats["cves"] += len(cves)
+
+
+def _index_fingerprint(db_path: str) -> Optional[str]:
+    try:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    except sqlite3.Error:
+        return None
+    try:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'fingerprint'").fetchone()
+        return row[0] if row else None
+    except sqlite3.Error:
+        return None
+    finally:
+        conn.close()
+
+
+def ensure_advisory_index(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Garante um índice atualizado com os metadados em cache
+
+    Returns:
+        Dicionário com path do índice, repositórios e se foi reconstruído
+    """
+    cache_dirs = config.get("monitoring", {}).get("advisory_cache_dirs", ADVISORY_CACHE_DIRS)
+    files = find_updateinfo_files(cache_dirs)
+    if not files:
+        return {"error": "Nenhum updateinfo em cache (execute 'dnf makecache')"}
+
+    # Um índice sem os repositórios zchunk diria "nenhum aviso" para eles
+    zchunk_repos = [f["repo"] for f in files if f["path"].endswith(".zck")]
+    if zchunk_repos and shutil.which("unzck") is None:
+        files = [f for f in files if not f["path"].endswith(".zck")]
+        if not files:
+            return {
+                "error": "Só há metadados zchunk (updateinfo.xml.zck) em cache e o unzck não está instalado "
+                         "(instale o pacote zchunk ou use zchunk=False no dnf.conf)",
+                "zchunk_repos": zchunk_repos
+            }
+    else:
+        zchunk_repos = []
+
+    db_path = str(get_state_path(config, INDEX_FILE))
+    fingerprint = metadata_fingerprint(files)
+    index = {
+        "path": db_path,
+        "repos": [f["repo"] for f in files],
+        "rebuilt": False
+    }
+    if zchunk_repos:
+        index["skipped_zchunk_repos"] = zchunk_repos
+
+    if _index_fingerprint(db_path) != fingerprint:
+        index["stats"] = build_index(files, db_path, fingerprint)
+        index["rebuilt"] = True
+
+    return index
+
+
+def match_advisories(db_path: str, installed: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Avisos que corrigem pacotes instalados (NEVRA do aviso mais novo que o instalado)
+
+    Compara com a versão mais nova instalada de cada (nome, arch); pacotes
+    noarch do aviso casam com o nome em qualquer arch.
+
+    Returns:
+        Lista de {advisory, type, severity, title, issued, packages, fixed_in, cves}
+    """
+    newest = newest_by_name_arch(installed)
+    by_name = {}
+    for (name, _), package in newest.items():
+        by_name.setdefault(name, []).append(package)
+
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        conn.execute("CREATE TEMP TABLE installed_names (name TEXT PRIMARY KEY)")
+        conn.executemany("INSERT INTO installed_names VALUES (?)", ((name,) for name in by_name))
+
+        matches = {}
+        rows = conn.execute("""
+            SELECT p.advisory_id, p.name, p.epoch, p.version, p.release, p.arch,
+                   a.type, a.severity, a.title, a.issued
+            FROM advisory_packages p
+            JOIN installed_names i ON i.name = p.name
+            JOIN advisories a ON a.id = p.advisory_id
+        """)
+        for advisory_id, name, epoch, version, release, arch, kind, severity, title, issued in rows:
+            fixed = {"name": name, "epoch": epoch, "version": version, "release": release, "arch": arch}
+            for package in by_name[name]:
+                if arch != "noarch" and package["arch"] != arch:
+                    continue
+                if compare_evr((epoch, version, release), package_evr(package)) <= 0:
+                    continue
+
+                match = matches.setdefault(advisory_id, {
+                    "advisory": advisory_id,
+                    "type": kind,
+                    "severity": severity,
+                    "title": title,
+                    "issued": issued,
+                    "packages": [],
+                    "fixed_in": [],
+                    "cves": []
+                })
+                nevra = format_nevra(package)
+                if nevra not in match["packages"]:
+                    match["packages"].append(nevra)
+                    match["fixed_in"].append(format_nevra(fixed))
+
+        if matches:
+            conn.execute("CREATE TEMP TABLE matched (advisory_id TEXT PRIMARY KEY)")
+            conn.executemany("INSERT INTO matched VALUES (?)", ((a,) for a in matches))
+            for advisory_id, cve in conn.execute(
+                    "SELECT c.advisory_id, c.cve FROM advisory_cves c JOIN matched m ON m.advisory_id = c.advisory_id"):
+                if cve not in matches[advisory_id]["cves"]:
+                    matches[advisory_id]["cves"].append(cve)
+    finally:
+        conn.close()
+
+    return sorted(matches.values(), key=lambda m: (SEVERITY_ORDER.get(m["severity"], 9), m["advisory"]))
+
+
+def get_applicable_advisories(config: Dict[str, Any],
+                              installed: List[Dict[str, Any]]) -> Tuple[Optional[List[Dict[str, Any]]], Dict[str, Any]]:
+    """
+    Atualiza o índice se necessário e casa os pacotes instalados contra ele
+
+    Returns:
+        (avisos aplicáveis ou None se o índice não está disponível, informações do índice)
+    """
+    index = ensure_advisory_index(config)
+    if "error" in index:
+        return None, index
+
+    try:
+        return match_advisories(index["path"], installed), index
+    except sqlite3.Error as e:
+        index["error"] = str(e)
+        return None, index
@@ -1,8 +1,12 @@
 """
 Módulo de geração de alertas de segurança
 """
+import ipaddress
 from typing import Dict, List, Any
 
+from .firewall_query import build_query_engine
+from .ports import SUSPICIOUS_PORTS
+
 
 def generate_alerts(metrics: Dict[str, Any], config: Dict[str, Any]) -> List[Dict[str, Any]]:
     """Gera alertas baseados nas métricas coletadas"""
@@ -32,6 +36,46 @@ def generate_alerts(metrics: Dict[str, Any], config: Dict[str, Any]) -> List[Dic
     if "permissions" in metrics:
         alerts.extend(_check_permissions_alerts(metrics["permissions"], config))
     
+    # Portas alcançáveis a partir de redes não confiáveis
+    if "firewall" in metrics and "exposure" in metrics:
+        alerts.extend(_check_reachability_alerts(metrics, config))
+    
+    return alerts
+
+
+def _check_reachability_alerts(metrics: Dict[str, Any], config: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Consulta a política do firewall para cada porta em escuta × redes não confiáveis"""
+    alerts = []
+    
+    untrusted = config.get("monitoring", {}).get("untrusted_networks", [])
+    listeners = [
+        entry for entry in metrics["exposure"].get("matrix", [])
+        if entry.get("exposure") not in ("local", "blocked")
+    ]
+    if not untrusted or not listeners or "error" in metrics["firewall"]:
+        return alerts
+    
+    try:
+        engine = build_query_engine(metrics["firewall"])
+    except Exception:
+        return alerts
+    
+    for entry in listeners:
+        for network in untrusted:
+            answer = engine.query(network, entry["port"], entry["protocol"], entry.get("interface"))
+            if answer.get("decision") == "denied":
+                continue
+            suspicious = entry["port"] in SUSPICIOUS_PORTS
+            scope = "inteiramente" if answer["decision"] == "allowed" else "parcialmente"
+            alerts.append({
+                "category": "firewall",
+                "severity": "critical" if suspicious else "warning",
+                "message": f"Porta {entry['port']}/{entry['protocol']} ({entry.get('process', 'unknown')}) "
+                           f"acessível {scope} a partir da rede não confiável {network}",
+                "details": answer,
+                "recommendation": "Restrinja a origem com uma rich rule ou remova o serviço/porta da zona"
+            })
+    
     return alerts
 
 
@@ -91,6 +135,57 @@ def _check_auth_alerts(auth_data: Dict[str, Any], config: Dict[str, Any]) -> Lis
                     "details": ip_info,
                     "recommendation": "Considere bloquear este IP no firewall"
                 })
+        
+        # Ataques distribuídos por subrede (muitos IPs, poucas tentativas cada)
+        for prefix_info in brute_force.get("suspicious_prefixes", [])[:5]:
+            try:
+                family = f"ipv{ipaddress.ip_network(prefix_info.get('prefix', ''), strict=False).version}"
+            except ValueError:
+                family = "ipv6" if ":" in prefix_info.get("prefix", "") else "ipv4"
+            alerts.append({
+                "category": "authentication",
+                "severity": prefix_info.get("severity", "warning"),
+                "message": (
+                    f"Ataque de força bruta distribuído da rede {prefix_info.get('prefix')} "
+                    f"({prefix_info.get('unique_sources')} IPs, {prefix_info.get('attempts')} tentativas)"
+                ),
+                "details": prefix_info,
+                "recommendation": (
+                    f"Considere bloquear a rede no firewall: sudo firewall-cmd --permanent "
+                    f"--add-rich-rule='rule family={family} source address={prefix_info.get('prefix')} reject'"
+                )
+            })
+    
+    # Comandos sudo nunca executados antes pelo usuário
+    sudo_usage = auth_data.get("sudo_usage", {})
+    if isinstance(sudo_usage, dict):
+        for new_cmd in sudo_usage.get("new_commands", [])[:10]:
+            alerts.append({
+                "category": "authentication",
+                "severity": new_cmd.get("severity", "warning"),
+                "message": f"Comando sudo inédito para {new_cmd.get('user')}: {' '.join(new_cmd.get('argv', []))[:120]}",
+                "details": new_cmd,
+                "recommendation": "Confirme se a execução foi legítima"
+            })
+    
+    # Logins a partir de origens/métodos nunca vistos para o usuário
+    reason_labels = {
+        "first_login": "primeiro login registrado",
+        "new_source": "origem nova",
+        "new_method": "método de autenticação novo",
+        "new_combination": "combinação origem/método inédita"
+    }
+    for anomaly in auth_data.get("login_anomalies", {}).get("anomalies", [])[:10]:
+        if anomaly.get("severity") != "warning":
+            continue
+        reasons = ", ".join(reason_labels.get(r, r) for r in anomaly.get("reasons", []))
+        alerts.append({
+            "category": "authentication",
+            "severity": "warning",
+            "message": f"Login de {anomaly.get('user')} via {anomaly.get('auth_method')} a partir de {anomaly.get('source_ip')} ({reasons})",
+            "details": anomaly,
+            "recommendation": "Confirme com o usuário se o acesso foi legítimo"
+        })
     
     # Configuração SSH insegura
     ssh_config = auth_data.get("ssh_config", {})
@@ -169,6 +264,17 @@ def _check_firewall_alerts(firewall_data: Dict[str, Any], config: Dict[str, Any]
                 "recommendation": "Habilite SELinux para maior segurança do sistema"
             })
     
+    # Modo em execução diferente do configurado: volta ao modo do arquivo no próximo boot
+    selinux = firewall_data.get("selinux", {})
+    if selinux.get("mode_matches_config") is False:
+        alerts.append({
+            "category": "firewall",
+            "severity": "warning",
+            "message": f"SELinux em {selinux.get('mode')} mas configurado como {selinux.get('config_mode')} "
+                       f"em /etc/selinux/config (muda no próximo boot)",
+            "recommendation": "Ajuste SELINUX= em /etc/selinux/config ou o modo atual (setenforce) para que coincidam"
+        })
+    
     # Avisos de configuração de firewall
     warnings = firewall_data.get("security_warnings", [])
     for warning in warnings:
@@ -180,6 +286,63 @@ def _check_firewall_alerts(firewall_data: Dict[str, Any], config: Dict[str, Any]
                 "details": warning
             })
     
+    # Regras nftables nunca alcançadas com veredito oposto ao da regra que as cobre
+    nftables = firewall_data.get("nftables", {})
+    for rule in nftables.get("shadowed", []):
+        if rule.get("conflicting_verdict"):
+            alerts.append({
+                "category": "firewall",
+                "severity": "warning",
+                "message": f"nftables {rule.get('table')}/{rule.get('chain')}: regra {rule.get('handle')} ({rule.get('rule')}) "
+                           f"nunca é aplicada, sombreada pela regra {rule.get('shadowed_by')}",
+                "details": rule,
+                "recommendation": "Reordene ou remova a regra sombreada (nft -a list chain mostra os handles)"
+            })
+    
+    for rule in nftables.get("broad_rules", []):
+        alerts.append({
+            "category": "firewall",
+            "severity": "warning",
+            "message": f"nftables {rule.get('table')}/{rule.get('chain')}: regra {rule.get('handle')} {rule.get('reason')}",
+            "details": rule,
+            "recommendation": "Restrinja a regra às portas e origens necessárias"
+        })
+    
+    # Negações SELinux nunca vistas antes
+    for denial in firewall_data.get("selinux_avc", {}).get("new_denials", []):
+        alerts.append({
+            "category": "firewall",
+            "severity": "info" if denial.get("permissive") else "warning",
+            "message": f"SELinux negou {denial['permission']} em {denial['tclass']} a {denial.get('comm') or 'processo'} "
+                       f"({denial['scontext']} → {denial['tcontext']}, {denial['count']}x)",
+            "details": denial,
+            "recommendation": "Investigue com: ausearch -m AVC -ts recent | audit2why"
+        })
+    
+    # Mudanças na configuração desde a última execução
+    changes = firewall_data.get("changes", {})
+    if "default_zone" in changes:
+        alerts.append({
+            "category": "firewall",
+            "severity": "warning",
+            "message": f"Zona padrão do firewall mudou de {changes['default_zone']['from']} para {changes['default_zone']['to']}",
+            "details": changes["default_zone"],
+            "recommendation": "Confirme se a mudança foi intencional"
+        })
+    for change in changes.get("zones", []):
+        # Liberar algo novo é mais relevante que remover
+        opened = change.get("change") == "added" or any(
+            change.get(field, {}).get("added")
+            for field in ("services", "ports", "protocols", "source_ports", "forward_ports", "rich_rules")
+        ) or change.get("target", {}).get("to") == "ACCEPT"
+        alerts.append({
+            "category": "firewall",
+            "severity": "warning" if opened else "info",
+            "message": f"Firewall - zona {change['zone']} alterada desde a última execução ({change['change']})",
+            "details": change,
+            "recommendation": "Confirme se a mudança foi intencional (firewall-cmd --list-all --zone=" + change["zone"] + ")"
+        })
+    
     return alerts
 
 
@@ -210,6 +373,66 @@ def _check_vulnerability_alerts(vuln_data: Dict[str, Any], config: Dict[str, Any
             "recommendation": "Reinicie o sistema para aplicar a atualização do kernel"
         })
     
+    # Processos ainda usando bibliotecas substituídas por atualizações
+    stale = vuln_data.get("stale_libraries", {})
+    if stale.get("affected_processes"):
+        units = stale.get("affected_units", [])
+        services = [u for u in units if u.endswith(".service")]
+        alerts.append({
+            "category": "vulnerabilities",
+            "severity": "warning",
+            "message": f"{stale['affected_processes']} processo(s) usando bibliotecas removidas por atualizações"
+                       + (f" ({len(units)} unidade(s) systemd)" if units else ""),
+            "recommendation": (f"Reinicie: sudo systemctl restart {' '.join(services[:10])}" if services
+                               else "Reinicie os processos afetados (ou o sistema)"),
+            "details": {"units": units, "entries": stale.get("entries", [])[:10]}
+        })
+    
+    # Dados de atualização antigos: as contagens acima podem estar subestimadas
+    age_hours = summary.get("update_data_age_hours")
+    max_age = config.get("monitoring", {}).get("update_data_max_age_hours", 48)
+    if age_hours is not None and age_hours > max_age:
+        alerts.append({
+            "category": "vulnerabilities",
+            "severity": "warning",
+            "message": f"Metadados de atualização com {age_hours:.0f} horas; avisos recentes podem não aparecer",
+            "recommendation": "Agende 'security_monitor.py --prefetch' (timer/cron) ou habilite o dnf-makecache.timer",
+            "details": vuln_data.get("data_freshness", {})
+        })
+    
+    # Pacotes rebaixados desde a última auditoria podem reintroduzir vulnerabilidades
+    last_change = vuln_data.get("package_changes", {}).get("last_change") or {}
+    if summary.get("packages_changed") and last_change.get("downgraded"):
+        downgraded = last_change["downgraded"]
+        alerts.append({
+            "category": "vulnerabilities",
+            "severity": "warning",
+            "message": f"{last_change['counts']['downgraded']} pacote(s) rebaixado(s) desde a última auditoria",
+            "recommendation": "Confirme que os downgrades foram intencionais (dnf history) e que não reabrem CVEs corrigidas",
+            "details": {"downgraded": downgraded[:20]}
+        })
+    
+    # Muito tempo sem atualização de segurança (ou sem atualização alguma)
+    days_security = summary.get("days_since_security_update")
+    days_update = summary.get("days_since_update")
+    max_days = config.get("monitoring", {}).get("max_days_without_security_update", 30)
+    if days_security is None and days_update is not None and days_update > max_days:
+        alerts.append({
+            "category": "vulnerabilities",
+            "severity": "warning",
+            "message": f"Sistema sem atualizações há {days_update} dias",
+            "recommendation": "Execute: sudo dnf upgrade --security",
+            "details": vuln_data.get("system_age", {})
+        })
+    elif days_security is not None and days_security > max_days:
+        alerts.append({
+            "category": "vulnerabilities",
+            "severity": "warning",
+            "message": f"Última atualização de segurança há {days_security} dias",
+            "recommendation": "Execute: sudo dnf upgrade --security",
+            "details": vuln_data.get("system_age", {})
+        })
+
     # Atualizações automáticas não configuradas
     if not summary.get("automatic_updates_enabled", False):
         alerts.append({
@@ -340,6 +563,67 @@ def _check_permissions_alerts(perms_data: Dict[str, Any], config: Dict[str, Any]
             "details": perms_data.get("world_writable_files", [])[:5]
         })
     
+    # Arquivos que ganharam SUID/SGID/world-writable desde a última varredura
+    for change in perms_data.get("permission_changes", [])[:20]:
+        privileged = "suid" in change.get("flags", []) or "sgid" in change.get("flags", [])
+        kind = "novo" if change.get("change") == "new" else "alterado"
+        alerts.append({
+            "category": "permissions",
+            "severity": "critical" if privileged else "warning",
+            "message": f"Arquivo {kind} com {'/'.join(change.get('flags', [])).upper()}: {change.get('path')} "
+                       f"({change.get('permissions')})",
+            "recommendation": "Confirme a origem do arquivo (rpm -qf / rpm -V) e remova o bit se não for esperado",
+            "details": change
+        })
+    
+    # Integridade: arquivos diferentes da linha de base
+    integrity = perms_data.get("integrity", {})
+    privileged_changes = [m for m in integrity.get("modified", []) if m.get("setuid")]
+    for entry in privileged_changes[:10]:
+        alerts.append({
+            "category": "permissions",
+            "severity": "critical",
+            "message": f"Binário SUID/SGID diferente da linha de base: {entry['path']} ({', '.join(entry['changes'])})",
+            "recommendation": "Verifique com rpm -V; se a mudança veio de uma atualização legítima, "
+                              "aceite com security_monitor.py --integrity-accept",
+            "details": entry
+        })
+    other_changes = integrity.get("counts", {}).get("modified", 0) - len(privileged_changes)
+    if other_changes > 0 or integrity.get("counts", {}).get("added") or integrity.get("counts", {}).get("removed"):
+        counts = integrity["counts"]
+        alerts.append({
+            "category": "permissions",
+            "severity": "warning",
+            "message": f"Integridade: {counts['modified']} alterado(s), {counts['added']} novo(s), "
+                       f"{counts['removed']} removido(s) desde a linha de base",
+            "recommendation": "Revise as mudanças; após atualizações legítimas execute security_monitor.py --integrity-accept",
+            "details": {
+                "modified": [m["path"] for m in integrity.get("modified", [])[:20]],
+                "added": [a["path"] for a in integrity.get("added", [])[:20]],
+                "removed": integrity.get("removed", [])[:20]
+            }
+        })
+    
+    # SUID/SGID sem pacote dono ou diferentes do que o rpmdb registra
+    verification = perms_data.get("suid_verification", {})
+    for entry in verification.get("unowned", [])[:10]:
+        alerts.append({
+            "category": "permissions",
+            "severity": "critical",
+            "message": f"Binário SUID/SGID sem pacote dono: {entry['path']} ({entry.get('permissions')})",
+            "recommendation": "Investigue a origem do arquivo; se não for esperado, remova o bit (chmod u-s,g-s) ou o arquivo",
+            "details": entry
+        })
+    for entry in verification.get("modified", [])[:10]:
+        alerts.append({
+            "category": "permissions",
+            "severity": "critical",
+            "message": f"Binário SUID/SGID difere do pacote {entry.get('package')}: {entry['path']} "
+                       f"({', '.join(entry['problems'])})",
+            "recommendation": f"Confira com rpm -Vf {entry['path']} e reinstale o pacote (dnf reinstall)",
+            "details": entry
+        })
+    
     # Problemas com chaves SSH
     ssh_issues = summary.get("ssh_key_issues", 0)
     if ssh_issues > 0:
@@ -4,11 +4,22 @@ Módulo de monitoramento de autenticação e acessos
 import subprocess
 import re
 from datetime import datetime, timedelta
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 
+from .ipnet import PrefixTrie
+from .login_history import analyze_login_sources
+from .state import load_state, save_state
 
-def get_failed_login_attempts(hours: int = 24) -> List[Dict[str, Any]]:
-    """Obtém tentativas de login falhas do journalctl"""
+
+# IPv4 ou IPv6 após "from" nas mensagens do sshd
+IP_PATTERN = re.compile(r'from\s+(\d{1,3}(?:\.\d{1,3}){3}|[0-9A-Fa-f]*:[0-9A-Fa-f:.]+)')
+
+# "Accepted publickey for alice from 203.0.113.5 port 22 ssh2"
+ACCEPTED_LOGIN_PATTERN = re.compile(r'Accepted\s+(\S+)\s+for\s+(\S+)\s+from\s+(\S+)')
+
+
+def get_failed_login_attempts(hours: int = 24, limit: Optional[int] = 100) -> List[Dict[str, Any]]:
+    """Obtém tentativas de login falhas do journalctl (limit=None retorna todas)"""
     failed_logins = []
     
     try:
@@ -28,7 +39,7 @@ def get_failed_login_attempts(hours: int = 24) -> List[Dict[str, Any]]:
                 # Padrões comuns de falha de SSH
                 if 'Failed password' in line or 'Invalid user' in line:
                     # Extrair IP se possível
-                    ip_match = re.search(r'from\s+(\d+\.\d+\.\d+\.\d+)', line)
+                    ip_match = IP_PATTERN.search(line)
                     user_match = re.search(r'for\s+(\w+)', line)
                     
                     failed_logins.append({
@@ -45,12 +56,37 @@ def get_failed_login_attempts(hours: int = 24) -> List[Dict[str, Any]]:
     except Exception as e:
         failed_logins.append({"error": str(e)})
     
-    # Limitar a 100 entradas mais recentes
-    return failed_logins[-100:]
+    # Limitar às entradas mais recentes
+    return failed_logins[-limit:] if limit else failed_logins
+
+
+def parse_accepted_login_line(line: str) -> Optional[Dict[str, Any]]:
+    """
+    Converte linha "Accepted <método> for <usuário> from <ip>" do sshd
+    (journalctl -o short-unix) em evento estruturado
+    """
+    match = ACCEPTED_LOGIN_PATTERN.search(line)
+    if not match:
+        return None
+
+    try:
+        timestamp = float(line.split(None, 1)[0])
+    except (ValueError, IndexError):
+        timestamp = 0.0
+
+    method, user, source_ip = match.groups()
+    return {
+        "timestamp": datetime.fromtimestamp(timestamp).isoformat() if timestamp else "unknown",
+        "timestamp_unix": timestamp,
+        "type": "ssh",
+        "auth_method": method,
+        "user": user,
+        "source_ip": source_ip
+    }
 
 
-def get_successful_logins(hours: int = 24) -> List[Dict[str, Any]]:
-    """Obtém logins bem-sucedidos recentes"""
+def get_successful_logins(hours: int = 24, limit: Optional[int] = 50) -> List[Dict[str, Any]]:
+    """Obtém logins bem-sucedidos recentes (limit=None retorna todos)"""
     successful_logins = []
     
     try:
@@ -59,7 +95,7 @@ def get_successful_logins(hours: int = 24) -> List[Dict[str, Any]]:
         
         # Buscar logins bem-sucedidos via SSH
         result = subprocess.run(
-            ['journalctl', '-u', 'sshd', '--since', since_str, '--no-pager'],
+            ['journalctl', '-u', 'sshd', '--since', since_str, '--no-pager', '-o', 'short-unix'],
             capture_output=True,
             text=True,
             timeout=30
@@ -67,60 +103,205 @@ def get_successful_logins(hours: int = 24) -> List[Dict[str, Any]]:
         
         if result.returncode == 0:
             for line in result.stdout.split('\n'):
-                if 'Accepted password' in line or 'Accepted publickey' in line:
-                    ip_match = re.search(r'from\s+(\d+\.\d+\.\d+\.\d+)', line)
-                    user_match = re.search(r'for\s+(\w+)', line)
-                    
-                    auth_type = "password" if "password" in line else "publickey"
-                    
-                    successful_logins.append({
-                        "timestamp": " ".join(line.split()[0:3]),
-                        "type": "ssh",
-                        "auth_method": auth_type,
-                        "user": user_match.group(1) if user_match else "unknown",
-                        "source_ip": ip_match.group(1) if ip_match else "unknown"
-                    })
+                login = parse_accepted_login_line(line)
+                if login:
+                    successful_logins.append(login)
     except Exception as e:
         successful_logins.append({"error": str(e)})
     
-    return successful_logins[-50:]  # Últimos 50
+    return successful_logins[-limit:] if limit else successful_logins
 
 
-def get_sudo_usage(hours: int = 24) -> List[Dict[str, Any]]:
-    """Obtém uso de sudo recente"""
-    sudo_commands = []
-    
+SUDO_LINE_PATTERN = re.compile(r'sudo\[\d+\]:\s+(\S+)\s*:\s*(.*)$')
+
+
+def parse_sudo_line(line: str) -> Optional[Dict[str, Any]]:
+    """
+    Converte linha de log do sudo (journalctl -o short-unix) em evento estruturado
+
+    Formato: <epoch> <host> sudo[pid]: <user> : [status ;] TTY=.. ; PWD=.. ; USER=.. ; COMMAND=..
+    """
+    if 'COMMAND=' not in line:
+        return None
+
+    match = SUDO_LINE_PATTERN.search(line)
+    if not match:
+        return None
+
+    invoking_user, rest = match.groups()
+
+    # COMMAND é sempre o último campo e pode conter " ; "
+    head, _, command = rest.partition('COMMAND=')
+    fields = {}
+    status_messages = []
+    for part in head.split(' ; '):
+        part = part.strip().rstrip(';').strip()
+        if not part:
+            continue
+        key, sep, value = part.partition('=')
+        if sep and key.isupper():
+            fields[key] = value
+        else:
+            status_messages.append(part)
+
+    status_text = " ".join(status_messages)
+    if 'incorrect password' in status_text:
+        status = "auth_failed"
+    elif 'NOT in sudoers' in status_text or 'not allowed' in status_text:
+        status = "not_allowed"
+    else:
+        status = "allowed"
+
+    argv = command.strip().split(' ')
+
     try:
-        since_time = datetime.now() - timedelta(hours=hours)
-        since_str = since_time.strftime('%Y-%m-%d %H:%M:%S')
+        timestamp = float(line.split(None, 1)[0])
+    except (ValueError, IndexError):
+        timestamp = 0.0
+
+    return {
+        "timestamp": datetime.fromtimestamp(timestamp).isoformat() if timestamp else "unknown",
+        "timestamp_unix": timestamp,
+        "user": invoking_user,
+        "target_user": fields.get('USER', 'root'),
+        "cwd": fields.get('PWD', 'unknown'),
+        "tty": fields.get('TTY', 'unknown'),
+        "command": argv[0],
+        "argv": argv,
+        "status": status
+    }
+
+
+def get_sudo_events(hours: int = 24) -> List[Dict[str, Any]]:
+    """Obtém eventos estruturados de sudo da janela de tempo"""
+    since_time = datetime.now() - timedelta(hours=hours)
+    since_str = since_time.strftime('%Y-%m-%d %H:%M:%S')
+    
+    result = subprocess.run(
+        ['journalctl', '_COMM=sudo', '--since', since_str, '--no-pager', '-o', 'short-unix'],
+        capture_output=True,
+        text=True,
+        timeout=30
+    )
+    
+    events = []
+    if result.returncode == 0:
+        for line in result.stdout.split('\n'):
+            event = parse_sudo_line(line)
+            if event:
+                events.append(event)
+    
+    return events
+
+
+def analyze_sudo_usage(events: List[Dict[str, Any]], config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Gera estatísticas por usuário e atualiza o histórico persistido de comandos
+    
+    O histórico guarda a contagem exata e o último uso de cada comando de
+    cada usuário (tabelas completas: cortar as menos usadas faria a contagem
+    recomeçar do zero); um comando ausente da tabela do usuário é inédito.
+    Só eventos mais novos que a última execução atualizam o histórico, então
+    janelas sobrepostas entre execuções não contam o mesmo evento duas vezes.
+    """
+    history = load_state(config, "sudo_history", default={}) or {}
+    user_tables = history.get("users", {})
+    last_timestamp = history.get("last_timestamp", 0.0)
+    is_baseline = not history
+    
+    by_user = {}
+    new_commands = []
+    newest_timestamp = last_timestamp
+    
+    for event in events:
+        user = event["user"]
+        command = event["command"]
         
-        result = subprocess.run(
-            ['journalctl', '_COMM=sudo', '--since', since_str, '--no-pager'],
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
+        # Estatísticas da janela atual
+        stats = by_user.setdefault(user, {
+            "user": user,
+            "events": 0,
+            "denied": 0,
+            "target_users": {},
+            "commands": {}
+        })
+        stats["events"] += 1
+        if event["status"] != "allowed":
+            stats["denied"] += 1
+        stats["target_users"][event["target_user"]] = stats["target_users"].get(event["target_user"], 0) + 1
+        stats["commands"][command] = stats["commands"].get(command, 0) + 1
         
-        if result.returncode == 0:
-            for line in result.stdout.split('\n'):
-                # Extrair comandos sudo
-                if 'COMMAND=' in line:
-                    user_match = re.search(r'USER=(\w+)', line)
-                    cmd_match = re.search(r'COMMAND=(.+)$', line)
-                    
-                    sudo_commands.append({
-                        "timestamp": " ".join(line.split()[0:3]),
-                        "user": user_match.group(1) if user_match else "unknown",
-                        "command": cmd_match.group(1) if cmd_match else "unknown"
-                    })
-    except Exception as e:
-        sudo_commands.append({"error": str(e)})
+        # Atualização incremental do histórico (apenas eventos novos e permitidos)
+        if event["timestamp_unix"] <= last_timestamp or event["status"] != "allowed":
+            continue
+        newest_timestamp = max(newest_timestamp, event["timestamp_unix"])
+        
+        table = user_tables.setdefault(user, {})
+        is_new = command not in table
+        entry = table.setdefault(command, [0, 0.0])
+        entry[0] += 1
+        entry[1] = event["timestamp_unix"]
+        
+        if is_new and not is_baseline:
+            new_commands.append({
+                "user": user,
+                "target_user": event["target_user"],
+                "command": command,
+                "argv": event["argv"],
+                "cwd": event["cwd"],
+                "timestamp": event["timestamp"],
+                "severity": "warning"
+            })
     
-    return sudo_commands[-50:]
+    save_state(config, "sudo_history", {
+        "last_timestamp": newest_timestamp,
+        "users": user_tables
+    })
+    
+    users = []
+    for user, stats in sorted(by_user.items(), key=lambda x: x[1]["events"], reverse=True):
+        table = user_tables.get(user, {})
+        stats["top_commands"] = [
+            {
+                "command": command,
+                "count": count,
+                "total_count": table.get(command, [count])[0]
+            }
+            for command, count in sorted(stats.pop("commands").items(), key=lambda x: x[1], reverse=True)[:10]
+        ]
+        users.append(stats)
+    
+    return {
+        "total_events": len(events),
+        "denied_events": sum(u["denied"] for u in users),
+        "by_user": users,
+        "new_commands": new_commands[:50],
+        "history": {
+            "baseline_created": is_baseline,
+            "users_tracked": len(user_tables),
+            "commands_tracked": sum(len(table) for table in user_tables.values())
+        }
+    }
+
+
+def get_sudo_usage(hours: int = 24, config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Obtém uso de sudo recente com estatísticas por usuário e comandos inéditos"""
+    try:
+        return analyze_sudo_usage(get_sudo_events(hours), config or {})
+    except Exception as e:
+        return {"error": str(e)}
 
 
-def analyze_brute_force_attempts(failed_logins: List[Dict[str, Any]]) -> Dict[str, Any]:
-    """Analisa tentativas de força bruta baseado em IPs"""
+def analyze_brute_force_attempts(failed_logins: List[Dict[str, Any]],
+                                 config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Analisa tentativas de força bruta por IP e por prefixo de rede"""
+    monitoring = (config or {}).get("monitoring", {})
+    prefix_lengths = monitoring.get("brute_force_prefix_lengths", {})
+    prefix_trie = PrefixTrie({
+        4: prefix_lengths.get("ipv4", [16, 24]),
+        6: prefix_lengths.get("ipv6", [48, 64])
+    })
+    
     ip_attempts = {}
     
     for login in failed_logins:
@@ -135,6 +316,9 @@ def analyze_brute_force_attempts(failed_logins: List[Dict[str, Any]]) -> Dict[st
                 ip_attempts[ip]['count'] += 1
                 if 'user' in login:
                     ip_attempts[ip]['users_attempted'].add(login['user'])
+                
+                # Agregar também por prefixo (ataques distribuídos por subrede)
+                prefix_trie.insert(ip, login.get('user'))
     
     # Identificar IPs suspeitos (mais de 5 tentativas)
     suspicious_ips = []
@@ -150,10 +334,18 @@ def analyze_brute_force_attempts(failed_logins: List[Dict[str, Any]]) -> Dict[st
     # Ordenar por número de tentativas
     suspicious_ips.sort(key=lambda x: x['attempts'], reverse=True)
     
+    # Identificar prefixos quentes (muitas origens, poucas tentativas cada)
+    suspicious_prefixes = prefix_trie.hot_prefixes(
+        monitoring.get("brute_force_prefix_min_attempts", 20),
+        monitoring.get("brute_force_prefix_min_sources", 5)
+    )
+    
     return {
         "total_unique_ips": len(ip_attempts),
         "suspicious_ips": suspicious_ips[:20],  # Top 20
-        "brute_force_detected": len(suspicious_ips) > 0
+        "suspicious_prefixes": suspicious_prefixes[:20],
+        "distributed_attack_detected": len(suspicious_prefixes) > 0,
+        "brute_force_detected": len(suspicious_ips) > 0 or len(suspicious_prefixes) > 0
     }
 
 
@@ -252,16 +444,25 @@ def collect_auth_metrics(config: Dict[str, Any]) -> Dict[str, Any]:
     
     hours = config.get("monitoring", {}).get("auth_check_hours", 24)
     
+    failed_count = 0
     if config.get("monitoring", {}).get("check_failed_logins", True):
-        failed_logins = get_failed_login_attempts(hours)
-        metrics["failed_logins"] = failed_logins
-        metrics["brute_force_analysis"] = analyze_brute_force_attempts(failed_logins)
+        # Analisar todas as tentativas, mas guardar apenas as 100 mais recentes
+        failed_logins = get_failed_login_attempts(hours, limit=None)
+        failed_count = len([l for l in failed_logins if "error" not in l])
+        metrics["failed_logins"] = failed_logins[-100:]
+        metrics["brute_force_analysis"] = analyze_brute_force_attempts(failed_logins, config)
     
     if config.get("monitoring", {}).get("check_successful_logins", True):
-        metrics["successful_logins"] = get_successful_logins(hours)
+        # Histórico de origens usa todos os logins; relatório guarda os 50 mais recentes
+        successful_logins = get_successful_logins(hours, limit=None)
+        metrics["successful_logins"] = successful_logins[-50:]
+        try:
+            metrics["login_anomalies"] = analyze_login_sources(successful_logins, config)
+        except Exception as e:
+            metrics["login_anomalies"] = {"error": str(e)}
     
     if config.get("monitoring", {}).get("check_sudo_usage", True):
-        metrics["sudo_usage"] = get_sudo_usage(hours)
+        metrics["sudo_usage"] = get_sudo_usage(hours, config)
     
     if config.get("monitoring", {}).get("check_active_sessions", True):
         metrics["active_sessions"] = get_active_sessions()
@@ -271,11 +472,15 @@ def collect_auth_metrics(config: Dict[str, Any]) -> Dict[str, Any]:
     
     # Resumo
     metrics["summary"] = {
-        "failed_login_attempts": len([l for l in metrics.get("failed_logins", []) if "error" not in l]),
+        "failed_login_attempts": failed_count,
         "successful_logins": len([l for l in metrics.get("successful_logins", []) if "error" not in l]),
         "brute_force_detected": metrics.get("brute_force_analysis", {}).get("brute_force_detected", False),
         "suspicious_ips_count": len(metrics.get("brute_force_analysis", {}).get("suspicious_ips", [])),
-        "active_sessions": len([s for s in metrics.get("active_sessions", []) if "error" not in s])
+        "suspicious_prefixes_count": len(metrics.get("brute_force_analysis", {}).get("suspicious_prefixes", [])),
+        "active_sessions": len([s for s in metrics.get("active_sessions", []) if "error" not in s]),
+        "login_anomalies": metrics.get("login_anomalies", {}).get("anomalies_count", 0),
+        "sudo_events": metrics.get("sudo_usage", {}).get("total_events", 0),
+        "sudo_new_commands": len(metrics.get("sudo_usage", {}).get("new_commands", []))
     }
     
     return metrics
@@ -0,0 +1,77 @@
+"""
+Filtro de Bloom compacto para históricos persistidos ("já vi isto antes?")
+"""
+import base64
+import hashlib
+import zlib
+from typing import Dict, Any, Optional
+
+
+class BloomFilter:
+    """
+    Filtro de Bloom com double hashing sobre blake2b
+
+    Nunca produz falso negativo: um item adicionado sempre é encontrado.
+    Falsos positivos acontecem com probabilidade controlada pelo tamanho,
+    o que permite lembrar um histórico sem limite em espaço fixo.
+    """
+
+    def __init__(self, size_bits: int = 1 << 20, num_hashes: int = 7, bits: Optional[bytearray] = None):
+        self.size_bits = size_bits
+        self.num_hashes = num_hashes
+        self.bits = bits if bits is not None else bytearray((size_bits + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:], 'big') | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.size_bits
+
+    def add(self, item: str) -> bool:
+        """
+        Adiciona item ao filtro
+
+        Returns:
+            True se o item era novo (algum bit ainda não estava setado)
+        """
+        is_new = False
+        for position in self._positions(item):
+            byte, mask = position >> 3, 1 << (position & 7)
+            if not self.bits[byte] & mask:
+                self.bits[byte] |= mask
+                is_new = True
+        return is_new
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(item))
+
+    def fill_ratio(self) -> float:
+        """Fração de bits setados (indica quão perto da saturação está)"""
+        set_bits = bin(int.from_bytes(self.bits, 'big')).count('1')
+        return set_bits / self.size_bits
+
+    def false_positive_rate(self) -> float:
+        """Probabilidade estimada de falso positivo no estado atual"""
+        return self.fill_ratio() ** self.num_hashes
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serializa para JSON (bitmap comprimido com zlib + base64)"""
+        return {
+            "size_bits": self.size_bits,
+            "num_hashes": self.num_hashes,
+            "bits": base64.b64encode(zlib.compress(bytes(self.bits))).decode('ascii')
+        }
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]], size_bits: int = 1 << 20,
+                  num_hashes: int = 7) -> 'BloomFilter':
+        """Restaura filtro serializado (ou cria um vazio se ausente/inválido)"""
+        if not data:
+            return cls(size_bits, num_hashes)
+
+        try:
+            bits = bytearray(zlib.decompress(base64.b64decode(data["bits"])))
+            return cls(data["size_bits"], data["num_hashes"], bits)
+        except (KeyError, ValueError, TypeError, zlib.error):
+            return cls(size_bits, num_hashes)
@@ -0,0 +1,187 @@
+"""
+Módulo de leitura do histórico de transações do dnf (SQLite)
+
+Lê direto o banco de histórico do dnf4 (/var/lib/dnf/history.sqlite) ou do
+dnf5 (/usr/lib/sysimage/libdnf5/transaction_history.sqlite), sem subir o
+dnf. As consultas andam pela chave primária das transações (id crescente
+no tempo) do fim para o começo e param na primeira que interessa.
+"""
+import sqlite3
+import os
+import time
+from datetime import datetime
+from typing import Dict, Any, Optional, Tuple
+
+
+DNF_HISTORY_DBS = [
+    ("dnf5", "/usr/lib/sysimage/libdnf5/transaction_history.sqlite"),
+    ("dnf4", "/var/lib/dnf/history.sqlite")
+]
+
+# Consultas por versão do esquema: transações concluídas com atualização de
+# pacotes (mais novas primeiro) e os pacotes atualizados de uma transação
+HISTORY_QUERIES = {
+    "dnf4": {
+        "last_transaction": "SELECT id, dt_begin, cmdline FROM trans WHERE state = 1 ORDER BY id DESC LIMIT 1",
+        "update_transactions": """
+            SELECT t.id, t.dt_begin, t.cmdline FROM trans t
+            WHERE t.state = 1 AND t.dt_begin >= ?
+              AND EXISTS (SELECT 1 FROM trans_item ti WHERE ti.trans_id = t.id AND ti.action = 6)
+            ORDER BY t.id DESC
+        """,
+        "upgraded_packages": """
+            SELECT r.name, r.epoch, r.version, r.release, r.arch
+            FROM trans_item ti JOIN rpm r ON r.item_id = ti.item_id
+            WHERE ti.trans_id = ? AND ti.action = 6
+        """
+    },
+    "dnf5": {
+        "last_transaction": """
+            SELECT id, dt_begin, description FROM trans
+            WHERE state_id = (SELECT id FROM trans_state WHERE name = 'Ok')
+            ORDER BY id DESC LIMIT 1
+        """,
+        "update_transactions": """
+            SELECT t.id, t.dt_begin, t.description FROM trans t
+            WHERE t.state_id = (SELECT id FROM trans_state WHERE name = 'Ok') AND t.dt_begin >= ?
+              AND EXISTS (
+                  SELECT 1 FROM trans_item ti WHERE ti.trans_id = t.id
+                    AND ti.action_id = (SELECT id FROM trans_item_action WHERE name = 'Upgrade'))
+            ORDER BY t.id DESC
+        """,
+        "upgraded_packages": """
+            SELECT r.name, r.epoch, r.version, r.release, r.arch
+            FROM trans_item ti JOIN rpm r ON r.item_id = ti.item_id
+            WHERE ti.trans_id = ?
+              AND ti.action_id = (SELECT id FROM trans_item_action WHERE name = 'Upgrade')
+        """
+    }
+}
+
+# Janela usada para frequência de atualização e busca da última de segurança
+HISTORY_WINDOW_DAYS = 90
+
+
+def find_history_db(config: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+    """
+    Banco de histórico em uso (o mais recentemente modificado, se houver os dois)
+
+    Returns:
+        (esquema, caminho) ou None
+    """
+    configured = config.get("monitoring", {}).get("dnf_history_db")
+    candidates = [(schema, configured) for schema, _ in DNF_HISTORY_DBS] if configured else DNF_HISTORY_DBS
+
+    found = []
+    for schema, path in candidates:
+        try:
+            conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        except sqlite3.Error:
+            continue
+        try:
+            # O esquema é identificado pela tabela que só o dnf5 tem
+            is_dnf5 = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'trans_state'").fetchone()
+            if (schema == "dnf5") == bool(is_dnf5):
+                found.append((os.stat(path).st_mtime, schema, path))
+        except (sqlite3.Error, OSError):
+            pass
+        finally:
+            conn.close()
+
+    if not found:
+        return None
+    _, schema, path = max(found)
+    return schema, path
+
+
+def _is_security_transaction(conn: sqlite3.Connection, queries: Dict[str, str], trans_id: int,
+                             cmdline: str, advisory_db: Optional[str]) -> bool:
+    """Transação aplicou correção de segurança (--security ou pacote de aviso de segurança)"""
+    if cmdline and "--security" in cmdline:
+        return True
+    if not advisory_db:
+        return False
+
+    packages = conn.execute(queries["upgraded_packages"], (trans_id,)).fetchall()
+    if not packages:
+        return False
+
+    advisories = sqlite3.connect(f"file:{advisory_db}?mode=ro", uri=True)
+    try:
+        for name, epoch, version, release, arch in packages:
+            row = advisories.execute("""
+                SELECT 1 FROM advisory_packages p JOIN advisories a ON a.id = p.advisory_id
+                WHERE p.name = ? AND p.version = ? AND p.release = ? AND a.type = 'security'
+                LIMIT 1
+            """, (name, version, release)).fetchone()
+            if row:
+                return True
+    finally:
+        advisories.close()
+    return False
+
+
+def _format_time(timestamp: Optional[int]) -> Optional[str]:
+    return datetime.fromtimestamp(timestamp).isoformat() if timestamp else None
+
+
+def _days_since(timestamp: Optional[int], now: float) -> Optional[int]:
+    return int((now - timestamp) // 86400) if timestamp else None
+
+
+def read_update_history(config: Dict[str, Any], advisory_db: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Última transação, última atualização, última atualização de segurança e frequência
+
+    Args:
+        config: Configuração do monitor
+        advisory_db: Índice de avisos (advisories.sqlite) para reconhecer
+                     atualizações de segurança feitas sem --security
+    """
+    located = find_history_db(config)
+    if located is None:
+        return {"error": "Histórico do dnf não encontrado"}
+    schema, path = located
+    queries = HISTORY_QUERIES[schema]
+
+    now = time.time()
+    since = int(now - HISTORY_WINDOW_DAYS * 86400)
+    history = {"source": schema}
+
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        last = conn.execute(queries["last_transaction"]).fetchone()
+        updates = conn.execute(queries["update_transactions"], (since,)).fetchall()
+
+        # Fora da janela: só a última atualização interessa
+        if not updates:
+            updates = conn.execute(queries["update_transactions"], (0,)).fetchmany(1)
+
+        last_security = None
+        for trans_id, dt_begin, cmdline in updates:
+            if _is_security_transaction(conn, queries, trans_id, cmdline, advisory_db):
+                last_security = dt_begin
+                break
+    except sqlite3.Error as e:
+        return {"error": str(e), "source": schema}
+    finally:
+        conn.close()
+
+    last_update = updates[0][1] if updates else None
+    history.update({
+        "last_transaction": _format_time(last[1]) if last else None,
+        "last_update": _format_time(last_update),
+        "days_since_update": _days_since(last_update, now),
+        "last_security_update": _format_time(last_security),
+        "days_since_security_update": _days_since(last_security, now)
+    })
+
+    # Frequência: transações de atualização na janela e intervalo médio entre elas
+    recent = sorted(dt for _, dt, _ in updates if dt >= since)
+    history["updates_last_30_days"] = sum(1 for dt in recent if dt >= now - 30 * 86400)
+    history[f"updates_last_{HISTORY_WINDOW_DAYS}_days"] = len(recent)
+    if len(recent) >= 2:
+        history["mean_days_between_updates"] = round((recent[-1] - recent[0]) / (len(recent) - 1) / 86400, 1)
+
+    return history
@@ -0,0 +1,349 @@
+"""
+Módulo de exposição: cruza sockets em escuta com a política do firewalld
+
+Roda depois da coleta, sobre as métricas já coletadas de portas e firewall.
+A política das zonas é compilada uma vez em um índice (protocolo, porta) ->
+regras que liberam, com árvores de intervalos para faixas de portas, então
+cada socket é resolvido com consultas diretas em vez de varrer todas as
+zonas, serviços e rich rules.
+"""
+import re
+import socket
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Dict, List, Any, Optional
+
+import psutil
+
+from .intervals import IntervalTree
+from .ports import SUSPICIOUS_PORTS
+
+
+# Serviços do firewalld (definições locais sobrescrevem as do sistema)
+FIREWALLD_SERVICE_DIRS = [
+    Path("/usr/lib/firewalld/services"),
+    Path("/etc/firewalld/services")
+]
+
+WILDCARD_ADDRESSES = ("0.0.0.0", "::", "*", "")
+
+RICH_RULE_SOURCE = re.compile(r'source\s+(NOT\s+)?address="([^"]+)"')
+RICH_RULE_PORT = re.compile(r'\bport\s+port="([^"]+)"\s+protocol="([^"]+)"')
+RICH_RULE_SERVICE = re.compile(r'service\s+name="([^"]+)"')
+RICH_RULE_ACTION = re.compile(r'\s(accept|reject|drop)(\s+type="[^"]*")?(\s+limit\s+value="[^"]*")?\s*$')
+
+# Ordem de gravidade das exposições (maior = mais exposto)
+EXPOSURE_RANK = {"local": 0, "blocked": 1, "restricted": 2, "public": 3}
+
+
+def _parse_port_range(value: str) -> Optional[tuple]:
+    lo, _, hi = value.partition('-')
+    try:
+        return int(lo), int(hi or lo)
+    except ValueError:
+        return None
+
+
+def load_service_definitions(names: List[str]) -> Dict[str, List[tuple]]:
+    """
+    Lê as portas dos serviços do firewalld (XML), resolvendo <include>
+
+    Returns:
+        Dicionário serviço -> [(protocolo, início, fim), ...]
+    """
+    files = {}
+    for directory in FIREWALLD_SERVICE_DIRS:
+        if directory.is_dir():
+            for path in directory.glob("*.xml"):
+                files[path.stem] = path
+
+    definitions = {}
+    pending = list(dict.fromkeys(names))
+    includes = {}
+
+    while pending:
+        name = pending.pop()
+        if name in definitions:
+            continue
+        definitions[name] = []
+        includes[name] = []
+
+        path = files.get(name)
+        if path is None:
+            continue
+        try:
+            root = ET.parse(path).getroot()
+        except (ET.ParseError, OSError):
+            continue
+
+        for element in root.findall("port"):
+            port_range = _parse_port_range(element.get("port", ""))
+            if port_range:
+                definitions[name].append((element.get("protocol", "tcp"),) + port_range)
+        for element in root.findall("include"):
+            included = element.get("service")
+            if included:
+                includes[name].append(included)
+                pending.append(included)
+
+    # Expandir includes (um serviço herda as portas dos incluídos)
+    def expand(name, seen):
+        ports = list(definitions.get(name, []))
+        for included in includes.get(name, []):
+            if included not in seen:
+                seen.add(included)
+                ports.extend(expand(included, seen))
+        return ports
+
+    return {name: expand(name, {name}) for name in names}
+
+
+def get_interface_addresses() -> Dict[str, str]:
+    """Mapeia endereço IP local -> interface"""
+    addresses = {}
+    try:
+        for interface, entries in psutil.net_if_addrs().items():
+            for entry in entries:
+                if entry.family in (socket.AF_INET, socket.AF_INET6):
+                    addresses[entry.address.split('%')[0]] = interface
+    except Exception:
+        pass
+    return addresses
+
+
+class FirewallPolicyIndex:
+    """
+    Índice da política de entrada do firewalld
+
+    Para cada protocolo guarda uma árvore de intervalos de portas cujos
+    valores são as liberações (zona, origem da regra, fontes permitidas).
+    """
+
+    def __init__(self, zones: List[Dict[str, Any]], default_zone: str):
+        self.default_zone = default_zone
+        self.zones = {zone["name"]: zone for zone in zones if isinstance(zone, dict) and zone.get("name")}
+
+        # Interface -> zona; zonas baseadas em origem valem para qualquer interface
+        self.interface_zone = {}
+        self.source_zones = []
+        for zone in self.zones.values():
+            for interface in zone.get("interfaces", []):
+                self.interface_zone[interface] = zone["name"]
+            if zone.get("sources"):
+                self.source_zones.append(zone["name"])
+
+        services = sorted({
+            service
+            for zone in self.zones.values()
+            for service in zone.get("services", [])
+        } | {
+            match.group(1)
+            for zone in self.zones.values()
+            for rule in zone.get("rich_rules", [])
+            for match in [RICH_RULE_SERVICE.search(rule)] if match
+        })
+        self.service_ports = load_service_definitions(services)
+
+        grants = {}
+        denies = {}
+
+        def grant(protocol, lo, hi, zone_name, via, sources, action="accept"):
+            target = grants if action == "accept" else denies
+            target.setdefault(protocol, []).append((lo, hi, (zone_name, via, sources)))
+
+        for zone in self.zones.values():
+            zone_sources = tuple(zone.get("sources", [])) or ("any",)
+
+            for entry in zone.get("ports", []):
+                port, _, protocol = entry.partition('/')
+                port_range = _parse_port_range(port)
+                if port_range:
+                    grant(protocol, *port_range, zone["name"], f"port {entry}", zone_sources)
+
+            for service in zone.get("services", []):
+                for protocol, lo, hi in self.service_ports.get(service, []):
+                    grant(protocol, lo, hi, zone["name"], f"service {service}", zone_sources)
+
+            for rule in zone.get("rich_rules", []):
+                action = RICH_RULE_ACTION.search(rule)
+                if not action:
+                    continue
+                action = action.group(1)
+                source = RICH_RULE_SOURCE.search(rule)
+                if source and source.group(1):
+                    continue  # "source NOT address": não modelado
+                sources = (source.group(2),) if source else zone_sources
+
+                port = RICH_RULE_PORT.search(rule)
+                service = RICH_RULE_SERVICE.search(rule)
+                if port:
+                    port_range = _parse_port_range(port.group(1))
+                    if port_range:
+                        grant(port.group(2), *port_range, zone["name"], "rich rule", sources, action)
+                elif service:
+                    for protocol, lo, hi in self.service_ports.get(service.group(1), []):
+                        grant(protocol, lo, hi, zone["name"], "rich rule", sources, action)
+                elif source:
+                    # Só origem: vale para qualquer porta vinda dela
+                    for protocol in ("tcp", "udp"):
+                        grant(protocol, 0, 65535, zone["name"], "rich rule", sources, action)
+
+        self._trees = {protocol: IntervalTree(items) for protocol, items in grants.items()}
+        self._deny_trees = {protocol: IntervalTree(items) for protocol, items in denies.items()}
+        self.rules_indexed = sum(len(items) for items in grants.values()) + \
+            sum(len(items) for items in denies.values())
+
+    def zones_for_interface(self, interface: Optional[str]) -> List[str]:
+        """Zonas que recebem tráfego da interface (None = todas as interfaces)"""
+        if interface is None:
+            names = set(self.interface_zone.values()) | {self.default_zone}
+        else:
+            names = {self.interface_zone.get(interface, self.default_zone)}
+        names.update(self.source_zones)
+        return sorted(name for name in names if name in self.zones)
+
+    def denied_by(self, protocol: str, port: int, zone_names: List[str]) -> List[Dict[str, Any]]:
+        """Rich rules reject/drop que se aplicam a (protocolo, porta) nas zonas informadas"""
+        tree = self._deny_trees.get(protocol)
+        if tree is None:
+            return []
+        wanted = set(zone_names)
+        return [
+            {"zone": zone_name, "via": via, "sources": list(sources)}
+            for zone_name, via, sources in tree.stab(port) if zone_name in wanted
+        ]
+
+    def allowed_by(self, protocol: str, port: int, zone_names: List[str]) -> List[Dict[str, Any]]:
+        """Liberações que deixam (protocolo, porta) passar nas zonas informadas"""
+        allowed = []
+        wanted = set(zone_names)
+
+        for zone_name in zone_names:
+            if self.zones[zone_name].get("target") == "ACCEPT":
+                allowed.append({"zone": zone_name, "via": "target ACCEPT", "sources": ["any"]})
+
+        tree = self._trees.get(protocol)
+        if tree is not None:
+            for zone_name, via, sources in tree.stab(port):
+                if zone_name in wanted:
+                    allowed.append({"zone": zone_name, "via": via, "sources": list(sources)})
+
+        return allowed
+
+
+def is_loopback_address(address: str) -> bool:
+    """Endereço de escuta acessível apenas localmente"""
+    return address.startswith("127.") or address == "::1"
+
+
+def _classify_listener(listener: Dict[str, Any], index: Optional[FirewallPolicyIndex],
+                       addresses: Dict[str, str]) -> Dict[str, Any]:
+    address = listener.get("local_address", "")
+    protocol = listener.get("protocol", "tcp")
+    port = listener.get("port", 0)
+
+    entry = {
+        "port": port,
+        "protocol": protocol,
+        "local_address": address,
+        "process": listener.get("process", {}).get("name", "unknown")
+        if isinstance(listener.get("process"), dict) else "unknown",
+        "allowed_by": []
+    }
+
+    if is_loopback_address(address) or addresses.get(address) == "lo":
+        entry["exposure"] = "local"
+        return entry
+
+    if index is None:
+        entry["exposure"] = "public"
+        entry["reason"] = "firewall inativo"
+        return entry
+
+    interface = None if address in WILDCARD_ADDRESSES else addresses.get(address)
+    if interface:
+        entry["interface"] = interface
+    zones = index.zones_for_interface(interface)
+    entry["zones"] = zones
+    entry["allowed_by"] = index.allowed_by(protocol, port, zones)
+
+    if not entry["allowed_by"]:
+        entry["exposure"] = "blocked"
+    elif any("any" in grant["sources"] for grant in entry["allowed_by"]):
+        entry["exposure"] = "public"
+    else:
+        entry["exposure"] = "restricted"
+
+    return entry
+
+
+def _severity(exposure: str, suspicious: bool) -> str:
+    if suspicious:
+        return {"public": "critical", "restricted": "warning"}.get(exposure, "info")
+    return "warning" if exposure == "public" else "info"
+
+
+def build_exposure_matrix(metrics: Dict[str, Any], config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Cruza as portas em escuta com a política do firewall
+
+    Também refina a gravidade de ports.suspicious_ports: uma porta suspeita
+    bloqueada pelo firewall deixa de ser tratada como exposta publicamente.
+
+    Returns:
+        Matriz de exposição (uma entrada por socket em escuta) e contagens
+    """
+    listeners = [
+        listener for listener in metrics.get("ports", {}).get("listening_ports", [])
+        if isinstance(listener, dict) and "error" not in listener
+    ]
+    firewall = metrics.get("firewall", {})
+
+    index = None
+    if firewall.get("status", {}).get("running"):
+        zones = [z for z in firewall.get("zones", []) if isinstance(z, dict) and "error" not in z]
+        index = FirewallPolicyIndex(zones, firewall.get("default_zone", "public"))
+
+    addresses = get_interface_addresses()
+
+    # Um socket por (protocolo, endereço, porta) — IPv4/IPv6 e processos repetidos se fundem
+    matrix = {}
+    for listener in listeners:
+        entry = _classify_listener(listener, index, addresses)
+        key = (entry["protocol"], entry["local_address"], entry["port"])
+        matrix.setdefault(key, entry)
+
+    entries = sorted(matrix.values(), key=lambda e: (-EXPOSURE_RANK[e["exposure"]], e["port"]))
+    for entry in entries:
+        entry["severity"] = _severity(entry["exposure"], entry["port"] in SUSPICIOUS_PORTS)
+
+    # Refinar portas suspeitas com a exposição real
+    worst_by_port = {}
+    for entry in entries:
+        current = worst_by_port.get((entry["protocol"], entry["port"]))
+        if current is None or EXPOSURE_RANK[entry["exposure"]] > EXPOSURE_RANK[current["exposure"]]:
+            worst_by_port[(entry["protocol"], entry["port"])] = entry
+
+    for suspicious in metrics.get("ports", {}).get("suspicious_ports", []):
+        if not isinstance(suspicious, dict) or "error" in suspicious:
+            continue
+        entry = worst_by_port.get((suspicious.get("protocol", "tcp"), suspicious.get("port")))
+        if entry is None:
+            continue
+        suspicious["exposure"] = entry["exposure"]
+        suspicious["is_public"] = entry["exposure"] == "public"
+        suspicious["severity"] = entry["severity"]
+        if entry.get("allowed_by"):
+            suspicious["allowed_by"] = entry["allowed_by"]
+
+    counts = {level: 0 for level in EXPOSURE_RANK}
+    for entry in entries:
+        counts[entry["exposure"]] += 1
+
+    return {
+        "firewall_considered": index is not None,
+        "rules_indexed": index.rules_indexed if index else 0,
+        "listeners": len(entries),
+        "by_exposure": counts,
+        "matrix": entries
+    }
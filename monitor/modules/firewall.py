@@ -1,9 +1,34 @@
 """
 Módulo de monitoramento de firewall
 """
+import os
 import subprocess
 import re
-from typing import Dict, List, Any
+import json
+import hashlib
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+
+from .nftables import analyze_nftables
+from .selinux_avc import collect_avc_denials
+from .state import load_state, save_state
+
+# Import condicional do cliente D-Bus (backend opcional, sem o custo de subir o firewall-cmd)
+try:
+    import dbus
+    DBUS_AVAILABLE = True
+except ImportError:
+    DBUS_AVAILABLE = False
+    dbus = None
+
+
+FIREWALLD_BUS_NAME = "org.fedoraproject.FirewallD1"
+FIREWALLD_OBJECT_PATH = "/org/fedoraproject/FirewallD1"
+FIREWALLD_ZONE_INTERFACE = "org.fedoraproject.FirewallD1.zone"
+
+# Conexões D-Bus privadas reaproveitadas entre capturas, uma por barramento.
+# Privadas para que fechá-las não afete o singleton compartilhado de dbus.SystemBus()/SessionBus()
+_dbus_connections = {}
 
 
 def get_firewalld_status() -> Dict[str, Any]:
@@ -41,242 +66,564 @@ def get_firewalld_status() -> Dict[str, Any]:
     return status
 
 
-def get_firewall_zones() -> List[Dict[str, Any]]:
-    """Obtém zonas do firewall e suas configurações"""
-    zones = []
-    
+# Campos de --list-all-zones que são listas separadas por espaço
+ZONE_LIST_FIELDS = {
+    "interfaces": "interfaces",
+    "sources": "sources",
+    "services": "services",
+    "ports": "ports",
+    "protocols": "protocols",
+    "source-ports": "source_ports",
+    "icmp-blocks": "icmp_blocks",
+    "forward-ports": "forward_ports",
+    "rich rules": "rich_rules"
+}
+
+# Campos multilinha (um item por linha indentada com tab)
+ZONE_MULTILINE_FIELDS = ("forward-ports", "rich rules")
+
+
+def _run_firewall_cmd(*args: str) -> str:
+    """Executa firewall-cmd e retorna stdout (exceção se falhar)"""
+    result = subprocess.run(
+        ['firewall-cmd', *args],
+        capture_output=True,
+        text=True,
+        timeout=30
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or f"firewall-cmd {' '.join(args)} falhou")
+    return result.stdout
+
+
+def normalize_zone_target(target: str) -> str:
+    """Normaliza representações internas do target da zona"""
+    if target == "%%REJECT%%":
+        return "REJECT"
+    if not target or "{chain}" in target:
+        return "default"
+    return target
+
+
+def _new_zone(name: str) -> Dict[str, Any]:
+    zone = {"name": name, "target": "default", "masquerade": False}
+    for key in ZONE_LIST_FIELDS.values():
+        zone[key] = []
+    return zone
+
+
+def parse_list_all_zones(output: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Converte a saída de `firewall-cmd --list-all-zones` em dicionário de zonas
+
+    Cabeçalho da zona vem sem indentação ("public (default, active)"),
+    os campos com dois espaços ("  services: ssh") e os itens de campos
+    multilinha (rich rules, forward-ports) com tab.
+    """
+    zones = {}
+    zone = None
+    multiline_key = None
+
+    for line in output.split('\n'):
+        if not line.strip():
+            continue
+
+        if not line[0].isspace():
+            name = line.split()[0]
+            zone = zones.setdefault(name, _new_zone(name))
+            multiline_key = None
+            continue
+
+        if zone is None:
+            continue
+
+        if line.startswith('\t') and multiline_key:
+            zone[multiline_key].append(line.strip())
+            continue
+
+        field, sep, value = line.strip().partition(':')
+        if not sep:
+            continue
+        value = value.strip()
+        multiline_key = None
+
+        if field == "target":
+            zone["target"] = normalize_zone_target(value)
+        elif field == "masquerade":
+            zone["masquerade"] = value == "yes"
+        elif field in ZONE_LIST_FIELDS:
+            key = ZONE_LIST_FIELDS[field]
+            if field in ZONE_MULTILINE_FIELDS:
+                multiline_key = key
+                if value:
+                    zone[key].append(value)
+            else:
+                zone[key] = value.split()
+
+    return zones
+
+
+def parse_active_zones(output: str) -> List[str]:
+    """Converte a saída de `firewall-cmd --get-active-zones` em lista de zonas"""
+    return [
+        line.strip() for line in output.split('\n')
+        if line.strip() and not line[0].isspace()
+        and not line.strip().startswith(('interfaces:', 'sources:'))
+    ]
+
+
+def _get_dbus_proxy(bus_type: str = "system"):
+    """Retorna proxy do firewalld na conexão D-Bus do barramento (cria na primeira chamada)"""
+    connection = _dbus_connections.get(bus_type)
+    if connection is None:
+        if bus_type == "session":
+            connection = dbus.SessionBus(private=True)
+        else:
+            connection = dbus.SystemBus(private=True)
+        _dbus_connections[bus_type] = connection
+
+    return connection.get_object(FIREWALLD_BUS_NAME, FIREWALLD_OBJECT_PATH)
+
+
+def reset_dbus_connection() -> None:
+    """Fecha as conexões D-Bus privadas (a próxima captura reconecta)"""
+    while _dbus_connections:
+        _, connection = _dbus_connections.popitem()
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+def _port_list(pairs) -> List[str]:
+    """Converte a(ss) do D-Bus em ["porta/protocolo", ...]"""
+    return [f"{port}/{proto}" for port, proto in pairs]
+
+
+def _zone_from_dbus_settings(name: str, settings) -> Dict[str, Any]:
+    """Converte o dicionário de getZoneSettings2 no formato de zona do snapshot"""
+    zone = _new_zone(name)
+    zone["target"] = normalize_zone_target(str(settings.get("target", "default")))
+    zone["masquerade"] = bool(settings.get("masquerade", False))
+
+    for key in ("interfaces", "sources", "services", "protocols", "icmp_blocks", "rich_rules"):
+        zone[key] = [str(item) for item in settings.get(key, [])]
+
+    zone["ports"] = _port_list(settings.get("ports", []))
+    zone["source_ports"] = _port_list(settings.get("source_ports", []))
+    zone["forward_ports"] = [
+        f"port={port}:proto={proto}:toport={toport}:toaddr={toaddr}"
+        for port, proto, toport, toaddr in settings.get("forward_ports", [])
+    ]
+
+    return zone
+
+
+def _get_firewall_snapshot_dbus(bus_type: str = "system") -> Dict[str, Any]:
+    """
+    Captura a configuração do firewalld direto pelo D-Bus
+
+    Uma chamada para a zona padrão, uma para as zonas ativas, uma para a
+    lista de zonas e uma por zona, todas na mesma conexão.
+    """
+    proxy = _get_dbus_proxy(bus_type)
+    zone_iface = dbus.Interface(proxy, dbus_interface=FIREWALLD_ZONE_INTERFACE)
+
+    default_zone = str(proxy.getDefaultZone(dbus_interface=FIREWALLD_BUS_NAME))
+    active_zones = [str(zone) for zone in zone_iface.getActiveZones()]
+    zones = {}
+    for zone_name in zone_iface.getZones():
+        zone_name = str(zone_name)
+        zones[zone_name] = _zone_from_dbus_settings(zone_name, zone_iface.getZoneSettings2(zone_name))
+
+    return {
+        "backend": "dbus",
+        "default_zone": default_zone or "unknown",
+        "active_zones": sorted(active_zones),
+        "zones": zones
+    }
+
+
+def get_firewall_snapshot(config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Captura toda a configuração do firewalld
+
+    Usa o D-Bus quando disponível (monitoring.firewall_backend = auto/dbus)
+    e cai para três chamadas do firewall-cmd caso contrário.
+
+    Returns:
+        Dicionário com default_zone, active_zones e zones (nome -> detalhes)
+    """
+    monitoring = (config or {}).get("monitoring", {})
+    backend = monitoring.get("firewall_backend", "auto")
+    dbus_error = None
+
+    if backend in ("auto", "dbus"):
+        if DBUS_AVAILABLE:
+            try:
+                return _get_firewall_snapshot_dbus(monitoring.get("firewall_dbus_bus", "system"))
+            except Exception as e:
+                reset_dbus_connection()
+                dbus_error = str(e)
+        elif backend == "dbus":
+            dbus_error = "dbus-python não instalado"
+
+    snapshot = {
+        "backend": "cli",
+        "default_zone": "unknown",
+        "active_zones": [],
+        "zones": {}
+    }
+
     try:
-        # Listar zonas ativas
-        result = subprocess.run(
-            ['firewall-cmd', '--get-active-zones'],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
-        
-        if result.returncode == 0:
-            lines = result.stdout.strip().split('\n')
-            current_zone = None
-            
-            for line in lines:
-                line = line.strip()
-                if line and not line.startswith('interfaces:') and not line.startswith('sources:'):
-                    current_zone = line
-                elif current_zone:
-                    # Obter detalhes da zona
-                    zone_info = get_zone_details(current_zone)
-                    if zone_info:
-                        zones.append(zone_info)
-                    current_zone = None
-                    
+        snapshot["zones"] = parse_list_all_zones(_run_firewall_cmd('--list-all-zones'))
+        snapshot["active_zones"] = parse_active_zones(_run_firewall_cmd('--get-active-zones'))
+        snapshot["default_zone"] = _run_firewall_cmd('--get-default-zone').strip() or "unknown"
     except FileNotFoundError:
-        zones.append({"error": "firewall-cmd não encontrado"})
+        snapshot["error"] = "firewall-cmd não encontrado"
     except Exception as e:
-        zones.append({"error": str(e)})
-    
+        snapshot["error"] = str(e)
+
+    if dbus_error:
+        snapshot["dbus_error"] = dbus_error
+
+    return snapshot
+
+
+def get_firewall_zones(snapshot: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Obtém zonas ativas (e a zona padrão) do firewall e suas configurações"""
+    snapshot = snapshot or get_firewall_snapshot()
+    if "error" in snapshot:
+        return [{"error": snapshot["error"]}]
+
+    # A zona padrão entra mesmo sem interfaces: ela recebe toda interface não atribuída
+    zone_names = list(snapshot["active_zones"])
+    if snapshot.get("default_zone") in snapshot["zones"] and snapshot["default_zone"] not in zone_names:
+        zone_names.append(snapshot["default_zone"])
+
+    zones = []
+    for zone_name in zone_names:
+        zone_info = get_zone_details(zone_name, snapshot)
+        if zone_info:
+            zone_info["active"] = zone_name in snapshot["active_zones"]
+            zones.append(zone_info)
+
     return zones
 
 
-def get_zone_details(zone_name: str) -> Dict[str, Any]:
+def get_zone_details(zone_name: str, snapshot: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     """Obtém detalhes de uma zona específica"""
-    zone_info = {
-        "name": zone_name,
-        "services": [],
-        "ports": [],
-        "interfaces": [],
-        "target": "default"
-    }
-    
-    try:
-        # Listar serviços
-        result = subprocess.run(
-            ['firewall-cmd', f'--zone={zone_name}', '--list-services'],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
-        if result.returncode == 0:
-            zone_info["services"] = result.stdout.strip().split()
-        
-        # Listar portas
-        result = subprocess.run(
-            ['firewall-cmd', f'--zone={zone_name}', '--list-ports'],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
-        if result.returncode == 0 and result.stdout.strip():
-            zone_info["ports"] = result.stdout.strip().split()
-        
-        # Listar interfaces
-        result = subprocess.run(
-            ['firewall-cmd', f'--zone={zone_name}', '--list-interfaces'],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
-        if result.returncode == 0 and result.stdout.strip():
-            zone_info["interfaces"] = result.stdout.strip().split()
-        
-        # Obter target
-        result = subprocess.run(
-            ['firewall-cmd', f'--zone={zone_name}', '--get-target'],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
-        if result.returncode == 0:
-            zone_info["target"] = result.stdout.strip()
-            
-    except Exception as e:
-        zone_info["error"] = str(e)
-    
+    snapshot = snapshot or get_firewall_snapshot()
+
+    zone_info = dict(snapshot.get("zones", {}).get(zone_name) or _new_zone(zone_name))
+    if zone_name == snapshot.get("default_zone"):
+        zone_info["default"] = True
+    if "error" in snapshot:
+        zone_info["error"] = snapshot["error"]
+
     return zone_info
 
 
-def get_default_zone() -> str:
+def get_default_zone(snapshot: Optional[Dict[str, Any]] = None) -> str:
     """Obtém a zona padrão"""
+    if snapshot is not None:
+        return snapshot.get("default_zone", "unknown")
+
     try:
-        result = subprocess.run(
-            ['firewall-cmd', '--get-default-zone'],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
-        if result.returncode == 0:
-            return result.stdout.strip()
+        return _run_firewall_cmd('--get-default-zone').strip() or "unknown"
     except Exception:
-        pass
-    
-    return "unknown"
+        return "unknown"
 
 
-def check_firewall_rules() -> List[Dict[str, Any]]:
+def check_firewall_rules(snapshot: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
     """Verifica regras potencialmente inseguras"""
+    snapshot = snapshot or get_firewall_snapshot()
+    if "error" in snapshot:
+        return [{"error": snapshot["error"]}]
+
     warnings = []
-    
-    try:
-        # Obter zonas
-        zones_result = subprocess.run(
-            ['firewall-cmd', '--get-active-zones'],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
-        
-        if zones_result.returncode == 0:
-            zones = [line.strip() for line in zones_result.stdout.split('\n') 
-                    if line.strip() and not line.startswith('interfaces:') and not line.startswith('sources:')]
-            
-            for zone in zones:
-                # Verificar se a zona tem target ACCEPT (muito permissivo)
-                target_result = subprocess.run(
-                    ['firewall-cmd', f'--zone={zone}', '--get-target'],
-                    capture_output=True,
-                    text=True,
-                    timeout=10
-                )
-                
-                if target_result.returncode == 0 and 'ACCEPT' in target_result.stdout:
-                    warnings.append({
-                        "zone": zone,
-                        "issue": "Target set to ACCEPT (muito permissivo)",
-                        "severity": "warning",
-                        "recommendation": "Configurar regras específicas ao invés de ACCEPT geral"
-                    })
-                
-                # Verificar se há muitas portas abertas
-                ports_result = subprocess.run(
-                    ['firewall-cmd', f'--zone={zone}', '--list-ports'],
-                    capture_output=True,
-                    text=True,
-                    timeout=10
-                )
-                
-                if ports_result.returncode == 0:
-                    ports = ports_result.stdout.strip().split()
-                    if len(ports) > 10:
-                        warnings.append({
-                            "zone": zone,
-                            "issue": f"Muitas portas abertas ({len(ports)})",
-                            "severity": "info",
-                            "ports": ports[:10]  # Mostrar apenas as primeiras 10
-                        })
-                        
-    except Exception as e:
-        warnings.append({"error": str(e)})
-    
+    for zone_name in snapshot["active_zones"]:
+        zone = snapshot["zones"].get(zone_name)
+        if not zone:
+            continue
+
+        # Verificar se a zona tem target ACCEPT (muito permissivo)
+        if zone["target"] == "ACCEPT":
+            warnings.append({
+                "zone": zone_name,
+                "issue": "Target set to ACCEPT (muito permissivo)",
+                "severity": "warning",
+                "recommendation": "Configurar regras específicas ao invés de ACCEPT geral"
+            })
+
+        # Verificar se há muitas portas abertas
+        ports = zone["ports"]
+        if len(ports) > 10:
+            warnings.append({
+                "zone": zone_name,
+                "issue": f"Muitas portas abertas ({len(ports)})",
+                "severity": "info",
+                "ports": ports[:10]  # Mostrar apenas as primeiras 10
+            })
+
     return warnings
 
 
-def get_rich_rules() -> List[str]:
-    """Obtém regras ricas (rich rules) configuradas"""
+def get_rich_rules(snapshot: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Obtém regras ricas (rich rules) configuradas nas zonas ativas"""
+    snapshot = snapshot or get_firewall_snapshot()
+    if "error" in snapshot:
+        return [{"error": snapshot["error"]}]
+
     rich_rules = []
-    
-    try:
-        zones = get_firewall_zones()
-        
-        for zone in zones:
-            if isinstance(zone, dict) and 'name' in zone:
-                result = subprocess.run(
-                    ['firewall-cmd', f'--zone={zone["name"]}', '--list-rich-rules'],
-                    capture_output=True,
-                    text=True,
-                    timeout=10
-                )
-                
-                if result.returncode == 0 and result.stdout.strip():
-                    for rule in result.stdout.strip().split('\n'):
-                        rich_rules.append({
-                            "zone": zone["name"],
-                            "rule": rule
-                        })
-    except Exception as e:
-        rich_rules.append({"error": str(e)})
-    
+    for zone_name in snapshot["active_zones"]:
+        for rule in snapshot["zones"].get(zone_name, {}).get("rich_rules", []):
+            rich_rules.append({
+                "zone": zone_name,
+                "rule": rule
+            })
+
     return rich_rules
 
 
+# Campos comparados entre execuções (listas tratadas como conjuntos)
+ZONE_DIFF_FIELDS = (
+    "interfaces", "sources", "services", "ports", "protocols",
+    "source_ports", "icmp_blocks", "forward_ports", "rich_rules"
+)
+
+# Entradas mantidas no histórico de mudanças persistido
+FIREWALL_CHANGE_LOG_SIZE = 50
+
+
+def normalize_zone(zone: Dict[str, Any]) -> Dict[str, Any]:
+    """Forma canônica da zona: independe da ordem dos itens e do backend de coleta"""
+    normalized = {
+        "target": zone.get("target", "default"),
+        "masquerade": bool(zone.get("masquerade", False))
+    }
+    for field in ZONE_DIFF_FIELDS:
+        normalized[field] = sorted(set(zone.get(field, [])))
+    return normalized
+
+
+def zone_fingerprint(normalized: Dict[str, Any]) -> str:
+    """Hash da zona normalizada"""
+    encoded = json.dumps(normalized, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()[:32]
+
+
+def diff_zone(name: str, old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """Diferença estruturada entre duas versões normalizadas de uma zona"""
+    diff = {"zone": name, "change": "modified"}
+
+    for key in ("target", "masquerade"):
+        if old.get(key) != new.get(key):
+            diff[key] = {"from": old.get(key), "to": new.get(key)}
+
+    for field in ZONE_DIFF_FIELDS:
+        before = set(old.get(field, []))
+        after = set(new.get(field, []))
+        if before != after:
+            diff[field] = {
+                "added": sorted(after - before),
+                "removed": sorted(before - after)
+            }
+
+    return diff
+
+
+def track_firewall_changes(snapshot: Dict[str, Any], config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Compara o snapshot atual com o da execução anterior
+
+    Cada zona é guardada com o hash da sua forma normalizada; zonas com o
+    mesmo hash custam só a comparação, e o diff estruturado é calculado
+    apenas para as que mudaram. Mudanças vão para um histórico persistido.
+
+    Returns:
+        Dicionário com as mudanças desde a última execução e o histórico recente
+    """
+    if "error" in snapshot:
+        return {"error": snapshot["error"]}
+
+    previous = load_state(config, "firewall_zones", default={}) or {}
+    previous_zones = previous.get("zones", {})
+    log = previous.get("log", [])
+    is_baseline = not previous
+
+    now = datetime.now().isoformat()
+    current_zones = {}
+    zone_changes = []
+
+    for name, zone in sorted(snapshot.get("zones", {}).items()):
+        normalized = normalize_zone(zone)
+        fingerprint = zone_fingerprint(normalized)
+        current_zones[name] = {"hash": fingerprint, "config": normalized}
+
+        old = previous_zones.get(name)
+        if old is None:
+            if not is_baseline:
+                zone_changes.append({"zone": name, "change": "added", "config": normalized})
+        elif old.get("hash") != fingerprint:
+            zone_changes.append(diff_zone(name, old.get("config", {}), normalized))
+
+    for name in sorted(set(previous_zones) - set(current_zones)):
+        zone_changes.append({"zone": name, "change": "removed"})
+
+    changes = {
+        "baseline": is_baseline,
+        "previous_run": previous.get("timestamp"),
+        "zones": zone_changes
+    }
+
+    default_zone = snapshot.get("default_zone")
+    if not is_baseline and previous.get("default_zone") != default_zone:
+        changes["default_zone"] = {"from": previous.get("default_zone"), "to": default_zone}
+
+    if zone_changes or "default_zone" in changes:
+        entry = {"timestamp": now, "zones": zone_changes}
+        if "default_zone" in changes:
+            entry["default_zone"] = changes["default_zone"]
+        log = (log + [entry])[-FIREWALL_CHANGE_LOG_SIZE:]
+
+    save_state(config, "firewall_zones", {
+        "timestamp": now,
+        "default_zone": default_zone,
+        "zones": current_zones,
+        "log": log
+    })
+
+    changes["changed_zones"] = len(zone_changes)
+    changes["recent"] = log[-10:]
+    return changes
+
+
+SELINUX_FS = "/sys/fs/selinux"
+SELINUX_CONFIG = "/etc/selinux/config"
+SELINUX_STORE = "/var/lib/selinux"
+
+
+def _read_sysfs(path: str) -> Optional[str]:
+    try:
+        with open(path, 'r') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def read_selinux_config(path: str = SELINUX_CONFIG) -> Dict[str, str]:
+    """Lê SELINUX= e SELINUXTYPE= de /etc/selinux/config"""
+    values = {}
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                key, sep, value = line.strip().partition('=')
+                if sep and not key.startswith('#'):
+                    values[key.strip()] = value.strip().strip('"')
+    except OSError:
+        pass
+    return values
+
+
+def get_selinux_mode(selinuxfs: str = SELINUX_FS) -> str:
+    """
+    Modo atual do SELinux com uma única leitura de arquivo
+
+    Barato o bastante para o daemon consultar a cada poucos segundos.
+    """
+    enforce = _read_sysfs(os.path.join(selinuxfs, "enforce"))
+    if enforce is None:
+        return "Disabled"
+    return "Enforcing" if enforce == "1" else "Permissive"
+
+
+def count_selinux_booleans(selinuxfs: str = SELINUX_FS) -> Dict[str, int]:
+    """Conta booleanos do SELinux e quantos estão ativos (arquivos "atual pendente")"""
+    counts = {"total": 0, "enabled": 0}
+    booleans_dir = os.path.join(selinuxfs, "booleans")
+    try:
+        entries = os.scandir(booleans_dir)
+    except OSError:
+        return counts
+
+    with entries:
+        for entry in entries:
+            counts["total"] += 1
+            value = _read_sysfs(entry.path)
+            if value and value.split()[0] == "1":
+                counts["enabled"] += 1
+    return counts
+
+
+def count_selinux_modules(policy_type: str, store: str = SELINUX_STORE) -> Dict[str, int]:
+    """
+    Conta módulos de política instalados no store do semanage
+
+    Módulos ficam em active/modules/<prioridade>/<nome>; o mesmo módulo em
+    mais de uma prioridade conta uma vez, e os listados em disabled/ são
+    contados à parte.
+    """
+    counts = {"total": 0, "disabled": 0}
+    modules_dir = os.path.join(store, policy_type, "active", "modules")
+    names = set()
+    try:
+        priorities = [e for e in os.scandir(modules_dir) if e.is_dir()]
+    except OSError:
+        return counts
+
+    for priority in priorities:
+        try:
+            entries = [e.name for e in os.scandir(priority.path)]
+        except OSError:
+            continue
+        if priority.name == "disabled":
+            counts["disabled"] = len(entries)
+        elif priority.name.isdigit():
+            names.update(entries)
+
+    counts["total"] = len(names)
+    return counts
+
+
 def check_selinux_status() -> Dict[str, Any]:
-    """Verifica status do SELinux"""
+    """
+    Verifica status do SELinux lendo o selinuxfs e /etc/selinux/config
+
+    Sem processos: o modo vem de /sys/fs/selinux/enforce, a política do
+    arquivo de configuração e os demais dados de arquivos do selinuxfs.
+    """
     selinux = {
         "enabled": False,
         "mode": "unknown",
         "policy": "unknown"
     }
-    
-    try:
-        result = subprocess.run(
-            ['getenforce'],
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
-        
-        if result.returncode == 0:
-            mode = result.stdout.strip()
-            selinux["mode"] = mode
-            selinux["enabled"] = mode != "Disabled"
-            
-            # Se estiver habilitado, verificar política
-            if selinux["enabled"]:
-                status_result = subprocess.run(
-                    ['sestatus'],
-                    capture_output=True,
-                    text=True,
-                    timeout=5
-                )
-                
-                if status_result.returncode == 0:
-                    for line in status_result.stdout.split('\n'):
-                        if 'Policy' in line:
-                            selinux["policy"] = line.split(':')[1].strip()
-                            break
-    except FileNotFoundError:
-        selinux["error"] = "SELinux não instalado ou getenforce não encontrado"
-    except Exception as e:
-        selinux["error"] = str(e)
-    
+
+    config_values = read_selinux_config()
+    selinuxfs_mounted = os.path.exists(os.path.join(SELINUX_FS, "enforce"))
+
+    if not selinuxfs_mounted and not config_values:
+        selinux["error"] = "SELinux não instalado (selinuxfs e /etc/selinux/config ausentes)"
+        return selinux
+
+    selinux["mode"] = get_selinux_mode()
+    selinux["enabled"] = selinuxfs_mounted
+    selinux["policy"] = config_values.get("SELINUXTYPE", "unknown")
+    if "SELINUX" in config_values:
+        selinux["config_mode"] = config_values["SELINUX"].capitalize()
+        selinux["mode_matches_config"] = selinux["config_mode"] == selinux["mode"]
+
+    if selinuxfs_mounted:
+        policy_version = _read_sysfs(os.path.join(SELINUX_FS, "policyvers"))
+        if policy_version and policy_version.isdigit():
+            selinux["policy_version"] = int(policy_version)
+        selinux["mls"] = _read_sysfs(os.path.join(SELINUX_FS, "mls")) == "1"
+        selinux["deny_unknown"] = _read_sysfs(os.path.join(SELINUX_FS, "deny_unknown")) == "1"
+        selinux["booleans"] = count_selinux_booleans()
+
+    if selinux["policy"] != "unknown":
+        selinux["modules"] = count_selinux_modules(selinux["policy"])
+
     return selinux
 
 
@@ -288,21 +635,39 @@ def collect_firewall_metrics(config: Dict[str, Any]) -> Dict[str, Any]:
         metrics["status"] = get_firewalld_status()
         
         if metrics["status"].get("running"):
-            metrics["default_zone"] = get_default_zone()
-            metrics["zones"] = get_firewall_zones()
-            metrics["security_warnings"] = check_firewall_rules()
-            metrics["rich_rules"] = get_rich_rules()
+            # Uma única captura alimenta zonas, avisos e rich rules
+            snapshot = get_firewall_snapshot(config)
+            metrics["backend"] = snapshot.get("backend", "cli")
+            metrics["default_zone"] = get_default_zone(snapshot)
+            metrics["zones"] = get_firewall_zones(snapshot)
+            metrics["security_warnings"] = check_firewall_rules(snapshot)
+            metrics["rich_rules"] = get_rich_rules(snapshot)
+            
+            if config.get("monitoring", {}).get("track_firewall_changes", True):
+                metrics["changes"] = track_firewall_changes(snapshot, config)
+    
+    if config.get("monitoring", {}).get("check_nftables", True):
+        metrics["nftables"] = analyze_nftables(config)
     
     if config.get("monitoring", {}).get("check_selinux", True):
         metrics["selinux"] = check_selinux_status()
     
+    if config.get("monitoring", {}).get("check_selinux_avc", True):
+        metrics["selinux_avc"] = collect_avc_denials(config)
+    
     # Resumo
     metrics["summary"] = {
         "firewall_active": metrics.get("status", {}).get("running", False),
         "firewall_enabled": metrics.get("status", {}).get("enabled", False),
         "selinux_enforcing": metrics.get("selinux", {}).get("mode") == "Enforcing",
         "total_zones": len([z for z in metrics.get("zones", []) if isinstance(z, dict) and "error" not in z]),
-        "security_warnings": len(metrics.get("security_warnings", []))
+        "security_warnings": len(metrics.get("security_warnings", [])),
+        "changed_zones": metrics.get("changes", {}).get("changed_zones", 0),
+        "nft_shadowed_rules": metrics.get("nftables", {}).get("shadowed_count", 0),
+        "nft_duplicate_rules": metrics.get("nftables", {}).get("duplicates_count", 0),
+        "nft_broad_rules": metrics.get("nftables", {}).get("broad_rules_count", 0),
+        "selinux_denials": metrics.get("selinux_avc", {}).get("denials", 0),
+        "selinux_new_denials": metrics.get("selinux_avc", {}).get("new_denials_count", 0)
     }
     
     return metrics
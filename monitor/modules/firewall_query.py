@@ -0,0 +1,187 @@
+"""
+Motor de consultas à política do firewall ("a porta X é acessível a partir de Y?")
+
+Compilado a partir das zonas já coletadas (metrics["firewall"]), sem chamar
+o firewall-cmd. Cada pergunta (origem CIDR, porta, protocolo) é respondida
+com consultas de ponto no índice de liberações (exposure.FirewallPolicyIndex)
+e operações sobre intervalos de endereços. O conjunto de origens liberado
+para cada (zona, protocolo, porta) é memorizado, então um lote de milhares
+de perguntas sobre as mesmas portas custa praticamente uma busca em dicionário
+por pergunta.
+
+Semântica do firewalld modelada:
+- pacotes de origens vinculadas a uma zona (sources) são tratados por ela;
+  os demais pela zona da interface (ou pela zona padrão)
+- rich rules reject/drop com origem têm precedência sobre as liberações
+- target ACCEPT libera tudo; default/REJECT/DROP negam o que não foi liberado
+"""
+from typing import Dict, List, Any, Optional, Iterable, Tuple
+
+from .exposure import FirewallPolicyIndex
+from .intervals import merge_intervals, covers, subtract_intervals
+from .ipnet import parse_network, to_int128
+
+
+FULL_ADDRESS_SPACE = [(0, (1 << 128) - 1)]
+
+DECISION_ALLOWED = "allowed"
+DECISION_PARTIAL = "partial"
+DECISION_DENIED = "denied"
+
+
+def parse_source(value: str) -> Optional[Tuple[int, int]]:
+    """Converte CIDR (ou IP, ou "any") em intervalo no espaço de 128 bits"""
+    if value in ("any", "*", ""):
+        return FULL_ADDRESS_SPACE[0]
+    network = parse_network(value)
+    if network is None:
+        return None
+    version, start, end = network
+    return to_int128(version, start), to_int128(version, end)
+
+
+def parse_port_spec(value: str) -> Optional[Tuple[int, str]]:
+    """Converte "22", "22/tcp" ou "53/udp" em (porta, protocolo)"""
+    port, _, protocol = str(value).partition('/')
+    try:
+        return int(port), (protocol or "tcp").lower()
+    except ValueError:
+        return None
+
+
+class FirewallQueryEngine:
+    """Estrutura de decisão compilada da política de entrada do firewalld"""
+
+    def __init__(self, firewall_metrics: Dict[str, Any]):
+        zones = [
+            zone for zone in firewall_metrics.get("zones", [])
+            if isinstance(zone, dict) and "error" not in zone
+        ]
+        self.firewall_active = firewall_metrics.get("status", {}).get("running", bool(zones))
+        self.index = FirewallPolicyIndex(zones, firewall_metrics.get("default_zone", "public"))
+
+        self._source_cache = {}
+        self._decision_cache = {}
+
+        # Zonas vinculadas a origens: intervalos de endereços que elas capturam
+        self._source_zones = []
+        claimed = []
+        for zone_name in self.index.source_zones:
+            intervals = self._parse_sources(self.index.zones[zone_name].get("sources", []))
+            self._source_zones.append((zone_name, intervals))
+            claimed.extend(intervals)
+        self._claimed = merge_intervals(claimed)
+
+    def _parse_sources(self, sources: Iterable[str]) -> List[tuple]:
+        intervals = []
+        for source in sources:
+            if source not in self._source_cache:
+                self._source_cache[source] = parse_source(source)
+            interval = self._source_cache[source]
+            if interval is not None:
+                intervals.append(interval)
+        return merge_intervals(intervals)
+
+    def _allowed_sources(self, zone_name: str, protocol: str, port: int) -> List[tuple]:
+        """Origens (intervalos) que a zona deixa chegar a (protocolo, porta) — memorizado"""
+        key = (zone_name, protocol, port)
+        cached = self._decision_cache.get(key)
+        if cached is not None:
+            return cached
+
+        allowed = []
+        for grant in self.index.allowed_by(protocol, port, [zone_name]):
+            allowed.extend(self._parse_sources(grant["sources"]))
+        denied = []
+        for deny in self.index.denied_by(protocol, port, [zone_name]):
+            denied.extend(self._parse_sources(deny["sources"]))
+
+        result = subtract_intervals(merge_intervals(allowed), merge_intervals(denied))
+        self._decision_cache[key] = result
+        return result
+
+    def _zones_for(self, source: tuple, interface: Optional[str]) -> List[Tuple[str, List[tuple]]]:
+        """Zonas que tratam (partes de) a origem, com a parte tratada por cada uma"""
+        lo, hi = source
+        handled = []
+
+        for zone_name, intervals in self._source_zones:
+            part = [(max(a, lo), min(b, hi)) for a, b in intervals if a <= hi and b >= lo]
+            if part:
+                handled.append((zone_name, part))
+
+        rest = subtract_intervals([source], self._claimed)
+        if rest:
+            for zone_name in self.index.zones_for_interface(interface):
+                if zone_name not in self.index.source_zones:
+                    handled.append((zone_name, rest))
+
+        return handled
+
+    def query(self, source: str, port: int, protocol: str = "tcp",
+              interface: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Responde se (origem, porta, protocolo) passa pelo firewall
+
+        Args:
+            source: CIDR, IP ou "any"
+            port: Porta de destino
+            protocol: tcp ou udp
+            interface: Interface de entrada (None = qualquer interface)
+
+        Returns:
+            Dicionário com decision (allowed/partial/denied) e zonas envolvidas
+        """
+        result = {"source": source, "port": port, "protocol": protocol}
+
+        if source not in self._source_cache:
+            self._source_cache[source] = parse_source(source)
+        interval = self._source_cache[source]
+        if interval is None:
+            result["decision"] = DECISION_DENIED
+            result["error"] = "origem inválida"
+            return result
+
+        if not self.firewall_active:
+            result["decision"] = DECISION_ALLOWED
+            result["zones"] = []
+            result["reason"] = "firewall inativo"
+            return result
+
+        # Parte da origem que alcança a porta por alguma zona
+        reachable = []
+        zones = []
+        for zone_name, part in self._zones_for(interval, interface):
+            allowed = self._allowed_sources(zone_name, protocol, port)
+            passed = subtract_intervals(part, subtract_intervals(part, allowed))
+            if passed:
+                reachable.extend(passed)
+                zones.append({
+                    "zone": zone_name,
+                    "decision": DECISION_ALLOWED if passed == part else DECISION_PARTIAL
+                })
+
+        reachable = merge_intervals(reachable)
+        if reachable and covers(reachable, [interval]):
+            result["decision"] = DECISION_ALLOWED
+        elif reachable:
+            result["decision"] = DECISION_PARTIAL
+        else:
+            result["decision"] = DECISION_DENIED
+        result["zones"] = zones
+        return result
+
+    def query_many(self, sources: Iterable[str], ports: Iterable[Tuple[int, str]],
+                   interface: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Avalia a matriz completa origens × (porta, protocolo)"""
+        sources = list(sources)
+        return [
+            self.query(source, port, protocol, interface)
+            for port, protocol in ports
+            for source in sources
+        ]
+
+
+def build_query_engine(firewall_metrics: Dict[str, Any]) -> FirewallQueryEngine:
+    """Compila o motor de consultas a partir de metrics["firewall"]"""
+    return FirewallQueryEngine(firewall_metrics)
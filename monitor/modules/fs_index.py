@@ -0,0 +1,271 @@
+"""
+Módulo de índice persistente de metadados para varreduras incrementais
+
+Guarda em SQLite (diretório de estado) o lstat de cada entrada varrida
+(modo, uid, gid, tamanho, mtime, ctime, inode) e, por diretório, o
+mtime/ctime/inode do momento em que foi listado. Na execução seguinte, um
+diretório cujo mtime/ctime/inode não mudou não é relido nem tem os arquivos
+refeitos com lstat: as entradas vêm do índice, e só os subdiretórios são
+conferidos (o mtime de um diretório só muda quando entradas dele são
+criadas, removidas ou renomeadas).
+
+Caminhos e nomes são gravados como BLOB (os.fsencode): nomes de arquivo
+não precisam ser UTF-8 válido.
+
+Limitação: um chmod/chown em um arquivo já existente não altera o
+diretório pai. Por isso há uma verificação completa periódica
+(scan_index_full_every) que ignora o índice e o reconstrói.
+"""
+import os
+import sqlite3
+import stat
+import threading
+from collections import namedtuple
+from typing import Dict, List, Any, Optional, Tuple
+
+from .state import get_state_path
+
+
+INDEX_FILE = "fs_index.sqlite"
+
+# Incrementar quando o esquema mudar descarta o índice (a execução seguinte é linha de base)
+SCHEMA_VERSION = "2"
+
+# Execuções incrementais entre duas verificações completas (0 = sempre completa)
+DEFAULT_FULL_EVERY = 7
+
+# Bits que geram alerta quando aparecem em entradas novas ou alteradas
+FLAGGED_BITS = (
+    ("suid", stat.S_ISUID),
+    ("sgid", stat.S_ISGID),
+    ("world_writable", stat.S_IWOTH)
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS dirs (
+    path BLOB PRIMARY KEY,
+    mtime_ns INTEGER,
+    ctime_ns INTEGER,
+    ino INTEGER,
+    entry_count INTEGER
+);
+CREATE TABLE IF NOT EXISTS entries (
+    parent BLOB,
+    name BLOB,
+    mode INTEGER,
+    uid INTEGER,
+    gid INTEGER,
+    size INTEGER,
+    mtime_ns INTEGER,
+    ctime_ns INTEGER,
+    ino INTEGER,
+    PRIMARY KEY (parent, name)
+) WITHOUT ROWID;
+"""
+
+# Em diretórios inalterados só interessam subdiretórios e arquivos com esses bits
+# (a verificação de dono desconhecido precisa de todas as entradas)
+SPECIAL_BITS = stat.S_ISUID | stat.S_ISGID | stat.S_IWOTH
+INDEXED_ENTRIES_QUERY = """
+    SELECT name, mode, uid, gid, size, mtime_ns, ctime_ns, ino FROM entries
+    WHERE parent = ? AND ((mode & {special}) != 0 OR (mode & {fmt}) = {dir})
+""".format(special=SPECIAL_BITS, fmt=stat.S_IFMT(0o177777), dir=stat.S_IFDIR)
+ALL_ENTRIES_QUERY = "SELECT name, mode, uid, gid, size, mtime_ns, ctime_ns, ino FROM entries WHERE parent = ?"
+
+# Mesmo formato de atributos que os.stat_result usa (o avaliador não distingue)
+IndexedStat = namedtuple("IndexedStat", "st_mode st_uid st_gid st_size st_mtime_ns st_ctime_ns st_ino")
+
+
+def entry_flags(mode: int) -> List[str]:
+    """Bits de atenção (SUID, SGID, world-writable) de um arquivo regular"""
+    if not stat.S_ISREG(mode):
+        return []
+    return [name for name, bit in FLAGGED_BITS if mode & bit]
+
+
+def _row(st) -> Tuple[int, int, int, int, int, int, int]:
+    return (st.st_mode, st.st_uid, st.st_gid, st.st_size, st.st_mtime_ns, st.st_ctime_ns, st.st_ino)
+
+
+class ScanIndex:
+    """
+    Índice de metadados usado pelo scanner (leituras concorrentes, escrita no fim)
+
+    Cada thread de varredura lê com a própria conexão; as alterações são
+    acumuladas em memória e gravadas por commit() em uma transação.
+    """
+
+    def __init__(self, db_path: str, full: bool = False):
+        self.db_path = db_path
+        self.full = full
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._dirs = []
+        self._entries = {}
+        self._removed_dirs = []
+        self.changes = []
+        self.reused_dirs = 0
+
+        conn = sqlite3.connect(db_path)
+        try:
+            conn.executescript(SCHEMA)
+            row = conn.execute("SELECT value FROM meta WHERE key = 'schema'").fetchone()
+            if row is None or row[0] != SCHEMA_VERSION:
+                with conn:
+                    conn.executescript("DROP TABLE dirs; DROP TABLE entries; DELETE FROM meta;")
+                    conn.executescript(SCHEMA)
+                    conn.execute("INSERT INTO meta VALUES ('schema', ?)", (SCHEMA_VERSION,))
+            # Estado dos diretórios fica em memória: um diretório inalterado custa uma consulta a um dict
+            self._known_dirs = {
+                os.fsdecode(path): (mtime_ns, ctime_ns, ino, count)
+                for path, mtime_ns, ctime_ns, ino, count in conn.execute("SELECT * FROM dirs")
+            }
+        finally:
+            conn.close()
+        self.baseline = not self._known_dirs
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def unchanged_entries(self, path: str, st: os.stat_result,
+                          all_entries: bool = False) -> Optional[Tuple[List[Tuple[str, IndexedStat]], int]]:
+        """
+        Entradas indexadas do diretório, se ele não mudou desde a última listagem
+
+        Args:
+            all_entries: Todas as entradas; senão só subdiretórios e arquivos
+                         com SUID/SGID/world-writable
+
+        Returns:
+            ([(nome, IndexedStat)], total de entradas do diretório) ou None
+            (diretório novo/alterado ou verificação completa)
+        """
+        if self.full:
+            return None
+        known = self._known_dirs.get(path)
+        if known is None or known[:3] != (st.st_mtime_ns, st.st_ctime_ns, st.st_ino):
+            return None
+        entries = self._conn().execute(ALL_ENTRIES_QUERY if all_entries else INDEXED_ENTRIES_QUERY,
+                                       (os.fsencode(path),))
+        with self._lock:
+            self.reused_dirs += 1
+        return [(os.fsdecode(name), IndexedStat(*values)) for name, *values in entries], known[3]
+
+    def record_listing(self, path: str, st: os.stat_result, entries: List[Tuple[str, os.stat_result]]) -> None:
+        """
+        Registra uma listagem nova do diretório e compara com a anterior
+
+        Entradas novas ou alteradas com SUID/SGID/world-writable vão para changes
+        (exceto na primeira execução, que só cria a linha de base).
+        """
+        previous = {} if self.baseline else {
+            os.fsdecode(name): values
+            for name, *values in self._conn().execute(ALL_ENTRIES_QUERY, (os.fsencode(path),))
+        }
+
+        rows = {}
+        changes = []
+        for name, entry_st in entries:
+            values = _row(entry_st)
+            rows[name] = values
+            flags = entry_flags(entry_st.st_mode)
+            old = previous.get(name)
+            if flags and not self.baseline and (old is None or list(values) != old):
+                changes.append({
+                    "path": os.path.join(path, name),
+                    "change": "new" if old is None else "changed",
+                    "flags": flags,
+                    "permissions": stat.filemode(entry_st.st_mode),
+                    "previous_permissions": stat.filemode(old[0]) if old else None
+                })
+
+        removed_dirs = [os.path.join(path, name) for name, old in previous.items()
+                        if name not in rows and stat.S_ISDIR(old[0])]
+
+        with self._lock:
+            self._dirs.append((os.fsencode(path), st.st_mtime_ns, st.st_ctime_ns, st.st_ino, len(rows)))
+            self._entries[path] = rows
+            self._removed_dirs.extend(removed_dirs)
+            self.changes.extend(changes)
+
+    def commit(self) -> None:
+        """Grava as listagens da varredura e o contador de execuções"""
+        self.close()
+        conn = sqlite3.connect(self.db_path)
+        try:
+            with conn:
+                # Verificação completa reconstrói o índice (descarta raízes que saíram da configuração)
+                if self.full:
+                    conn.execute("DELETE FROM dirs")
+                    conn.execute("DELETE FROM entries")
+                for path in self._removed_dirs:
+                    # Subárvore removida: o diretório e tudo abaixo dele ("/" < "0" fecha o
+                    # intervalo de caminhos com o prefixo, usando a chave primária)
+                    path = os.fsencode(path)
+                    lower, upper = path + b'/', path + b'0'
+                    conn.execute("DELETE FROM dirs WHERE path = ? OR (path > ? AND path < ?)",
+                                 (path, lower, upper))
+                    conn.execute("DELETE FROM entries WHERE parent = ? OR (parent > ? AND parent < ?)",
+                                 (path, lower, upper))
+                for path, rows in self._entries.items():
+                    path = os.fsencode(path)
+                    conn.execute("DELETE FROM entries WHERE parent = ?", (path,))
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        [(path, os.fsencode(name)) + values for name, values in rows.items()]
+                    )
+                conn.executemany("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?, ?, ?)", self._dirs)
+
+                runs = 0 if self.full else runs_since_full(conn) + 1
+                conn.execute("INSERT OR REPLACE INTO meta VALUES ('runs_since_full', ?)", (str(runs),))
+        finally:
+            conn.close()
+
+        # Várias raízes podem alcançar o mesmo diretório com verificações diferentes
+        unique = {}
+        for change in self.changes:
+            unique.setdefault(change["path"], change)
+        self.changes = sorted(unique.values(), key=lambda c: c["path"])
+
+    def close(self) -> None:
+        """Fecha as conexões de leitura das threads"""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+
+def runs_since_full(conn: sqlite3.Connection) -> int:
+    """Execuções incrementais desde a última verificação completa"""
+    row = conn.execute("SELECT value FROM meta WHERE key = 'runs_since_full'").fetchone()
+    return int(row[0]) if row else 0
+
+
+def open_scan_index(config: Dict[str, Any], force_full: bool = False) -> ScanIndex:
+    """
+    Abre o índice do diretório de estado decidindo se a execução é completa
+
+    A execução é completa se pedida, se o índice está vazio ou se já houve
+    scan_index_full_every execuções incrementais desde a última completa.
+    """
+    full_every = config.get("monitoring", {}).get("scan_index_full_every", DEFAULT_FULL_EVERY)
+    db_path = str(get_state_path(config, INDEX_FILE))
+
+    index = ScanIndex(db_path)
+    if not force_full and not index.baseline:
+        conn = sqlite3.connect(db_path)
+        try:
+            force_full = runs_since_full(conn) >= full_every
+        finally:
+            conn.close()
+    index.full = force_full or index.baseline
+    return index
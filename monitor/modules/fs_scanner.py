@@ -0,0 +1,375 @@
+"""
+Módulo de varredura do sistema de arquivos para as verificações de permissões
+
+Um único percurso com os.scandir por raiz avalia todas as verificações
+(SUID, SGID, world-writable, sem dono/grupo) a partir de um único lstat por
+entrada, em vez de um find por raiz e por verificação. Raízes aninhadas
+(ex.: /usr e /usr/bin) são percorridas uma vez só: ao chegar na raiz
+interna, as verificações dela se somam às herdadas do diretório pai.
+
+As raízes são canonizadas com realpath (no Fedora /bin e /sbin são links
+para /usr/bin e /usr/sbin) e cada diretório é identificado por
+(st_dev, st_ino): um diretório alcançado de novo por outra raiz ou por um
+bind mount não é percorrido nem reportado duas vezes.
+
+Com scan_workers > 1, os diretórios vão para uma fila compartilhada da
+qual um pool de threads retira trabalho (a latência de stat em árvores
+grandes ou em rede se sobrepõe; as chamadas ao kernel liberam o GIL).
+Cada thread pode baixar a própria prioridade de I/O (ioprio_set), para
+que uma varredura do sistema inteiro não dispute disco com os serviços.
+"""
+import ctypes
+import grp
+import os
+import platform
+import pwd
+import queue
+import stat
+import threading
+from typing import Dict, List, Any, Optional, Set, Tuple
+
+from .fs_index import ScanIndex
+
+
+SCAN_CHECKS = ("suid", "sgid", "world_writable", "unowned")
+
+# Raízes padrão de cada verificação (scan_roots na configuração substitui)
+DEFAULT_SCAN_ROOTS = {
+    "suid": ['/bin', '/sbin', '/usr/bin', '/usr/sbin', '/usr/local/bin'],
+    "sgid": ['/bin', '/sbin', '/usr/bin', '/usr/sbin'],
+    "world_writable": ['/etc', '/bin', '/sbin', '/usr/bin', '/usr/sbin'],
+    "unowned": ['/home']
+}
+
+
+# ioprio_set(2): número da syscall por arquitetura e classes de prioridade
+IOPRIO_SET_SYSCALL = {"x86_64": 251, "i686": 289, "aarch64": 30, "ppc64le": 273, "s390x": 282}
+IOPRIO_CLASSES = {"realtime": 1, "best-effort": 2, "idle": 3}
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_SHIFT = 13
+
+DEFAULT_SCAN_WORKERS = 8
+
+
+def set_thread_io_priority(io_class: str, level: int = 7) -> bool:
+    """
+    Ajusta a prioridade de I/O da thread atual (como ionice, mas por thread)
+
+    Args:
+        io_class: "idle", "best-effort" ou "realtime"
+        level: 0 (mais alta) a 7 (mais baixa), ignorado para idle
+
+    Returns:
+        True se aplicada
+    """
+    number = IOPRIO_SET_SYSCALL.get(platform.machine())
+    if number is None or io_class not in IOPRIO_CLASSES:
+        return False
+    value = (IOPRIO_CLASSES[io_class] << IOPRIO_CLASS_SHIFT) | (0 if io_class == "idle" else level)
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        # who = 0: a thread chamadora
+        return libc.syscall(number, IOPRIO_WHO_PROCESS, 0, value) == 0
+    except (OSError, AttributeError):
+        return False
+
+
+def build_scan_plan(config: Dict[str, Any], checks: Optional[List[str]] = None) -> Dict[str, Set[str]]:
+    """
+    Raiz -> verificações a aplicar nela
+
+    Args:
+        config: Configuração do monitor (monitoring.scan_roots sobrescreve as raízes por verificação)
+        checks: Verificações habilitadas (padrão: todas)
+    """
+    roots = dict(DEFAULT_SCAN_ROOTS)
+    roots.update(config.get("monitoring", {}).get("scan_roots", {}))
+
+    plan = {}
+    for check in checks if checks is not None else SCAN_CHECKS:
+        for root in roots.get(check, []):
+            root = os.path.realpath(root)
+            plan.setdefault(root, set()).add(check)
+    return plan
+
+
+def _top_level_roots(plan: Dict[str, Set[str]]) -> List[str]:
+    """Raízes que não estão dentro de outra raiz do plano"""
+    top = []
+    for root in sorted(plan):
+        if not any(root == parent or root.startswith(parent.rstrip('/') + '/') for parent in top):
+            top.append(root)
+    return top
+
+
+class _Owners:
+    """UIDs/GIDs conhecidos e nomes (carregados uma vez por varredura)"""
+
+    def __init__(self):
+        self.users = {p.pw_uid: p.pw_name for p in pwd.getpwall()}
+        self.groups = {g.gr_gid: g.gr_name for g in grp.getgrall()}
+
+    def user(self, uid: int) -> str:
+        return self.users.get(uid, str(uid))
+
+    def group(self, gid: int) -> str:
+        return self.groups.get(gid, str(gid))
+
+
+class _Visited:
+    """
+    Diretórios já reivindicados, por (st_dev, st_ino), com as verificações aplicadas
+
+    Um diretório alcançado de novo só é percorrido outra vez se o novo
+    caminho traz verificações que ainda não foram aplicadas nele (e só
+    com elas).
+    """
+
+    def __init__(self):
+        self._seen = {}
+        self._lock = threading.Lock()
+        self.duplicates = 0
+
+    def claim(self, st: os.stat_result, checks: Set[str]) -> Set[str]:
+        """Verificações ainda não aplicadas ao diretório (vazio: pular)"""
+        key = (st.st_dev, st.st_ino)
+        with self._lock:
+            applied = self._seen.get(key)
+            if applied is None:
+                self._seen[key] = set(checks)
+                return checks
+            missing = checks - applied
+            if not missing:
+                self.duplicates += 1
+            applied |= missing
+            return missing
+
+
+def _evaluate(path: str, st: os.stat_result, checks: Set[str], owners: _Owners,
+              results: Dict[str, List[Dict[str, Any]]]) -> None:
+    """Aplica as verificações ativas a uma entrada já com lstat"""
+    mode = st.st_mode
+    if stat.S_ISREG(mode):
+        if "suid" in checks and mode & stat.S_ISUID:
+            results["suid"].append({
+                "path": path,
+                "permissions": stat.filemode(mode),
+                "owner": owners.user(st.st_uid),
+                "size": st.st_size
+            })
+        if "sgid" in checks and mode & stat.S_ISGID:
+            results["sgid"].append({
+                "path": path,
+                "permissions": stat.filemode(mode),
+                "group": owners.group(st.st_gid)
+            })
+        if "world_writable" in checks and mode & stat.S_IWOTH:
+            results["world_writable"].append({
+                "path": path,
+                "permissions": stat.filemode(mode),
+                "severity": "warning"
+            })
+
+    if "unowned" in checks and (st.st_uid not in owners.users or st.st_gid not in owners.groups):
+        results["unowned"].append({
+            "path": path,
+            "permissions": stat.filemode(mode),
+            "uid": st.st_uid,
+            "gid": st.st_gid,
+            "severity": "info"
+        })
+
+
+def checks_for_path(plan: Dict[str, Set[str]], path: str) -> Set[str]:
+    """Verificações que se aplicam a um caminho (soma das raízes que o contêm)"""
+    checks = set()
+    for root, root_checks in plan.items():
+        if path == root or path.startswith(root.rstrip('/') + '/'):
+            checks |= root_checks
+    return checks
+
+
+def evaluate_path(path: str, checks: Set[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Avalia um único caminho (lstat) com as verificações dadas
+
+    Returns:
+        Verificação -> entradas encontradas (vazio se o caminho sumiu ou está limpo)
+    """
+    results = {check: [] for check in SCAN_CHECKS}
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return {}
+    _evaluate(path, st, checks, _Owners(), results)
+    return {check: entries for check, entries in results.items() if entries}
+
+
+def scan_directory(path: str, dir_st: os.stat_result, checks: Set[str], owners: _Owners,
+                   results: Dict[str, List[Dict[str, Any]]],
+                   index: Optional[ScanIndex] = None) -> Tuple[List[Tuple[str, os.stat_result]], int]:
+    """
+    Avalia as entradas de um diretório (sem descer)
+
+    Com índice, um diretório inalterado desde a última listagem não é relido:
+    as entradas vêm do índice e só os subdiretórios recebem lstat.
+
+    Returns:
+        ((caminho, lstat) dos subdiretórios, quantidade de entradas avaliadas)
+
+    Raises:
+        OSError: diretório ilegível
+    """
+    subdirs = []
+    indexed = index.unchanged_entries(path, dir_st, "unowned" in checks) if index is not None else None
+    if indexed is not None:
+        entries, total = indexed
+        for name, st in entries:
+            entry_path = os.path.join(path, name)
+            if stat.S_ISDIR(st.st_mode):
+                try:
+                    st = os.lstat(entry_path)
+                except OSError:
+                    continue
+                if stat.S_ISDIR(st.st_mode):
+                    subdirs.append((entry_path, st))
+            _evaluate(entry_path, st, checks, owners, results)
+        return subdirs, total
+
+    listing = []
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            listing.append((entry.name, st))
+            _evaluate(entry.path, st, checks, owners, results)
+            # Links simbólicos não são seguidos
+            if stat.S_ISDIR(st.st_mode):
+                subdirs.append((entry.path, st))
+    if index is not None:
+        index.record_listing(path, dir_st, listing)
+    return subdirs, len(listing)
+
+
+def _new_counters() -> Dict[str, Any]:
+    return {"results": {check: [] for check in SCAN_CHECKS}, "files": 0, "dirs": 0, "errors": 0}
+
+
+def _scan_worker(work: "queue.Queue", plan: Dict[Tuple[int, int], Set[str]], owners: _Owners, visited: _Visited,
+                 counters: Dict[str, Any], io_priority: Optional[str], index: Optional[ScanIndex]) -> None:
+    """Retira diretórios da fila, avalia e enfileira os subdiretórios"""
+    if io_priority:
+        set_thread_io_priority(io_priority)
+
+    while True:
+        item = work.get()
+        if item is None:
+            work.task_done()
+            return
+        path, checks, dir_st = item
+        try:
+            subdirs, count = scan_directory(path, dir_st, checks, owners, counters["results"], index)
+            counters["dirs"] += 1
+            counters["files"] += count
+            for subdir, st in subdirs:
+                # Raízes do plano são reconhecidas pelo inode (valem também via bind mount)
+                nested = plan.get((st.st_dev, st.st_ino))
+                pending = visited.claim(st, checks | nested if nested else checks)
+                if pending:
+                    work.put((subdir, pending, st))
+        except Exception:
+            # Qualquer falha fica restrita ao diretório: uma thread que morre
+            # deixaria a fila com itens e work.join() esperaria para sempre
+            counters["errors"] += 1
+        finally:
+            work.task_done()
+
+
+def scan_filesystem(plan: Dict[str, Set[str]], workers: int = 1,
+                    io_priority: Optional[str] = None, index: Optional[ScanIndex] = None) -> Dict[str, Any]:
+    """
+    Percorre cada raiz do plano uma vez avaliando todas as verificações
+
+    Args:
+        plan: Raiz -> verificações (build_scan_plan)
+        workers: Threads percorrendo diretórios em paralelo
+        io_priority: Classe de I/O das threads ("idle", "best-effort"); None mantém a atual
+        index: Índice de metadados para reaproveitar diretórios inalterados
+               (as alterações são gravadas ao fim da varredura)
+
+    Returns:
+        Dicionário com results (lista por verificação, ordenada por caminho,
+        independente da ordem em que as threads terminam), files_scanned,
+        dirs_scanned, errors (diretórios ilegíveis ou que falharam) e duplicate_dirs (já
+        visitados por outro caminho)
+    """
+    owners = _Owners()
+    visited = _Visited()
+    roots = _new_counters()
+    work = queue.Queue()
+
+    # Raízes iguais por inode (ex.: bind mount) viram uma só, com as verificações somadas
+    by_inode = {}
+    top_level = {}
+    outer = set(_top_level_roots(plan))
+    for root in sorted(plan):
+        try:
+            st = os.lstat(root)
+        except OSError:
+            continue
+        if not stat.S_ISDIR(st.st_mode):
+            continue
+        key = (st.st_dev, st.st_ino)
+        by_inode.setdefault(key, set()).update(plan[root])
+        if root in outer and key not in top_level:
+            top_level[key] = (root, st)
+
+    for key, (root, st) in top_level.items():
+        checks = visited.claim(st, by_inode[key])
+        if not checks:
+            continue
+        _evaluate(root, st, checks, owners, roots["results"])
+        work.put((root, checks, st))
+
+    # Cada thread acumula nos próprios contadores; a junção é feita no fim
+    per_thread = [_new_counters() for _ in range(max(1, workers))]
+    threads = [
+        threading.Thread(target=_scan_worker, args=(work, by_inode, owners, visited, counters, io_priority, index), daemon=True)
+        for counters in per_thread
+    ]
+    for thread in threads:
+        thread.start()
+    work.join()
+    for _ in threads:
+        work.put(None)
+    for thread in threads:
+        thread.join()
+
+    results = roots["results"]
+    for counters in per_thread:
+        for check, entries in counters["results"].items():
+            results[check].extend(entries)
+    for entries in results.values():
+        entries.sort(key=lambda e: e["path"])
+
+    scan = {
+        "results": results,
+        "files_scanned": sum(c["files"] for c in per_thread),
+        "dirs_scanned": sum(c["dirs"] for c in per_thread),
+        "errors": sum(c["errors"] for c in per_thread),
+        "duplicate_dirs": visited.duplicates
+    }
+    if index is not None:
+        index.commit()
+        mode = "baseline" if index.baseline else ("full" if index.full else "incremental")
+        scan["index"] = {
+            "mode": mode,
+            # chmod/chown em arquivo existente não muda o diretório: até a próxima
+            # verificação completa, modos vindos do índice podem estar desatualizados
+            "possibly_stale": mode == "incremental",
+            "reused_dirs": index.reused_dirs,
+            "changes": index.changes
+        }
+    return scan
@@ -0,0 +1,290 @@
+"""
+Módulo de verificação de integridade de arquivos (no estilo do AIDE)
+
+Calcula o SHA-256 de binários SUID/SGID, de tudo sob as raízes
+configuradas (/etc, /usr/sbin...) e dos arquivos críticos, e compara com
+uma linha de base gravada em SQLite no diretório de estado. O hash de cada
+arquivo fica em cache junto com (tamanho, mtime, ctime, inode): só arquivos
+cujo lstat mudou são relidos. A leitura usa um pool de threads (hashlib
+libera o GIL em buffers grandes), então a vazão fica próxima da do disco.
+
+A linha de base é criada na primeira execução e só muda quando aceita
+explicitamente (security_monitor.py --integrity-accept): um arquivo
+alterado continua no relatório até ser aceito.
+
+Caminhos são gravados como BLOB (os.fsencode), então nomes que não são
+UTF-8 válido também entram na linha de base.
+"""
+import hashlib
+import mmap
+import os
+import sqlite3
+import stat
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple
+
+from .state import get_state_path
+
+
+INTEGRITY_DB = "integrity.sqlite"
+
+DEFAULT_INTEGRITY_ROOTS = ["/etc", "/usr/sbin"]
+
+# mmap só para arquivos grandes em árvores que só o gerenciador de pacotes
+# altera: se o arquivo for truncado durante a leitura, o acesso além do fim
+# gera SIGBUS, que o Python não consegue tratar (o processo morre)
+MMAP_MIN_SIZE = 16 * 1024 * 1024
+MMAP_TREES = ("/usr/",)
+
+READ_BUFFER_SIZE = 1024 * 1024
+
+# Limite de itens por lista no relatório (as contagens são sempre completas)
+MAX_REPORTED_FILES = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS observed (
+    path BLOB PRIMARY KEY,
+    size INTEGER,
+    mtime_ns INTEGER,
+    ctime_ns INTEGER,
+    ino INTEGER,
+    mode INTEGER,
+    uid INTEGER,
+    gid INTEGER,
+    sha256 TEXT
+);
+CREATE TABLE IF NOT EXISTS baseline (
+    path BLOB PRIMARY KEY,
+    sha256 TEXT,
+    size INTEGER,
+    mode INTEGER,
+    uid INTEGER,
+    gid INTEGER
+);
+"""
+
+
+def hash_file(path: str, algorithm: str = "sha256") -> Tuple[str, Optional[str]]:
+    """
+    Hash do conteúdo (SHA-256 por padrão; qualquer nome aceito pelo hashlib)
+
+    Leitura com buffer reaproveitado; mmap só em arquivos grandes de MMAP_TREES.
+
+    Returns:
+        (caminho, hex digest) — digest None quando o arquivo não pôde ser lido
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY | getattr(os, "O_NOFOLLOW", 0) | getattr(os, "O_NOATIME", 0))
+    except PermissionError:
+        # O_NOATIME exige ser dono do arquivo (ou CAP_FOWNER)
+        try:
+            fd = os.open(path, os.O_RDONLY | getattr(os, "O_NOFOLLOW", 0))
+        except OSError:
+            return path, None
+    except OSError:
+        return path, None
+
+    try:
+        digest = hashlib.new(algorithm)
+        size = os.fstat(fd).st_size
+        if size >= MMAP_MIN_SIZE and path.startswith(MMAP_TREES):
+            with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as mapped:
+                if hasattr(mapped, "madvise"):
+                    mapped.madvise(mmap.MADV_SEQUENTIAL)
+                digest.update(mapped)
+            return path, digest.hexdigest()
+
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        buffer = bytearray(READ_BUFFER_SIZE)
+        view = memoryview(buffer)
+        while True:
+            count = os.readv(fd, [buffer])
+            if not count:
+                break
+            digest.update(view[:count])
+        return path, digest.hexdigest()
+    except (OSError, ValueError):
+        return path, None
+    finally:
+        os.close(fd)
+
+
+def collect_targets(roots: List[str], extra_paths: List[str]) -> Dict[str, os.stat_result]:
+    """
+    Arquivos regulares sob as raízes mais os caminhos avulsos (lstat de cada um)
+
+    Links simbólicos não são seguidos; raízes são canonizadas para que
+    /sbin e /usr/sbin não apareçam duas vezes.
+    """
+    targets = {}
+    stack = [os.path.realpath(root) for root in roots]
+    visited = set()
+    while stack:
+        path = stack.pop()
+        try:
+            dir_st = os.lstat(path)
+        except OSError:
+            continue
+        key = (dir_st.st_dev, dir_st.st_ino)
+        if not stat.S_ISDIR(dir_st.st_mode) or key in visited:
+            continue
+        visited.add(key)
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        st = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    if stat.S_ISDIR(st.st_mode):
+                        stack.append(entry.path)
+                    elif stat.S_ISREG(st.st_mode):
+                        targets[entry.path] = st
+        except OSError:
+            continue
+
+    for path in extra_paths:
+        try:
+            st = os.lstat(path)
+        except OSError:
+            continue
+        if stat.S_ISREG(st.st_mode):
+            targets[path] = st
+    return targets
+
+
+def _connect(config: Dict[str, Any]) -> sqlite3.Connection:
+    conn = sqlite3.connect(str(get_state_path(config, INTEGRITY_DB)))
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def check_integrity(config: Dict[str, Any], extra_paths: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Compara os arquivos monitorados com a linha de base
+
+    Args:
+        config: Configuração do monitor (integrity_roots, integrity_workers)
+        extra_paths: Caminhos avulsos (binários SUID/SGID, arquivos críticos)
+
+    Returns:
+        Dicionário com modified, added, removed, unreadable e contagens
+    """
+    roots = config.get("monitoring", {}).get("integrity_roots", DEFAULT_INTEGRITY_ROOTS)
+    workers = config.get("monitoring", {}).get("integrity_workers") or os.cpu_count() or 4
+
+    targets = collect_targets(roots, extra_paths or [])
+
+    conn = _connect(config)
+    try:
+        # fsdecode aceita str também (linhas gravadas antes dos caminhos em BLOB)
+        cached = {
+            os.fsdecode(row[0]): row[1:] for row in
+            conn.execute("SELECT path, size, mtime_ns, ctime_ns, ino, sha256 FROM observed")
+        }
+
+        # Só relê arquivos cujo lstat mudou (ctime também, pois mtime pode ser forjado com touch)
+        digests = {}
+        to_hash = []
+        for path, st in targets.items():
+            entry = cached.get(path)
+            if entry and entry[:4] == (st.st_size, st.st_mtime_ns, st.st_ctime_ns, st.st_ino) and entry[4]:
+                digests[path] = entry[4]
+            else:
+                to_hash.append(path)
+
+        hashed_bytes = 0
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for path, digest in pool.map(hash_file, to_hash):
+                digests[path] = digest
+                if digest:
+                    hashed_bytes += targets[path].st_size
+
+        with conn:
+            conn.execute("DELETE FROM observed")
+            conn.executemany(
+                "INSERT INTO observed VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(os.fsencode(path), st.st_size, st.st_mtime_ns, st.st_ctime_ns, st.st_ino,
+                  st.st_mode, st.st_uid, st.st_gid, digests.get(path))
+                 for path, st in targets.items()]
+            )
+
+        baseline = {
+            os.fsdecode(row[0]): row[1:] for row in
+            conn.execute("SELECT path, sha256, size, mode, uid, gid FROM baseline")
+        }
+        created = not baseline
+        if created:
+            _accept(conn)
+            baseline = {}
+    finally:
+        conn.close()
+
+    modified, added = [], []
+    unreadable = sorted(path for path in targets if digests.get(path) is None)
+    for path in sorted(targets):
+        st = targets[path]
+        digest = digests.get(path)
+        if created or digest is None:
+            continue
+        base = baseline.get(path)
+        if base is None:
+            added.append({"path": path, "sha256": digest, "permissions": stat.filemode(st.st_mode)})
+            continue
+        base_sha, base_size, base_mode, base_uid, base_gid = base
+        changes = []
+        if digest != base_sha:
+            changes.append("content")
+        if st.st_mode != base_mode:
+            changes.append("mode")
+        if (st.st_uid, st.st_gid) != (base_uid, base_gid):
+            changes.append("owner")
+        if changes:
+            modified.append({
+                "path": path,
+                "changes": changes,
+                "permissions": stat.filemode(st.st_mode),
+                "baseline_permissions": stat.filemode(base_mode),
+                "sha256": digest,
+                "baseline_sha256": base_sha,
+                "setuid": bool(st.st_mode & (stat.S_ISUID | stat.S_ISGID))
+            })
+    removed = sorted(path for path in baseline if path not in targets)
+
+    return {
+        "baseline_created": created,
+        "files_monitored": len(targets),
+        "files_hashed": len(to_hash),
+        "bytes_hashed": hashed_bytes,
+        "counts": {"modified": len(modified), "added": len(added), "removed": len(removed)},
+        "modified": modified[:MAX_REPORTED_FILES],
+        "added": added[:MAX_REPORTED_FILES],
+        "removed": removed[:MAX_REPORTED_FILES],
+        "unreadable": unreadable[:MAX_REPORTED_FILES]
+    }
+
+
+def _accept(conn: sqlite3.Connection) -> int:
+    """Substitui a linha de base pelo último estado observado"""
+    with conn:
+        conn.execute("DELETE FROM baseline")
+        conn.execute("""
+            INSERT INTO baseline (path, sha256, size, mode, uid, gid)
+            SELECT path, sha256, size, mode, uid, gid FROM observed WHERE sha256 IS NOT NULL
+        """)
+    return conn.execute("SELECT COUNT(*) FROM baseline").fetchone()[0]
+
+
+def accept_integrity_baseline(config: Dict[str, Any]) -> int:
+    """
+    Aceita o último estado observado como nova linha de base
+
+    Returns:
+        Quantidade de arquivos na linha de base
+    """
+    conn = _connect(config)
+    try:
+        return _accept(conn)
+    finally:
+        conn.close()
@@ -0,0 +1,148 @@
+"""
+Estruturas de intervalos compartilhadas pelos analisadores de regras
+"""
+from typing import List, Any, Tuple, Iterable
+
+
+Interval = Tuple[int, int]
+
+
+def merge_intervals(intervals: Iterable[Interval]) -> List[Interval]:
+    """
+    Une intervalos fechados sobrepostos ou adjacentes
+
+    Depois da união os intervalos são disjuntos e não adjacentes, então
+    "X está contido na união" equivale a "X está contido em um deles".
+    """
+    intervals = list(intervals)
+    if len(intervals) == 1:
+        return intervals
+
+    merged = []
+    for lo, hi in sorted(intervals):
+        if merged and lo <= merged[-1][1] + 1:
+            if hi > merged[-1][1]:
+                merged[-1] = (merged[-1][0], hi)
+        else:
+            merged.append((lo, hi))
+    return merged
+
+
+def covers(outer: List[Interval], inner: List[Interval]) -> bool:
+    """
+    Verifica se a união `outer` contém todos os intervalos de `inner`
+
+    Ambas as listas devem estar normalizadas por merge_intervals.
+    """
+    i = 0
+    for lo, hi in inner:
+        while i < len(outer) and outer[i][1] < lo:
+            i += 1
+        if i == len(outer) or outer[i][0] > lo or outer[i][1] < hi:
+            return False
+    return True
+
+
+def subtract_intervals(base: List[Interval], removed: List[Interval]) -> List[Interval]:
+    """Remove de `base` tudo que está em `removed` (ambas normalizadas)"""
+    result = []
+    j = 0
+    for lo, hi in base:
+        while j < len(removed) and removed[j][1] < lo:
+            j += 1
+        k = j
+        while lo <= hi and k < len(removed) and removed[k][0] <= hi:
+            if removed[k][0] > lo:
+                result.append((lo, removed[k][0] - 1))
+            lo = max(lo, removed[k][1] + 1)
+            k += 1
+        if lo <= hi:
+            result.append((lo, hi))
+    return result
+
+
+class _Node:
+    """Nó da árvore: intervalos que cruzam o centro, ordenados pelas duas pontas"""
+
+    __slots__ = ('center', 'by_start', 'by_end', 'left', 'right')
+
+    def __init__(self, center: int, overlapping: List[Tuple[int, int, Any]]):
+        self.center = center
+        self.by_start = sorted(overlapping, key=lambda x: x[0])
+        self.by_end = sorted(overlapping, key=lambda x: x[1], reverse=True)
+        self.left = None
+        self.right = None
+
+
+class IntervalTree:
+    """
+    Árvore de intervalos centrada e estática
+
+    Construída uma vez a partir de (início, fim, valor) e consultada por
+    "quais intervalos contêm o ponto p" em O(log n + k), em vez de comparar
+    o ponto com todos os intervalos.
+    """
+
+    def __init__(self, intervals: Iterable[Tuple[int, int, Any]]):
+        self._root = None
+
+        items = list(intervals)
+        self._size = len(items)
+        if not items:
+            return
+
+        # Construção iterativa (evita recursão profunda com muitos intervalos)
+        stack = [(items, None, None)]
+        while stack:
+            group, parent, side = stack.pop()
+            # Centro = mediana dos inícios (amostrada em grupos grandes)
+            step = max(1, len(group) // 1024)
+            starts = sorted(item[0] for item in group[::step])
+            center = starts[len(starts) // 2]
+
+            left, right, overlapping = [], [], []
+            for item in group:
+                if item[1] < center:
+                    left.append(item)
+                elif item[0] > center:
+                    right.append(item)
+                else:
+                    overlapping.append(item)
+
+            node = _Node(center, overlapping)
+            if parent is None:
+                self._root = node
+            else:
+                setattr(parent, side, node)
+
+            if left:
+                stack.append((left, node, 'left'))
+            if right:
+                stack.append((right, node, 'right'))
+
+    def __len__(self) -> int:
+        return self._size
+
+    def stab(self, point: int) -> List[Any]:
+        """Retorna os valores de todos os intervalos que contêm o ponto"""
+        found = []
+        node = self._root
+
+        while node is not None:
+            if point < node.center:
+                for lo, _, value in node.by_start:
+                    if lo > point:
+                        break
+                    found.append(value)
+                node = node.left
+            elif point > node.center:
+                for _, hi, value in node.by_end:
+                    if hi < point:
+                        break
+                    found.append(value)
+                node = node.right
+            else:
+                found.extend(value for _, _, value in node.by_start)
+                break
+
+        return found
@@ -0,0 +1,293 @@
+"""
+Módulo de enriquecimento de IPs com metadados de prefixo (ASN/país) offline
+
+A base é um arquivo CSV local com uma faixa por linha, em um dos formatos:
+
+    rede,asn,país,organização              (ex: 203.0.113.0/24,AS64500,BR,Exemplo)
+    ip_inicial,ip_final,asn,país,organização
+
+O CSV é compilado uma única vez em um índice binário ordenado no diretório
+de estado, recompilado apenas quando o CSV muda. Faixas sobrepostas são
+achatadas na compilação (cada trecho fica com a faixa mais específica que o
+cobre), então o índice tem faixas disjuntas e basta um candidato por busca.
+O índice é aberto com mmap,
+então abrir uma base com 500k faixas não lê o arquivo inteiro; as consultas
+usam busca binária direto sobre as páginas mapeadas.
+"""
+import csv
+import hashlib
+import heapq
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Iterable
+
+from .ipnet import ip_to_int128, parse_network, to_int128
+from .state import get_state_path, atomic_write
+
+
+INDEX_MAGIC = b"SAIPIDX2"
+# magic, nº de faixas, nº de metadados, tamanho do CSV, mtime do CSV (ns)
+HEADER = struct.Struct(">8sIIQQ")
+# início (16 bytes), fim (16 bytes), índice do metadado
+RECORD = struct.Struct(">16s16sI")
+META_FIELDS = ("asn", "country", "org")
+
+
+def _key(number: int) -> bytes:
+    """Chave de 16 bytes big-endian (ordem de bytes = ordem numérica)"""
+    return number.to_bytes(16, 'big')
+
+
+def _parse_row(row: List[str]):
+    """Converte linha do CSV em (início, fim, metadados) ou None"""
+    row = [col.strip() for col in row]
+    if not row or not row[0] or row[0].startswith('#'):
+        return None
+
+    if '/' in row[0]:
+        network = parse_network(row[0])
+        if network is None:
+            return None
+        start, end = to_int128(network[0], network[1]), to_int128(network[0], network[2])
+        meta = row[1:4]
+    else:
+        start = ip_to_int128(row[0])
+        end = ip_to_int128(row[1]) if len(row) > 1 else None
+        meta = row[2:5]
+
+    # Cabeçalho ou linha inválida
+    if start is None or end is None or end < start:
+        return None
+
+    meta = (meta + [""] * len(META_FIELDS))[:len(META_FIELDS)]
+    return start, end, "\t".join(meta)
+
+
+def flatten_ranges(ranges: List[tuple]) -> List[tuple]:
+    """
+    Converte faixas possivelmente sobrepostas em faixas disjuntas ordenadas
+
+    Cada trecho fica com o metadado da faixa mais estreita que o cobre (em
+    empate, a que veio primeiro no CSV); trechos vizinhos com o mesmo
+    metadado são unidos.
+
+    Args:
+        ranges: (início, fim, id do metadado) na ordem do CSV
+    """
+    boundaries = sorted({start for start, _, _ in ranges} | {end + 1 for _, end, _ in ranges})
+    by_start = sorted(((start, order, end, meta_id) for order, (start, end, meta_id) in enumerate(ranges)))
+
+    flat = []
+    active = []
+    next_range = 0
+    for i, point in enumerate(boundaries[:-1]):
+        while next_range < len(by_start) and by_start[next_range][0] == point:
+            start, order, end, meta_id = by_start[next_range]
+            heapq.heappush(active, (end - start, order, end, meta_id))
+            next_range += 1
+        # Faixas que terminaram antes deste trecho saem do topo sob demanda
+        while active and active[0][2] < point:
+            heapq.heappop(active)
+        if not active:
+            continue
+        segment_end = boundaries[i + 1] - 1
+        meta_id = active[0][3]
+        if flat and flat[-1][2] == meta_id and flat[-1][1] + 1 == point:
+            flat[-1] = (flat[-1][0], segment_end, meta_id)
+        else:
+            flat.append((point, segment_end, meta_id))
+    return flat
+
+
+def build_index(csv_path: Path, index_path: Path) -> int:
+    """
+    Compila o CSV de faixas em índice binário ordenado
+
+    Returns:
+        Número de faixas indexadas
+    """
+    source_stat = os.stat(csv_path)
+    ranges = []
+    meta_ids = {}
+
+    with open(csv_path, 'r', encoding='utf-8', errors='replace', newline='') as f:
+        for row in csv.reader(f):
+            parsed = _parse_row(row)
+            if parsed is None:
+                continue
+            start, end, meta = parsed
+            meta_id = meta_ids.setdefault(meta, len(meta_ids))
+            ranges.append((start, end, meta_id))
+
+    ranges = flatten_ranges(ranges)
+
+    # Tabela de metadados: offsets (M+1) seguidos do blob UTF-8
+    metas = [m.encode('utf-8') for m, _ in sorted(meta_ids.items(), key=lambda x: x[1])]
+    offsets = [0]
+    for meta in metas:
+        offsets.append(offsets[-1] + len(meta))
+
+    parts = [HEADER.pack(INDEX_MAGIC, len(ranges), len(metas),
+                         source_stat.st_size, source_stat.st_mtime_ns)]
+    parts.extend(RECORD.pack(_key(start), _key(end), meta_id) for start, end, meta_id in ranges)
+    parts.append(struct.pack(f">{len(offsets)}I", *offsets))
+    parts.extend(metas)
+
+    atomic_write(index_path, b"".join(parts))
+    return len(ranges)
+
+
+class PrefixDatabase:
+    """Índice de faixas de IP mapeado em memória com busca binária"""
+
+    def __init__(self, index_path: Path):
+        self._file = open(index_path, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.count, self.meta_count, self.source_size, self.source_mtime = \
+            HEADER.unpack_from(self._mm, 0)
+        if magic != INDEX_MAGIC:
+            self.close()
+            raise ValueError(f"Índice inválido: {index_path}")
+
+        self._records_offset = HEADER.size
+        self._offsets_offset = self._records_offset + self.count * RECORD.size
+        self._blob_offset = self._offsets_offset + (self.meta_count + 1) * 4
+
+    def close(self) -> None:
+        """Libera o mmap e o arquivo"""
+        self._mm.close()
+        self._file.close()
+
+    def _start_key(self, index: int) -> bytes:
+        offset = self._records_offset + index * RECORD.size
+        return self._mm[offset:offset + 16]
+
+    def _meta(self, meta_id: int) -> Dict[str, str]:
+        start, end = struct.unpack_from(">II", self._mm, self._offsets_offset + meta_id * 4)
+        values = self._mm[self._blob_offset + start:self._blob_offset + end].decode('utf-8').split("\t")
+        return {field: value for field, value in zip(META_FIELDS, values) if value}
+
+    def _find(self, key: bytes, lo: int) -> int:
+        """Índice da última faixa com início <= key (busca a partir de lo)"""
+        hi = self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._start_key(mid) <= key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo - 1
+
+    def lookup_many(self, ips: Iterable[str]) -> Dict[str, Dict[str, str]]:
+        """
+        Consulta um lote de IPs
+
+        Os IPs são ordenados antes da busca, então cada busca binária começa
+        onde a anterior terminou e o lote inteiro percorre o índice uma vez.
+        """
+        keyed = []
+        for ip in set(ips):
+            number = ip_to_int128(ip)
+            if number is not None:
+                keyed.append((_key(number), ip))
+        keyed.sort()
+
+        results = {}
+        lo = 0
+        for key, ip in keyed:
+            index = self._find(key, lo)
+            if index < 0:
+                continue
+            lo = index
+            offset = self._records_offset + index * RECORD.size
+            _, end, meta_id = RECORD.unpack_from(self._mm, offset)
+            if key <= end:
+                results[ip] = self._meta(meta_id)
+
+        return results
+
+
+def open_prefix_database(config: Dict[str, Any]) -> Optional[PrefixDatabase]:
+    """
+    Abre a base de prefixos configurada, recompilando o índice se o CSV mudou
+
+    Returns:
+        PrefixDatabase ou None se não configurada
+    """
+    db_path = config.get("monitoring", {}).get("ip_prefix_db")
+    if not db_path:
+        return None
+
+    csv_path = Path(db_path).expanduser()
+    source_stat = os.stat(csv_path)
+    path_hash = hashlib.sha1(str(csv_path.resolve()).encode('utf-8')).hexdigest()[:12]
+    index_path = get_state_path(config, f"ip_prefix_{path_hash}.idx")
+
+    database = None
+    if index_path.exists():
+        try:
+            database = PrefixDatabase(index_path)
+        except (ValueError, struct.error):
+            # Índice de versão anterior ou corrompido: recompilar
+            database = None
+        if database is not None and (database.source_size, database.source_mtime) != (source_stat.st_size, source_stat.st_mtime_ns):
+            database.close()
+            database = None
+
+    if database is None:
+        build_index(csv_path, index_path)
+        database = PrefixDatabase(index_path)
+
+    return database
+
+
+def _collect_ip_entries(metrics: Dict[str, Any]) -> List[tuple]:
+    """Lista (dict do relatório, IP) de todos os IPs a enriquecer"""
+    entries = []
+
+    brute_force = metrics.get("authentication", {}).get("brute_force_analysis", {})
+    for item in brute_force.get("suspicious_ips", []):
+        if isinstance(item, dict) and item.get("ip"):
+            entries.append((item, item["ip"]))
+    for item in brute_force.get("suspicious_prefixes", []):
+        if isinstance(item, dict) and item.get("prefix"):
+            entries.append((item, item["prefix"].split('/')[0]))
+
+    connections = metrics.get("ports", {}).get("established_connections", {})
+    for item in connections.get("top_remote_ips", []):
+        if isinstance(item, dict) and item.get("ip"):
+            entries.append((item, item["ip"]))
+
+    return entries
+
+
+def enrich_metrics(metrics: Dict[str, Any], config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Anexa ASN/país/organização aos IPs do relatório em uma única consulta em lote
+
+    Returns:
+        Resumo do enriquecimento
+    """
+    database = open_prefix_database(config)
+    if database is None:
+        return {"enabled": False}
+
+    try:
+        entries = _collect_ip_entries(metrics)
+        results = database.lookup_many(ip for _, ip in entries)
+
+        for item, ip in entries:
+            if ip in results:
+                item["network_info"] = results[ip]
+
+        return {
+            "enabled": True,
+            "ranges_indexed": database.count,
+            "ips_looked_up": len(set(ip for _, ip in entries)),
+            "ips_matched": len(results)
+        }
+    finally:
+        database.close()
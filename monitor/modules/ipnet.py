@@ -0,0 +1,219 @@
+"""
+Utilitários de endereços IP compartilhados pelos módulos de monitoramento
+"""
+import ipaddress
+import socket
+from typing import Dict, List, Any, Optional, Tuple
+
+
+# Comprimentos de prefixo agregados por padrão (por versão de IP)
+DEFAULT_PREFIX_LENGTHS = {
+    4: [16, 24],
+    6: [48, 64]
+}
+
+# Máximo de usuários guardados por prefixo (evita crescimento sem limite)
+MAX_USERS_PER_PREFIX = 10
+
+
+def parse_ip(value: str) -> Optional[Tuple[int, int]]:
+    """
+    Converte string de IP em (versão, valor inteiro)
+
+    Usa inet_pton em vez de ipaddress (bem mais rápido em lotes grandes).
+
+    Returns:
+        Tupla (4 ou 6, inteiro) ou None se não for um IP válido
+    """
+    try:
+        value = value.strip()
+        if ':' not in value:
+            return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, value), 'big')
+        number = int.from_bytes(socket.inet_pton(socket.AF_INET6, value), 'big')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+    # IPv4 mapeado em IPv6 (::ffff:a.b.c.d) é tratado como IPv4
+    if number >> 32 == 0xFFFF:
+        return 4, number & 0xFFFFFFFF
+
+    return 6, number
+
+
+def parse_network(value: str) -> Optional[Tuple[int, int, int]]:
+    """
+    Converte rede em notação CIDR (ou IP isolado) em (versão, início, fim)
+
+    Bits de host são ignorados (equivale a strict=False).
+    """
+    address, _, length = value.strip().partition('/')
+    parsed = parse_ip(address)
+    if parsed is None:
+        return None
+
+    version, number = parsed
+    bits = 32 if version == 4 else 128
+    try:
+        length = int(length) if length else bits
+    except ValueError:
+        return None
+    if not 0 <= length <= bits:
+        return None
+
+    host_mask = (1 << (bits - length)) - 1
+    start = number & ~host_mask
+    return version, start, start | host_mask
+
+
+def ip_to_int128(value: str) -> Optional[int]:
+    """
+    Converte IP em inteiro de 128 bits num espaço único IPv4/IPv6
+
+    IPv4 é mapeado em ::ffff:0:0/96, então intervalos IPv4 e IPv6 podem
+    ser ordenados e comparados juntos.
+    """
+    parsed = parse_ip(value)
+    if parsed is None:
+        return None
+
+    return to_int128(*parsed)
+
+
+def to_int128(version: int, number: int) -> int:
+    """Mapeia valor IPv4 para o espaço de 128 bits (IPv6 permanece igual)"""
+    return (0xFFFF << 32) | number if version == 4 else number
+
+
+class _TrieNode:
+    """Nó da trie de prefixos"""
+
+    __slots__ = ('children', 'attempts', 'sources', 'users')
+
+    def __init__(self):
+        self.children = {}
+        self.attempts = 0
+        self.sources = 0
+        self.users = set()
+
+
+class PrefixTrie:
+    """
+    Trie de prefixos IPv4/IPv6 com agregação em comprimentos configurados
+
+    Cada nível da trie corresponde a um comprimento de prefixo configurado
+    (ex: /16 e /24), e o último nível é o endereço completo. Os contadores
+    são acumulados ao longo do caminho durante a inserção, então o custo
+    por evento é proporcional ao número de níveis e não ao número de bits.
+    """
+
+    def __init__(self, prefix_lengths: Optional[Dict[int, List[int]]] = None):
+        """
+        Args:
+            prefix_lengths: Comprimentos a agregar por versão, ex: {4: [16, 24], 6: [48, 64]}
+        """
+        prefix_lengths = prefix_lengths or DEFAULT_PREFIX_LENGTHS
+
+        self._bits = {4: 32, 6: 128}
+        self._levels = {}
+        self._roots = {}
+
+        for version, bits in self._bits.items():
+            lengths = sorted(set(
+                length for length in prefix_lengths.get(version, [])
+                if 0 < length < bits
+            ))
+            self._levels[version] = lengths + [bits]
+            self._roots[version] = _TrieNode()
+
+    def insert(self, ip: str, user: Optional[str] = None, count: int = 1) -> bool:
+        """
+        Registra evento(s) de um endereço IP
+
+        Args:
+            ip: Endereço IP de origem
+            user: Usuário alvo (opcional)
+            count: Número de eventos
+
+        Returns:
+            True se o IP foi inserido, False se inválido
+        """
+        parsed = parse_ip(ip)
+        if parsed is None:
+            return False
+
+        version, value = parsed
+        bits = self._bits[version]
+        node = self._roots[version]
+        path = []
+        previous = 0
+        is_new_source = False
+
+        for depth in self._levels[version]:
+            chunk = (value >> (bits - depth)) & ((1 << (depth - previous)) - 1)
+            child = node.children.get(chunk)
+            if child is None:
+                child = _TrieNode()
+                node.children[chunk] = child
+                is_new_source = True
+            path.append(child)
+            node = child
+            previous = depth
+
+        for node in path:
+            node.attempts += count
+            if is_new_source:
+                node.sources += 1
+            if user and len(node.users) < MAX_USERS_PER_PREFIX:
+                node.users.add(user)
+
+        return True
+
+    def hot_prefixes(self, min_attempts: int, min_sources: int) -> List[Dict[str, Any]]:
+        """
+        Retorna prefixos que ultrapassam os limites de tentativas e de origens
+
+        Um prefixo cujas tentativas vêm todas de um único sub-prefixo já
+        reportado é omitido, para não repetir o mesmo ataque em vários níveis.
+        """
+        hot = []
+
+        for version, root in self._roots.items():
+            bits = self._bits[version]
+            levels = self._levels[version][:-1]  # Último nível = endereço completo
+            if not levels:
+                continue
+
+            # DFS iterativo: (nó, valor do prefixo, índice do nível)
+            stack = [(child, chunk, 0) for chunk, child in root.children.items()]
+            while stack:
+                node, value, level_index = stack.pop()
+                length = levels[level_index]
+
+                if level_index + 1 < len(levels):
+                    shift = levels[level_index + 1] - length
+                    for chunk, child in node.children.items():
+                        stack.append((child, (value << shift) | chunk, level_index + 1))
+
+                if node.attempts < min_attempts or node.sources < min_sources:
+                    continue
+
+                # Omitir se um único filho concentra todas as tentativas
+                if level_index + 1 < len(levels) and any(
+                    child.attempts == node.attempts for child in node.children.values()
+                ):
+                    continue
+
+                network_class = ipaddress.IPv4Network if version == 4 else ipaddress.IPv6Network
+                network = network_class((value << (bits - length), length))
+
+                hot.append({
+                    "prefix": str(network),
+                    "prefix_length": length,
+                    "attempts": node.attempts,
+                    "unique_sources": node.sources,
+                    "users_attempted": sorted(node.users),
+                    "severity": "critical" if node.attempts > 100 else "warning"
+                })
+
+        hot.sort(key=lambda x: x['attempts'], reverse=True)
+        return hot
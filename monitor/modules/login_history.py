@@ -0,0 +1,170 @@
+"""
+Módulo de histórico de logins por usuário (origens e métodos já vistos)
+
+Cada fato "usuário X já logou a partir do prefixo P", "usuário X já usou o
+método M" e "usuário X já usou M a partir de P" vira uma chave de 64 bits
+(blake2b). O conjunto de chaves fica em um único arquivo binário ordenado no
+diretório de estado, mantido em memória no mesmo formato (array ordenado,
+consulta por busca binária) e regravado uma vez no fim da execução com as
+chaves novas intercaladas: 8 bytes por fato, em disco e em memória, sem
+reprocessar logs antigos.
+"""
+import bisect
+import hashlib
+import heapq
+import socket
+from array import array
+from typing import Dict, List, Any, Optional
+
+from .ipnet import parse_ip, parse_network
+from .state import get_state_path, atomic_write, load_state, save_state
+
+
+HISTORY_FILE = "login_history.bin"
+
+# Prefixo usado como "origem" de um login (por versão de IP)
+DEFAULT_SOURCE_PREFIX = {
+    4: 24,
+    6: 64
+}
+
+# Máximo de novidades listadas no relatório
+MAX_REPORTED_ANOMALIES = 100
+
+
+def _fact_key(*parts: str) -> int:
+    """Chave de 64 bits de um fato do histórico"""
+    digest = hashlib.blake2b("\0".join(parts).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def source_prefix(ip: str, prefix_lengths: Optional[Dict[int, int]] = None) -> Optional[str]:
+    """Agrega IP de origem no prefixo configurado (ex: 203.0.113.0/24)"""
+    prefix_lengths = prefix_lengths or DEFAULT_SOURCE_PREFIX
+    parsed = parse_ip(ip)
+    if parsed is None:
+        return None
+
+    version = parsed[0]
+    length = prefix_lengths.get(version, DEFAULT_SOURCE_PREFIX[version])
+    network = parse_network(f"{ip}/{length}")
+    if network is None:
+        return None
+
+    bits = 32 if version == 4 else 128
+    start = network[1].to_bytes(bits // 8, 'big')
+    family = socket.AF_INET if version == 4 else socket.AF_INET6
+    return f"{socket.inet_ntop(family, start)}/{length}"
+
+
+class LoginHistory:
+    """Conjunto persistido de fatos de login já vistos"""
+
+    def __init__(self, config: Dict[str, Any]):
+        self.path = get_state_path(config, HISTORY_FILE)
+        # Chaves gravadas (ordenadas) e as vistas pela primeira vez nesta execução
+        self._stored = array('Q')
+        self._added = set()
+
+        try:
+            with open(self.path, 'rb') as f:
+                self._stored.frombytes(f.read())
+        except FileNotFoundError:
+            pass
+
+        self.is_baseline = not self._stored
+
+    def __len__(self) -> int:
+        return len(self._stored) + len(self._added)
+
+    def __contains__(self, key: int) -> bool:
+        if key in self._added:
+            return True
+        i = bisect.bisect_left(self._stored, key)
+        return i < len(self._stored) and self._stored[i] == key
+
+    def add(self, *parts: str) -> bool:
+        """Registra fato; retorna True se ele nunca tinha sido visto"""
+        key = _fact_key(*parts)
+        if key in self:
+            return False
+        self._added.add(key)
+        return True
+
+    def save(self) -> None:
+        """Intercala as chaves novas no array ordenado e regrava (somente se houve novidades)"""
+        if not self._added:
+            return
+        self._stored = array('Q', heapq.merge(self._stored, sorted(self._added)))
+        atomic_write(self.path, self._stored.tobytes())
+        self._added = set()
+
+
+def analyze_login_sources(logins: List[Dict[str, Any]], config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Compara logins bem-sucedidos com o histórico e atualiza o histórico
+
+    Gera anomalia quando o usuário loga a partir de um prefixo de origem
+    nunca visto, usa um método de autenticação novo ou combina origem e
+    método conhecidos de uma forma inédita. Na primeira execução o
+    histórico é apenas criado (linha de base), sem anomalias.
+    """
+    monitoring = config.get("monitoring", {})
+    lengths = monitoring.get("login_source_prefix_lengths", {})
+    prefix_lengths = {
+        4: lengths.get("ipv4", DEFAULT_SOURCE_PREFIX[4]),
+        6: lengths.get("ipv6", DEFAULT_SOURCE_PREFIX[6])
+    }
+
+    history = LoginHistory(config)
+    cursor = load_state(config, "login_history_cursor", default={}) or {}
+    last_timestamp = cursor.get("last_timestamp", 0.0)
+    newest_timestamp = last_timestamp
+
+    anomalies = []
+    processed = 0
+
+    for login in logins:
+        if "error" in login or login.get("timestamp_unix", 0.0) <= last_timestamp:
+            continue
+        processed += 1
+        newest_timestamp = max(newest_timestamp, login["timestamp_unix"])
+
+        user = login.get("user", "unknown")
+        method = login.get("auth_method", "unknown")
+        source = source_prefix(login.get("source_ip", ""), prefix_lengths) or "unknown"
+
+        new_user = history.add("user", user)
+        reasons = []
+        if history.add("source", user, source):
+            reasons.append("new_source")
+        if history.add("method", user, method):
+            reasons.append("new_method")
+        if history.add("pair", user, source, method) and not reasons:
+            reasons.append("new_combination")
+
+        if history.is_baseline or not reasons:
+            continue
+
+        anomalies.append({
+            "user": user,
+            "source_ip": login.get("source_ip", "unknown"),
+            "source_prefix": source,
+            "auth_method": method,
+            "timestamp": login.get("timestamp", "unknown"),
+            "reasons": ["first_login"] if new_user else reasons,
+            "severity": "info" if new_user or reasons == ["new_combination"] else "warning"
+        })
+
+    history.save()
+    save_state(config, "login_history_cursor", {"last_timestamp": newest_timestamp})
+
+    return {
+        "logins_processed": processed,
+        "anomalies": anomalies[-MAX_REPORTED_ANOMALIES:],
+        "anomalies_count": len(anomalies),
+        "history": {
+            "baseline_created": history.is_baseline,
+            "facts_stored": len(history)
+        }
+    }
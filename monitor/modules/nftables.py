@@ -0,0 +1,538 @@
+"""
+Módulo de análise do ruleset nftables (regras sombreadas, duplicadas e amplas)
+
+O ruleset é lido uma única vez com `nft -j list ruleset`. Cada regra é
+normalizada em dimensões comparáveis (protocolo L4, portas e endereços de
+origem/destino como intervalos) mais um conjunto de condições "opacas"
+(interface, ct state, marks...). A comparação não é par a par:
+
+- duplicatas: assinatura canônica da regra usada como chave de dicionário
+- sombreamento: por chain, as regras terminais são agrupadas por forma
+  (dimensões restritas + condições opacas) e cada grupo tem uma árvore de
+  intervalos; "quais regras anteriores podem cobrir esta?" vira algumas
+  consultas de ponto e só esses candidatos são verificados dimensão a
+  dimensão
+
+Regras com limit/quota/!=/vmap e afins são marcadas como complexas e nunca
+são usadas para declarar outra regra sombreada.
+"""
+import json
+import socket
+import subprocess
+import time
+from typing import Dict, List, Any, Optional
+
+from .intervals import IntervalTree, merge_intervals, covers
+from .ipnet import parse_network, to_int128
+
+
+PORT_SPACE = (0, 65535)
+ADDRESS_SPACE = {
+    "ip": (to_int128(4, 0), to_int128(4, 0xFFFFFFFF)),
+    "ip6": (0, (1 << 128) - 1)
+}
+
+TERMINAL_VERDICTS = ("accept", "drop", "reject", "queue")
+NON_TERMINAL_VERDICTS = ("jump", "goto", "return", "continue")
+
+# Statements sem efeito no casamento da regra
+IGNORED_STATEMENTS = ("counter", "log", "comment")
+
+# Statements que tornam a regra impossível de modelar como conjunto fixo de pacotes
+COMPLEX_STATEMENTS = ("limit", "quota", "meter", "set", "map", "vmap", "xt", "ct count", "synproxy")
+
+# Máximo de achados listados por categoria
+MAX_FINDINGS = 100
+
+
+def get_nft_ruleset() -> Dict[str, Any]:
+    """Lê o ruleset completo em JSON (uma única chamada ao nft)"""
+    result = subprocess.run(
+        ['nft', '-j', 'list', 'ruleset'],
+        capture_output=True,
+        text=True,
+        timeout=60
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or "nft list ruleset falhou")
+    return json.loads(result.stdout)
+
+
+def _port_value(value) -> Optional[int]:
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        try:
+            return socket.getservbyname(value)
+        except OSError:
+            return None
+    return None
+
+
+def _port_intervals(right, op: str, sets: Dict[str, list]) -> Optional[List[tuple]]:
+    """Converte o lado direito de um match de porta em intervalos (None = não modelável)"""
+    if isinstance(right, str) and right.startswith('@'):
+        elements = sets.get(right[1:])
+        if elements is None:
+            return None
+        return _port_intervals({"set": elements}, "==", sets)
+
+    if op in ("<", "<=", ">", ">="):
+        value = _port_value(right)
+        if value is None:
+            return None
+        return [{
+            "<": (0, value - 1),
+            "<=": (0, value),
+            ">": (value + 1, PORT_SPACE[1]),
+            ">=": (value, PORT_SPACE[1])
+        }[op]]
+
+    if isinstance(right, dict) and "set" in right:
+        intervals = []
+        for element in right["set"]:
+            element_intervals = _port_intervals(element, "==", sets)
+            if element_intervals is None:
+                return None
+            intervals.extend(element_intervals)
+        return intervals
+
+    if isinstance(right, dict) and "range" in right:
+        lo, hi = (_port_value(v) for v in right["range"])
+        return None if lo is None or hi is None else [(lo, hi)]
+
+    if isinstance(right, dict) and "elem" in right:
+        return _port_intervals(right["elem"].get("val"), op, sets)
+
+    value = _port_value(right)
+    return None if value is None else [(value, value)]
+
+
+def _address_intervals(right, sets: Dict[str, list]) -> Optional[List[tuple]]:
+    """Converte o lado direito de um match de endereço em intervalos de 128 bits"""
+    if isinstance(right, str) and right.startswith('@'):
+        elements = sets.get(right[1:])
+        if elements is None:
+            return None
+        return _address_intervals({"set": elements}, sets)
+
+    if isinstance(right, dict):
+        if "set" in right:
+            intervals = []
+            for element in right["set"]:
+                element_intervals = _address_intervals(element, sets)
+                if element_intervals is None:
+                    return None
+                intervals.extend(element_intervals)
+            return intervals
+        if "prefix" in right:
+            right = f"{right['prefix']['addr']}/{right['prefix']['len']}"
+        elif "range" in right:
+            bounds = [parse_network(str(v)) for v in right["range"]]
+            if None in bounds:
+                return None
+            return [(to_int128(bounds[0][0], bounds[0][1]), to_int128(bounds[1][0], bounds[1][2]))]
+        elif "elem" in right:
+            return _address_intervals(right["elem"].get("val"), sets)
+        else:
+            return None
+
+    if not isinstance(right, str):
+        return None
+
+    network = parse_network(right)
+    if network is None:
+        return None
+    version, start, end = network
+    return [(to_int128(version, start), to_int128(version, end))]
+
+
+def _opaque_key(statement: Any) -> str:
+    """
+    Chave canônica de um statement
+
+    O nft sempre emite as chaves do JSON na mesma ordem e o json.loads a
+    preserva, então repr() já é canônico e bem mais barato que json.dumps.
+    """
+    return repr(statement)
+
+
+def _restrict(normalized: Dict[str, Any], dimension: str, intervals: List[tuple]) -> None:
+    """Aplica um match à dimensão (dois matches na mesma dimensão: interseção)"""
+    intervals = merge_intervals(intervals)
+    current = normalized[dimension]
+    if current is not None:
+        intervals = merge_intervals(
+            (max(a, c), min(b, d)) for a, b in current for c, d in intervals if max(a, c) <= min(b, d)
+        )
+    normalized[dimension] = intervals
+
+
+def normalize_rule(rule: Dict[str, Any], sets: Dict[str, list]) -> Dict[str, Any]:
+    """
+    Normaliza uma regra do JSON do nft
+
+    Returns:
+        Dicionário com l4proto, sport, dport, saddr, daddr (None = qualquer),
+        opaque (condições não modeladas), verdict, complex e signature
+    """
+    normalized = {
+        "handle": rule.get("handle"),
+        "comment": rule.get("comment"),
+        "l4proto": None,
+        "sport": None,
+        "dport": None,
+        "saddr": None,
+        "daddr": None,
+        "opaque": set(),
+        "verdict": None,
+        "complex": False
+    }
+    signature = []
+
+    for statement in rule.get("expr", []):
+        if not isinstance(statement, dict) or not statement:
+            continue
+        kind = next(iter(statement))
+
+        if kind in IGNORED_STATEMENTS:
+            continue
+        signature.append(statement)
+
+        if kind in TERMINAL_VERDICTS or kind in NON_TERMINAL_VERDICTS:
+            normalized["verdict"] = kind
+            if kind in ("jump", "goto"):
+                normalized["verdict"] = f"{kind} {statement[kind].get('target')}"
+            continue
+
+        if kind != "match":
+            if kind in COMPLEX_STATEMENTS:
+                normalized["complex"] = True
+            normalized["opaque"].add(_opaque_key(statement))
+            continue
+
+        match = statement["match"]
+        op = match.get("op", "==")
+        left = match.get("left", {})
+        right = match.get("right")
+
+        if op in ("!=",) or (isinstance(right, dict) and "vmap" in right):
+            normalized["complex"] = True
+            normalized["opaque"].add(_opaque_key(statement))
+            continue
+
+        payload = left.get("payload") if isinstance(left, dict) else None
+        meta = left.get("meta") if isinstance(left, dict) else None
+
+        if payload and payload.get("field") in ("sport", "dport"):
+            intervals = _port_intervals(right, op, sets)
+            if intervals is not None:
+                _restrict(normalized, payload["field"], intervals)
+                protocol = payload.get("protocol")
+                if protocol and protocol != "th":
+                    normalized["l4proto"] = {protocol} if normalized["l4proto"] is None \
+                        else normalized["l4proto"] & {protocol}
+                continue
+
+        elif payload and payload.get("protocol") in ADDRESS_SPACE and \
+                payload.get("field") in ("saddr", "daddr") and op in ("==", "in"):
+            intervals = _address_intervals(right, sets)
+            if intervals is not None:
+                _restrict(normalized, payload["field"], intervals)
+                continue
+
+        elif meta and meta.get("key") == "l4proto" and op in ("==", "in"):
+            values = right["set"] if isinstance(right, dict) and "set" in right else [right]
+            if all(isinstance(v, str) for v in values):
+                protocols = set(values)
+                normalized["l4proto"] = protocols if normalized["l4proto"] is None \
+                    else normalized["l4proto"] & protocols
+                continue
+
+        if op not in ("==", "in"):
+            normalized["complex"] = True
+        normalized["opaque"].add(_opaque_key(statement))
+
+    normalized["signature"] = _opaque_key(signature)
+    return normalized
+
+
+def _is_covered(earlier: Dict[str, Any], later: Dict[str, Any]) -> bool:
+    """Verifica se todo pacote que casa com `later` também casa com `earlier`"""
+    if not earlier["opaque"] <= later["opaque"]:
+        return False
+
+    if earlier["l4proto"] is not None:
+        if later["l4proto"] is None or not later["l4proto"] <= earlier["l4proto"]:
+            return False
+
+    for dimension in ("sport", "dport", "saddr", "daddr"):
+        outer = earlier[dimension]
+        if outer is None:
+            continue
+        inner = later[dimension]
+        if inner is None or not covers(outer, inner):
+            return False
+
+    return True
+
+
+def _describe_rule(rule: Dict[str, Any]) -> str:
+    """Resumo legível das dimensões modeladas da regra"""
+    parts = []
+    if rule["l4proto"]:
+        parts.append("/".join(sorted(rule["l4proto"])))
+    for dimension in ("dport", "sport"):
+        if rule[dimension] is not None:
+            ranges = [str(lo) if lo == hi else f"{lo}-{hi}" for lo, hi in rule[dimension][:5]]
+            parts.append(f"{dimension} {','.join(ranges)}")
+    for dimension in ("saddr", "daddr"):
+        if rule[dimension] is not None:
+            parts.append(f"{dimension} ({len(rule[dimension])} faixas)")
+    if rule["opaque"]:
+        parts.append(f"+{len(rule['opaque'])} condições")
+    parts.append(rule["verdict"] or "sem veredito")
+    return " ".join(parts)
+
+
+def _rule_reference(chain_key: tuple, rule: Dict[str, Any]) -> Dict[str, Any]:
+    family, table, chain = chain_key
+    reference = {
+        "family": family,
+        "table": table,
+        "chain": chain,
+        "handle": rule["handle"],
+        "rule": _describe_rule(rule)
+    }
+    if rule.get("comment"):
+        reference["comment"] = rule["comment"]
+    return reference
+
+
+def _port_span(intervals: Optional[List[tuple]]) -> int:
+    if intervals is None:
+        return PORT_SPACE[1] - PORT_SPACE[0] + 1
+    return sum(hi - lo + 1 for lo, hi in intervals)
+
+
+# Dimensões indexadas, da mais para a menos seletiva em rulesets típicos
+INDEXED_DIMENSIONS = ("saddr", "daddr", "dport", "sport")
+
+# Acima disso, os subconjuntos de condições opacas não são enumerados
+MAX_OPAQUE_SUBSET = 6
+
+
+def _rule_shape(rule: Dict[str, Any]) -> tuple:
+    """Dimensões restritas pela regra (uma regra só cobre outra restrita nas mesmas)"""
+    return tuple(dimension for dimension in INDEXED_DIMENSIONS if rule[dimension] is not None)
+
+
+def _build_shadow_index(rules: List[Dict[str, Any]], shadowers: List[int]) -> Dict[tuple, Any]:
+    """
+    Indexa as regras que podem sombrear outras
+
+    As regras são agrupadas por (dimensões restritas, condições opacas) e
+    cada grupo tem uma árvore de intervalos sobre a sua dimensão mais
+    seletiva. Grupos sem dimensão restrita guardam só a lista de posições.
+    """
+    groups = {}
+    for position in shadowers:
+        rule = rules[position]
+        key = (_rule_shape(rule), frozenset(rule["opaque"]))
+        groups.setdefault(key, []).append(position)
+
+    index = {}
+    for (shape, opaque), positions in groups.items():
+        if not shape:
+            index[(shape, opaque)] = positions
+            continue
+        dimension = shape[0]
+        index[(shape, opaque)] = IntervalTree(
+            (lo, hi, position) for position in positions for lo, hi in rules[position][dimension]
+        )
+    return index
+
+
+def _subsets(items: tuple):
+    """Todos os subconjuntos de uma tupla pequena"""
+    for mask in range(1 << len(items)):
+        yield tuple(item for bit, item in enumerate(items) if mask >> bit & 1)
+
+
+def _compatible_groups(index: Dict[tuple, Any], shape: tuple, opaque: frozenset) -> List[tuple]:
+    """Grupos do índice cujas regras podem cobrir uma regra com esta forma"""
+    if len(opaque) <= MAX_OPAQUE_SUBSET:
+        keys = (
+            (sub_shape, frozenset(sub_opaque))
+            for sub_shape in _subsets(shape) for sub_opaque in _subsets(tuple(opaque))
+        )
+        return [key for key in keys if key in index]
+
+    return [
+        key for key in index
+        if set(key[0]) <= set(shape) and key[1] <= opaque
+    ]
+
+
+def _shadow_candidates(index: Dict[tuple, Any], rule: Dict[str, Any], group_cache: Dict[tuple, list]) -> List[int]:
+    """Regras anteriores que podem cobrir `rule` (a verificação final é _is_covered)"""
+    form = (_rule_shape(rule), frozenset(rule["opaque"]))
+    keys = group_cache.get(form)
+    if keys is None:
+        keys = group_cache[form] = _compatible_groups(index, *form)
+
+    candidates = []
+    for key in keys:
+        group = index[key]
+        if not key[0]:
+            candidates.extend(group)
+            continue
+        intervals = rule[key[0][0]]
+        if intervals:
+            candidates.extend(group.stab(intervals[0][0]))
+
+    return sorted(candidates)
+
+
+def _find_shadowed(chain_key: tuple, rules: List[Dict[str, Any]], shadowers: List[int]) -> List[Dict[str, Any]]:
+    """Encontra regras da chain que nunca são alcançadas por causa de uma regra anterior"""
+    index = _build_shadow_index(rules, shadowers)
+    group_cache = {}
+    shadowed = []
+
+    for position, rule in enumerate(rules):
+        if rule.get("duplicate"):
+            continue
+        for candidate in _shadow_candidates(index, rule, group_cache):
+            if candidate >= position:
+                break
+            earlier = rules[candidate]
+            if _is_covered(earlier, rule):
+                conflict = earlier["verdict"] != rule["verdict"]
+                shadowed.append({
+                    **_rule_reference(chain_key, rule),
+                    "shadowed_by": earlier["handle"],
+                    "shadowed_by_rule": _describe_rule(earlier),
+                    "conflicting_verdict": conflict,
+                    "severity": "warning" if conflict else "info"
+                })
+                break
+
+    return shadowed
+
+
+def analyze_ruleset(data: Dict[str, Any], config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Analisa o ruleset nftables
+
+    Args:
+        data: Saída de `nft -j list ruleset` já decodificada
+        config: Configuração do monitor
+
+    Returns:
+        Dicionário com contagens, duplicatas, regras sombreadas e amplas
+    """
+    monitoring = (config or {}).get("monitoring", {})
+    broad_port_span = monitoring.get("nft_broad_port_span", 1000)
+    started = time.perf_counter()
+
+    entries = data.get("nftables", [])
+
+    # Conjuntos nomeados por tabela
+    sets = {}
+    base_chains = {}
+    for entry in entries:
+        if "set" in entry:
+            item = entry["set"]
+            sets.setdefault((item.get("family"), item.get("table")), {})[item.get("name")] = item.get("elem", [])
+        elif "chain" in entry:
+            item = entry["chain"]
+            if item.get("hook"):
+                base_chains[(item.get("family"), item.get("table"), item.get("name"))] = item
+
+    # Regras agrupadas por chain, na ordem de avaliação
+    chains = {}
+    tables = set()
+    for entry in entries:
+        if "rule" not in entry:
+            continue
+        item = entry["rule"]
+        chain_key = (item.get("family"), item.get("table"), item.get("chain"))
+        tables.add(chain_key[:2])
+        table_sets = sets.get(chain_key[:2], {})
+        chains.setdefault(chain_key, []).append(normalize_rule(item, table_sets))
+
+    duplicates = []
+    shadowed = []
+    broad_rules = []
+    complex_rules = 0
+    total_rules = 0
+
+    for chain_key, rules in chains.items():
+        total_rules += len(rules)
+        first_by_signature = {}
+        shadowers = []
+
+        for index, rule in enumerate(rules):
+            if rule["complex"]:
+                complex_rules += 1
+
+            # Duplicata exata (mesma assinatura canônica na mesma chain)
+            original = first_by_signature.setdefault(rule["signature"], index)
+            if original != index:
+                duplicates.append({
+                    **_rule_reference(chain_key, rule),
+                    "duplicate_of": rules[original]["handle"],
+                    "severity": "info"
+                })
+                rule["duplicate"] = True
+
+            # Só regras simples e terminais podem sombrear outras
+            if not rule["complex"] and rule["verdict"] in TERMINAL_VERDICTS:
+                shadowers.append(index)
+
+            # Regra ampla: accept em chain base cobrindo faixa grande de portas
+            # ou sem nenhuma condição (interfaces e afins ficam em opaque)
+            if rule["verdict"] == "accept" and chain_key in base_chains and not rule["complex"]:
+                span = _port_span(rule["dport"])
+                if rule["dport"] is not None and span > broad_port_span:
+                    reason = f"aceita {span} portas de destino"
+                elif all(rule[dimension] is None for dimension in ("dport", "sport", "saddr", "daddr", "l4proto")) \
+                        and not rule["opaque"]:
+                    reason = "aceita todo o tráfego"
+                else:
+                    reason = None
+                if reason:
+                    broad_rules.append({
+                        **_rule_reference(chain_key, rule),
+                        "reason": reason,
+                        "severity": "warning"
+                    })
+
+        if shadowers:
+            shadowed.extend(_find_shadowed(chain_key, rules, shadowers))
+
+    return {
+        "tables": len(tables),
+        "chains": len(chains),
+        "base_chains": len(base_chains),
+        "total_rules": total_rules,
+        "complex_rules": complex_rules,
+        "duplicates_count": len(duplicates),
+        "shadowed_count": len(shadowed),
+        "broad_rules_count": len(broad_rules),
+        "duplicates": duplicates[:MAX_FINDINGS],
+        "shadowed": shadowed[:MAX_FINDINGS],
+        "broad_rules": broad_rules[:MAX_FINDINGS],
+        "analysis_time_ms": round((time.perf_counter() - started) * 1000, 1)
+    }
+
+
+def analyze_nftables(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Lê e analisa o ruleset nftables ativo"""
+    try:
+        return analyze_ruleset(get_nft_ruleset(), config)
+    except FileNotFoundError:
+        return {"error": "nft não encontrado"}
+    except Exception as e:
+        return {"error": str(e)}
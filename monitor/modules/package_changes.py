@@ -0,0 +1,155 @@
+"""
+Módulo de diff do conjunto de pacotes instalados entre auditorias
+
+Cada execução guarda o inventário como um array de NEVRAs ordenado por
+(nome, arquitetura) mais um hash dele. Se o hash não mudou, nada mais é
+feito; se mudou, as duas listas ordenadas são percorridas em paralelo
+(merge) para separar pacotes instalados, removidos, atualizados e
+rebaixados em tempo linear.
+"""
+import hashlib
+import subprocess
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple
+
+from .packages import compare_evr, get_installed_packages
+from .state import load_state, save_state
+
+
+# Hash e última mudança ficam separados do array para que uma execução sem
+# mudanças só leia o arquivo pequeno
+PACKAGE_CHANGES_STATE = "package_inventory"
+PACKAGE_ROWS_STATE = "package_inventory_rows"
+
+# Limite de itens por lista no relatório (as contagens são sempre completas)
+MAX_REPORTED_CHANGES = 200
+
+
+def inventory_rows(packages: List[Dict[str, Any]]) -> List[List[Any]]:
+    """Inventário compacto: [nome, arch, epoch, versão, release] ordenado"""
+    rows = [[p.get("name", ""), p.get("arch", ""), int(p.get("epoch") or 0),
+             p.get("version", ""), p.get("release", "")] for p in packages]
+    rows.sort()
+    return rows
+
+
+def inventory_hash(rows: List[List[Any]]) -> str:
+    """Hash do inventário ordenado"""
+    digest = hashlib.sha256()
+    for name, arch, epoch, version, release in rows:
+        digest.update(f"{name}\0{arch}\0{epoch}\0{version}\0{release}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _format_evr(row: List[Any]) -> str:
+    epoch = row[2]
+    return f"{epoch}:{row[3]}-{row[4]}" if epoch else f"{row[3]}-{row[4]}"
+
+
+def _format_row(row: List[Any]) -> str:
+    return f"{row[0]}-{_format_evr(row)}.{row[1]}"
+
+
+def _next_group(rows: List[List[Any]], i: int) -> Tuple[Optional[Tuple[str, str]], List[List[Any]], int]:
+    """Próximo grupo de linhas com o mesmo (nome, arch) a partir de i"""
+    if i >= len(rows):
+        return None, [], i
+    key = (rows[i][0], rows[i][1])
+    j = i + 1
+    while j < len(rows) and rows[j][0] == key[0] and rows[j][1] == key[1]:
+        j += 1
+    return key, rows[i:j], j
+
+
+def diff_inventories(old: List[List[Any]], new: List[List[Any]]) -> Dict[str, List[Any]]:
+    """
+    Diff de dois inventários ordenados (merge linear)
+
+    Pacotes com várias versões instaladas ao mesmo tempo (kernel e outros
+    installonly) aparecem como instalados/removidos por versão; os demais,
+    como atualizados ou rebaixados.
+    """
+    changes = {"installed": [], "removed": [], "upgraded": [], "downgraded": []}
+    i = j = 0
+    old_key, old_group, i = _next_group(old, i)
+    new_key, new_group, j = _next_group(new, j)
+
+    while old_key is not None or new_key is not None:
+        if new_key is None or (old_key is not None and old_key < new_key):
+            changes["removed"].extend(_format_row(r) for r in old_group)
+            old_key, old_group, i = _next_group(old, i)
+            continue
+        if old_key is None or new_key < old_key:
+            changes["installed"].extend(_format_row(r) for r in new_group)
+            new_key, new_group, j = _next_group(new, j)
+            continue
+
+        if old_group != new_group:
+            if len(old_group) == 1 and len(new_group) == 1:
+                old_row, new_row = old_group[0], new_group[0]
+                kind = "upgraded" if compare_evr(old_row[2:], new_row[2:]) < 0 else "downgraded"
+                changes[kind].append({
+                    "name": new_row[0],
+                    "arch": new_row[1],
+                    "from": _format_evr(old_row),
+                    "to": _format_evr(new_row)
+                })
+            else:
+                changes["removed"].extend(_format_row(r) for r in old_group if r not in new_group)
+                changes["installed"].extend(_format_row(r) for r in new_group if r not in old_group)
+
+        old_key, old_group, i = _next_group(old, i)
+        new_key, new_group, j = _next_group(new, j)
+
+    return changes
+
+
+def track_package_changes(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Compara o inventário atual com o da última auditoria
+
+    Returns:
+        Dicionário com changed, package_count e as mudanças (da execução atual
+        ou, se nada mudou, as últimas registradas)
+    """
+    try:
+        packages = get_installed_packages(config)
+    except (OSError, RuntimeError, subprocess.TimeoutExpired) as e:
+        return {"error": f"Inventário de pacotes indisponível: {e}"}
+
+    rows = inventory_rows(packages)
+    current_hash = inventory_hash(rows)
+    previous = load_state(config, PACKAGE_CHANGES_STATE, default={})
+
+    result = {
+        "package_count": len(rows),
+        "hash": current_hash[:16],
+        "baseline": not previous
+    }
+
+    if previous.get("hash") == current_hash:
+        result["changed"] = False
+        result["last_change"] = previous.get("last_change")
+        return result
+
+    last_change = previous.get("last_change")
+    if previous:
+        old_rows = load_state(config, PACKAGE_ROWS_STATE, default={}).get("packages", [])
+        changes = diff_inventories(old_rows, rows)
+        last_change = {
+            "timestamp": datetime.now().isoformat(),
+            "previous_run": previous.get("timestamp"),
+            "counts": {kind: len(items) for kind, items in changes.items()},
+            **{kind: items[:MAX_REPORTED_CHANGES] for kind, items in changes.items()}
+        }
+
+    save_state(config, PACKAGE_ROWS_STATE, {"packages": rows})
+    save_state(config, PACKAGE_CHANGES_STATE, {
+        "hash": current_hash,
+        "timestamp": datetime.now().isoformat(),
+        "last_change": last_change
+    })
+
+    result["changed"] = bool(previous)
+    result["last_change"] = last_change
+    return result
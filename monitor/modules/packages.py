@@ -0,0 +1,471 @@
+"""
+Módulo de inventário de pacotes instalados e comparação de versões RPM
+"""
+import os
+import re
+import sqlite3
+import struct
+import subprocess
+from functools import lru_cache
+from typing import Dict, List, Any, Optional, Tuple
+
+from .state import load_state, save_state
+
+
+RPMDB_SQLITE = "/var/lib/rpm/rpmdb.sqlite"
+
+INVENTORY_STATE = "rpm_inventory"
+
+# Tags do header RPM usadas no inventário
+RPMTAG_NAME = 1000
+RPMTAG_VERSION = 1001
+RPMTAG_RELEASE = 1002
+RPMTAG_EPOCH = 1003
+RPMTAG_INSTALLTIME = 1008
+RPMTAG_ARCH = 1022
+RPMTAG_FILESIZES = 1028
+RPMTAG_FILEMODES = 1030
+RPMTAG_FILEDIGESTS = 1035
+RPMTAG_FILEUSERNAME = 1039
+RPMTAG_FILEGROUPNAME = 1040
+RPMTAG_FILEVERIFYFLAGS = 1045
+RPMTAG_DIRINDEXES = 1116
+RPMTAG_DIRNAMES = 1118
+RPMTAG_FILEDIGESTALGO = 5011
+INVENTORY_TAGS = frozenset((RPMTAG_NAME, RPMTAG_VERSION, RPMTAG_RELEASE,
+                            RPMTAG_EPOCH, RPMTAG_INSTALLTIME, RPMTAG_ARCH))
+FILE_OWNER_TAGS = INVENTORY_TAGS | {RPMTAG_DIRINDEXES, RPMTAG_DIRNAMES}
+FILE_VERIFY_TAGS = FILE_OWNER_TAGS | {RPMTAG_FILESIZES, RPMTAG_FILEMODES, RPMTAG_FILEDIGESTS,
+                                      RPMTAG_FILEUSERNAME, RPMTAG_FILEGROUPNAME, RPMTAG_FILEVERIFYFLAGS,
+                                      RPMTAG_FILEDIGESTALGO}
+
+# Algoritmos de FILEDIGESTALGO (PGPHASHALGO_*); sem a tag, o rpm usa MD5
+RPM_DIGEST_ALGOS = {1: "md5", 2: "sha1", 8: "sha256", 9: "sha384", 10: "sha512", 11: "sha224"}
+
+# Bits de FILEVERIFYFLAGS (%verify(not ...) no spec desliga o atributo)
+RPMVERIFY_FILEDIGEST = 1 << 0
+RPMVERIFY_FILESIZE = 1 << 1
+RPMVERIFY_MODE = 1 << 3
+RPMVERIFY_USER = 1 << 4
+RPMVERIFY_GROUP = 1 << 5
+
+RPM_INT16_TYPE = 3
+RPM_INT32_TYPE = 4
+RPM_STRING_TYPE = 6
+RPM_STRING_ARRAY_TYPE = 8
+
+HEADER_PREAMBLE = struct.Struct('>II')
+HEADER_ENTRY = struct.Struct('>iiii')
+
+# Inventário em memória: (chave do rpmdb, pacotes) — reaproveitado no modo daemon
+_inventory_cache = None
+
+RPM_QUERY_FORMAT = '%{NAME}\\t%{EPOCHNUM}\\t%{VERSION}\\t%{RELEASE}\\t%{ARCH}\\t%{INSTALLTIME}\\n'
+
+
+# Segmentos relevantes de uma versão; o resto (".", "-", "_", ...) é separador
+VERSION_SEGMENT = re.compile(r'~|\^|[0-9]+|[a-zA-Z]+')
+
+
+@lru_cache(maxsize=65536)
+def _version_segments(version: str) -> Tuple[str, ...]:
+    return tuple(VERSION_SEGMENT.findall(version))
+
+
+def rpmvercmp(a: str, b: str) -> int:
+    """
+    Compara duas strings de versão com o algoritmo do rpm (rpmvercmp)
+
+    Segmentos numéricos comparam como números e vencem segmentos alfabéticos;
+    "~" ordena antes de tudo (pré-release) e "^" depois do fim (pós-release).
+    A segmentação de cada versão é memorizada, já que as mesmas versões são
+    comparadas muitas vezes ao casar avisos.
+
+    Returns:
+        -1, 0 ou 1
+    """
+    if a == b:
+        return 0
+
+    segments_a = _version_segments(a)
+    segments_b = _version_segments(b)
+    len_a, len_b = len(segments_a), len(segments_b)
+
+    k = 0
+    while k < len_a or k < len_b:
+        seg_a = segments_a[k] if k < len_a else None
+        seg_b = segments_b[k] if k < len_b else None
+        k += 1
+
+        # Til: ordena antes de qualquer coisa, inclusive do fim da string
+        if seg_a == '~' or seg_b == '~':
+            if seg_a != '~':
+                return 1
+            if seg_b != '~':
+                return -1
+            continue
+
+        # Circunflexo: ordena depois do fim da string, antes de qualquer outro segmento
+        if seg_a == '^' or seg_b == '^':
+            if seg_a is None:
+                return -1
+            if seg_b is None:
+                return 1
+            if seg_a != '^':
+                return 1
+            if seg_b != '^':
+                return -1
+            continue
+
+        if seg_a is None or seg_b is None:
+            return -1 if seg_a is None else 1
+
+        numeric_a = seg_a[0] <= '9'
+        numeric_b = seg_b[0] <= '9'
+        if numeric_a != numeric_b:
+            # Segmentos de tipos diferentes: numérico é mais novo
+            return 1 if numeric_a else -1
+
+        if numeric_a:
+            value_a, value_b = int(seg_a), int(seg_b)
+            if value_a != value_b:
+                return 1 if value_a > value_b else -1
+        elif seg_a != seg_b:
+            return 1 if seg_a > seg_b else -1
+
+    return 0
+
+
+def compare_evr(evr_a: Tuple[Any, str, str], evr_b: Tuple[Any, str, str]) -> int:
+    """
+    Compara (epoch, version, release) como o rpm
+
+    Epoch ausente vale 0.
+
+    Returns:
+        -1, 0 ou 1
+    """
+    epoch_a = int(evr_a[0] or 0)
+    epoch_b = int(evr_b[0] or 0)
+    if epoch_a != epoch_b:
+        return 1 if epoch_a > epoch_b else -1
+
+    result = rpmvercmp(evr_a[1], evr_b[1])
+    if result:
+        return result
+    return rpmvercmp(evr_a[2] or "", evr_b[2] or "")
+
+
+def package_evr(package: Dict[str, Any]) -> Tuple[int, str, str]:
+    """Tupla (epoch, version, release) de um pacote do inventário"""
+    return package.get("epoch") or 0, package.get("version", ""), package.get("release", "")
+
+
+def format_nevra(package: Dict[str, Any]) -> str:
+    """Formata nome-[epoch:]versão-release.arch"""
+    epoch = package.get("epoch") or 0
+    evr = f"{epoch}:" if epoch else ""
+    evr += f"{package.get('version', '')}-{package.get('release', '')}"
+    return f"{package.get('name', '')}-{evr}.{package.get('arch', '')}"
+
+
+def read_header(blob: bytes, wanted: frozenset) -> Dict[int, Any]:
+    """
+    Extrai tags de um header RPM (formato do headerExport)
+
+    Layout: il e dl (int32 big-endian), il entradas de 16 bytes
+    (tag, tipo, offset, contagem) e a área de dados. As entradas não vêm
+    ordenadas como um todo: no rpmdb, as tags acrescentadas na instalação
+    (INSTALLTIME, por exemplo) ficam depois das da região imutável. A
+    leitura percorre as entradas até ter encontrado todas as tags desejadas.
+
+    Returns:
+        tag -> str (STRING), lista de str (STRING_ARRAY) ou lista de int (INT16/INT32)
+    """
+    il, _ = HEADER_PREAMBLE.unpack_from(blob, 0)
+    data_start = 8 + 16 * il
+    values = {}
+    remaining = len(wanted)
+
+    for tag, kind, offset, count in HEADER_ENTRY.iter_unpack(blob[8:data_start]):
+        if not remaining:
+            break
+        if tag not in wanted or tag in values:
+            continue
+        remaining -= 1
+        position = data_start + offset
+        if kind == RPM_STRING_TYPE:
+            end = blob.index(b"\0", position)
+            values[tag] = blob[position:end].decode('utf-8', 'replace')
+        elif kind == RPM_STRING_ARRAY_TYPE:
+            strings = []
+            for _ in range(count):
+                end = blob.index(b"\0", position)
+                strings.append(blob[position:end].decode('utf-8', 'replace'))
+                position = end + 1
+            values[tag] = strings
+        elif kind == RPM_INT32_TYPE:
+            values[tag] = list(struct.unpack_from(f'>{count}i', blob, position))
+        elif kind == RPM_INT16_TYPE:
+            # Sem sinal: FILEMODES guarda o st_mode inteiro (tipo + permissões)
+            values[tag] = list(struct.unpack_from(f'>{count}H', blob, position))
+
+    return values
+
+
+def _connect_rpmdb(path: str) -> sqlite3.Connection:
+    """
+    Abre o rpmdb.sqlite somente leitura
+
+    mode=ro basta na maioria dos casos; immutable=1 cobre o WAL sem -shm gravável.
+    """
+    last_error = None
+    for options in ("mode=ro", "immutable=1"):
+        conn = sqlite3.connect(f"file:{path}?{options}", uri=True)
+        try:
+            conn.execute("SELECT 1 FROM Packages LIMIT 1").fetchall()
+            return conn
+        except sqlite3.OperationalError as e:
+            last_error = e
+            conn.close()
+    raise last_error
+
+
+def read_rpmdb_sqlite(path: str = RPMDB_SQLITE) -> List[Dict[str, Any]]:
+    """
+    Lê o inventário direto do rpmdb.sqlite em uma única consulta
+
+    Raises:
+        sqlite3.Error: banco ilegível
+    """
+    conn = _connect_rpmdb(path)
+    try:
+        rows = conn.execute("SELECT blob FROM Packages").fetchall()
+    finally:
+        conn.close()
+
+    packages = []
+    for (blob,) in rows:
+        try:
+            package = _package_from_header(read_header(blob, INVENTORY_TAGS))
+        except (struct.error, ValueError):
+            continue
+        if package is not None:
+            packages.append(package)
+    return packages
+
+
+def _package_from_header(tags: Dict[int, Any]) -> Optional[Dict[str, Any]]:
+    if RPMTAG_NAME not in tags:
+        return None
+    return {
+        "name": tags[RPMTAG_NAME],
+        "epoch": tags.get(RPMTAG_EPOCH, [0])[0],
+        "version": tags.get(RPMTAG_VERSION, ""),
+        "release": tags.get(RPMTAG_RELEASE, ""),
+        "arch": tags.get(RPMTAG_ARCH, "(none)"),
+        "install_time": tags.get(RPMTAG_INSTALLTIME, [0])[0]
+    }
+
+
+def header_nevra(tags: Dict[int, Any]) -> Optional[str]:
+    """NEVRA do pacote a partir das tags do header (None sem RPMTAG_NAME)"""
+    package = _package_from_header(tags)
+    return format_nevra(package) if package else None
+
+
+def lookup_rpm_files(paths: List[str], config: Optional[Dict[str, Any]] = None,
+                     tags: frozenset = FILE_OWNER_TAGS) -> Dict[str, Optional[Tuple[Dict[int, Any], int]]]:
+    """
+    Localiza cada caminho nos headers do rpmdb em consultas em lote
+
+    A tabela Basenames liga o nome do arquivo ao header (hnum) e à posição
+    (idx) do arquivo na lista do pacote; o diretório é conferido com
+    DIRINDEXES/DIRNAMES do header, e cada header é decodificado uma vez.
+
+    Args:
+        tags: Tags a extrair do header (além das de localização)
+
+    Returns:
+        caminho -> (tags do header do dono, índice do arquivo) ou None se
+        nenhum pacote contém o caminho
+
+    Raises:
+        FileNotFoundError: rpmdb.sqlite não existe
+        sqlite3.Error: banco ilegível
+    """
+    found = {path: None for path in paths}
+    db_path = (config or {}).get("monitoring", {}).get("rpmdb_path", RPMDB_SQLITE)
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(db_path)
+    if not paths:
+        return found
+
+    by_basename = {}
+    for path in paths:
+        directory, basename = os.path.split(path)
+        by_basename.setdefault(basename, []).append((directory + "/", path))
+
+    wanted = tags | {RPMTAG_DIRINDEXES, RPMTAG_DIRNAMES}
+    conn = _connect_rpmdb(db_path)
+    headers = {}
+    try:
+        basenames = list(by_basename)
+        for i in range(0, len(basenames), 500):
+            chunk = basenames[i:i + 500]
+            rows = conn.execute(
+                f"SELECT key, hnum, idx FROM Basenames WHERE key IN ({','.join('?' * len(chunk))})",
+                chunk
+            ).fetchall()
+            for basename, hnum, idx in rows:
+                if hnum not in headers:
+                    row = conn.execute("SELECT blob FROM Packages WHERE hnum = ?", (hnum,)).fetchone()
+                    try:
+                        headers[hnum] = read_header(row[0], wanted) if row else {}
+                    except (struct.error, ValueError):
+                        headers[hnum] = {}
+                header = headers[hnum]
+                dir_indexes = header.get(RPMTAG_DIRINDEXES, [])
+                dirnames = header.get(RPMTAG_DIRNAMES, [])
+                if idx >= len(dir_indexes) or dir_indexes[idx] >= len(dirnames):
+                    continue
+                for directory, path in by_basename[basename]:
+                    if dirnames[dir_indexes[idx]] == directory and found[path] is None:
+                        found[path] = (header, idx)
+    finally:
+        conn.close()
+
+    return found
+
+
+def find_file_owners(paths: List[str], config: Optional[Dict[str, Any]] = None) -> Dict[str, Optional[str]]:
+    """
+    Pacote dono de cada caminho, consultando o índice Basenames do rpmdb
+
+    Returns:
+        caminho -> NEVRA do dono (None se nenhum pacote contém o caminho)
+    """
+    owners = {path: None for path in paths}
+    try:
+        found = lookup_rpm_files(paths, config)
+    except (OSError, sqlite3.Error):
+        return owners
+
+    for path, match in found.items():
+        if match is not None:
+            owners[path] = header_nevra(match[0])
+    return owners
+
+
+def _rpmdb_signature(path: str) -> Optional[List[int]]:
+    """Tamanho e mtime do banco e do WAL (mudam a cada transação do rpm)"""
+    signature = []
+    for candidate in (path, path + "-wal"):
+        try:
+            st = os.stat(candidate)
+        except FileNotFoundError:
+            if candidate == path:
+                return None
+            continue
+        signature.extend([st.st_size, st.st_mtime_ns])
+    return signature
+
+
+def rpmdb_signature(config: Optional[Dict[str, Any]] = None) -> Optional[List[int]]:
+    """Assinatura do rpmdb configurado (muda a cada transação; None sem rpmdb.sqlite)"""
+    return _rpmdb_signature((config or {}).get("monitoring", {}).get("rpmdb_path", RPMDB_SQLITE))
+
+
+def get_installed_packages(config: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    Lista os pacotes instalados
+
+    Lê o rpmdb.sqlite diretamente; o resultado fica em cache (em memória e
+    no diretório de estado) enquanto o tamanho/mtime do banco não mudar,
+    então execuções sem transações do rpm no meio não releem nada. Sem
+    rpmdb.sqlite (backends antigos), usa uma única chamada ao rpm.
+
+    Returns:
+        Lista de {name, epoch, version, release, arch, install_time}
+
+    Raises:
+        FileNotFoundError: nem rpmdb.sqlite nem rpm disponíveis
+        RuntimeError: consulta ao rpm falhou
+    """
+    global _inventory_cache
+
+    path = (config or {}).get("monitoring", {}).get("rpmdb_path", RPMDB_SQLITE)
+    signature = _rpmdb_signature(path)
+    if signature is None:
+        return _get_installed_packages_rpm()
+
+    key = [path] + signature
+    if _inventory_cache is not None and _inventory_cache[0] == key:
+        return _inventory_cache[1]
+
+    cached = load_state(config, INVENTORY_STATE, default={}) if config is not None else {}
+    if cached and cached.get("key") == key:
+        packages = cached.get("packages", [])
+    else:
+        try:
+            packages = read_rpmdb_sqlite(path)
+        except sqlite3.Error:
+            return _get_installed_packages_rpm()
+        if config is not None:
+            save_state(config, INVENTORY_STATE, {"key": key, "packages": packages})
+
+    _inventory_cache = (key, packages)
+    return packages
+
+
+def _get_installed_packages_rpm() -> List[Dict[str, Any]]:
+    """Lista os pacotes instalados com uma única chamada ao rpm"""
+    result = subprocess.run(
+        ['rpm', '-qa', '--queryformat', RPM_QUERY_FORMAT],
+        capture_output=True,
+        text=True,
+        timeout=60
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or "rpm -qa falhou")
+
+    packages = []
+    for line in result.stdout.split('\n'):
+        fields = line.split('\t')
+        if len(fields) != 6:
+            continue
+        name, epoch, version, release, arch, install_time = fields
+        packages.append({
+            "name": name,
+            "epoch": int(epoch) if epoch.isdigit() else 0,
+            "version": version,
+            "release": release,
+            "arch": arch,
+            "install_time": int(install_time) if install_time.isdigit() else 0
+        })
+    return packages
+
+
+def newest_by_name_arch(packages: List[Dict[str, Any]]) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    """
+    Versão mais nova instalada de cada (nome, arch)
+
+    Pacotes installonly (kernel) podem ter várias versões lado a lado; a
+    comparação com atualizações usa a mais nova, como o dnf.
+    """
+    newest = {}
+    for package in packages:
+        key = (package["name"], package["arch"])
+        current = newest.get(key)
+        if current is None or compare_evr(package_evr(package), package_evr(current)) > 0:
+            newest[key] = package
+    return newest
+
+
+def newest_package(packages: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Pacote de maior EVR da lista (ou None se vazia)"""
+    newest = None
+    for package in packages:
+        if newest is None or compare_evr(package_evr(package), package_evr(newest)) > 0:
+            newest = package
+    return newest
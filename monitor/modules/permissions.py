@@ -1,158 +1,118 @@
 """
 Módulo de verificação de permissões e arquivos suspeitos
 """
-import subprocess
 import os
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 
+from .fs_index import open_scan_index
+from .integrity import check_integrity
+from .rpm_verify import verify_rpm_files
+from .fs_scanner import build_scan_plan, scan_filesystem, DEFAULT_SCAN_WORKERS
 
-def find_suid_files() -> List[Dict[str, Any]]:
+
+def _scan_for(check: str, config: Optional[Dict[str, Any]], scan: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Resultado de varredura existente ou uma varredura só desta verificação"""
+    if scan is None:
+        scan = run_scan(config or {}, [check])
+    return scan
+
+
+def run_scan(config: Dict[str, Any], checks: List[str], use_index: bool = False) -> Dict[str, Any]:
+    """
+    Varredura das raízes configuradas com o paralelismo e a prioridade de I/O da configuração
+
+    Com use_index, diretórios inalterados desde a última execução vêm do
+    índice persistente e o resultado traz as entradas novas/alteradas.
+    """
+    index = open_scan_index(config) if use_index else None
+    try:
+        return scan_filesystem(
+            build_scan_plan(config, checks),
+            workers=config.get("monitoring", {}).get("scan_workers", DEFAULT_SCAN_WORKERS),
+            io_priority=config.get("monitoring", {}).get("scan_io_priority", "idle"),
+            index=index
+        )
+    finally:
+        if index is not None:
+            index.close()
+
+
+def find_suid_files(config: Optional[Dict[str, Any]] = None,
+                    scan: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
     """Encontra arquivos com SUID bit setado"""
-    suid_files = []
-    
     try:
-        # Procurar arquivos SUID em diretórios críticos
-        search_paths = ['/bin', '/sbin', '/usr/bin', '/usr/sbin', '/usr/local/bin']
-        
-        for search_path in search_paths:
-            if not os.path.exists(search_path):
-                continue
-                
-            result = subprocess.run(
-                ['find', search_path, '-type', 'f', '-perm', '-4000', '-ls'],
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
-            
-            if result.returncode == 0 and result.stdout.strip():
-                for line in result.stdout.strip().split('\n'):
-                    parts = line.split()
-                    if len(parts) >= 11:
-                        filepath = " ".join(parts[10:])
-                        suid_files.append({
-                            "path": filepath,
-                            "permissions": parts[2],
-                            "owner": parts[4],
-                            "size": parts[6]
-                        })
-    except subprocess.TimeoutExpired:
-        suid_files.append({"error": "Timeout ao procurar arquivos SUID"})
+        return _scan_for("suid", config, scan)["results"]["suid"][:100]  # Limitar a 100
     except Exception as e:
-        suid_files.append({"error": str(e)})
-    
-    return suid_files[:100]  # Limitar a 100
+        return [{"error": str(e)}]
 
 
-def find_sgid_files() -> List[Dict[str, Any]]:
+def find_sgid_files(config: Optional[Dict[str, Any]] = None,
+                    scan: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
     """Encontra arquivos com SGID bit setado"""
-    sgid_files = []
-    
     try:
-        search_paths = ['/bin', '/sbin', '/usr/bin', '/usr/sbin']
-        
-        for search_path in search_paths:
-            if not os.path.exists(search_path):
-                continue
-                
-            result = subprocess.run(
-                ['find', search_path, '-type', 'f', '-perm', '-2000', '-ls'],
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
-            
-            if result.returncode == 0 and result.stdout.strip():
-                for line in result.stdout.strip().split('\n'):
-                    parts = line.split()
-                    if len(parts) >= 11:
-                        filepath = " ".join(parts[10:])
-                        sgid_files.append({
-                            "path": filepath,
-                            "permissions": parts[2],
-                            "group": parts[5]
-                        })
+        return _scan_for("sgid", config, scan)["results"]["sgid"][:50]
     except Exception as e:
-        sgid_files.append({"error": str(e)})
-    
-    return sgid_files[:50]
+        return [{"error": str(e)}]
 
 
-def find_world_writable_files() -> List[Dict[str, Any]]:
+def find_world_writable_files(config: Optional[Dict[str, Any]] = None,
+                              scan: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
     """Encontra arquivos world-writable em diretórios críticos"""
-    writable_files = []
+    try:
+        return _scan_for("world_writable", config, scan)["results"]["world_writable"][:30]
+    except Exception as e:
+        return [{"error": str(e)}]
+
+
+CRITICAL_FILES = {
+    "/etc/passwd": {"expected": "644", "description": "User database"},
+    "/etc/shadow": {"expected": "000", "description": "Password hashes"},
+    "/etc/group": {"expected": "644", "description": "Group database"},
+    "/etc/gshadow": {"expected": "000", "description": "Group passwords"},
+    "/etc/ssh/sshd_config": {"expected": "600", "description": "SSH daemon config"},
+    "/root": {"expected": "700", "description": "Root home directory"},
+    "/boot/grub2/grub.cfg": {"expected": "600", "description": "GRUB config"}
+}
+
+
+def check_critical_file(filepath: str) -> Optional[Dict[str, Any]]:
+    """Verifica a permissão de um arquivo crítico (None se não existe)"""
+    info = CRITICAL_FILES[filepath]
+    if not os.path.exists(filepath):
+        return None
     
     try:
-        # Procurar em diretórios críticos
-        search_paths = ['/etc', '/bin', '/sbin', '/usr/bin', '/usr/sbin']
+        stat_info = os.stat(filepath)
+        current_perms = oct(stat_info.st_mode)[-3:]
         
-        for search_path in search_paths:
-            if not os.path.exists(search_path):
-                continue
-                
-            result = subprocess.run(
-                ['find', search_path, '-type', 'f', '-perm', '-002', '!', '-type', 'l', '-ls'],
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
-            
-            if result.returncode == 0 and result.stdout.strip():
-                for line in result.stdout.strip().split('\n')[:20]:  # Limitar durante busca
-                    parts = line.split()
-                    if len(parts) >= 11:
-                        filepath = " ".join(parts[10:])
-                        writable_files.append({
-                            "path": filepath,
-                            "permissions": parts[2],
-                            "severity": "warning"
-                        })
+        is_secure = current_perms == info["expected"] or (
+            info["expected"] == "000" and current_perms in ["000", "400", "440"]
+        )
+        
+        return {
+            "file": filepath,
+            "description": info["description"],
+            "current_permissions": current_perms,
+            "expected_permissions": info["expected"],
+            "is_secure": is_secure,
+            "severity": "critical" if not is_secure else "ok"
+        }
     except Exception as e:
-        writable_files.append({"error": str(e)})
-    
-    return writable_files[:30]
+        return {
+            "file": filepath,
+            "error": str(e)
+        }
 
 
 def check_critical_file_permissions() -> List[Dict[str, Any]]:
     """Verifica permissões de arquivos críticos do sistema"""
-    critical_files = {
-        "/etc/passwd": {"expected": "644", "description": "User database"},
-        "/etc/shadow": {"expected": "000", "description": "Password hashes"},
-        "/etc/group": {"expected": "644", "description": "Group database"},
-        "/etc/gshadow": {"expected": "000", "description": "Group passwords"},
-        "/etc/ssh/sshd_config": {"expected": "600", "description": "SSH daemon config"},
-        "/root": {"expected": "700", "description": "Root home directory"},
-        "/boot/grub2/grub.cfg": {"expected": "600", "description": "GRUB config"}
-    }
-    
     checks = []
     
-    for filepath, info in critical_files.items():
-        if not os.path.exists(filepath):
-            continue
-        
-        try:
-            stat_info = os.stat(filepath)
-            current_perms = oct(stat_info.st_mode)[-3:]
-            
-            is_secure = current_perms == info["expected"] or (
-                info["expected"] == "000" and current_perms in ["000", "400", "440"]
-            )
-            
-            checks.append({
-                "file": filepath,
-                "description": info["description"],
-                "current_permissions": current_perms,
-                "expected_permissions": info["expected"],
-                "is_secure": is_secure,
-                "severity": "critical" if not is_secure else "ok"
-            })
-        except Exception as e:
-            checks.append({
-                "file": filepath,
-                "error": str(e)
-            })
+    for filepath in CRITICAL_FILES:
+        check = check_critical_file(filepath)
+        if check is not None:
+            checks.append(check)
     
     return checks
 
@@ -199,35 +159,47 @@ def check_home_directory_permissions() -> List[Dict[str, Any]]:
     return issues[:20]
 
 
-def find_unowned_files() -> List[Dict[str, Any]]:
+def find_unowned_files(config: Optional[Dict[str, Any]] = None,
+                       scan: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
     """Encontra arquivos sem dono (podem indicar problemas)"""
-    unowned = []
-    
     try:
-        # Procurar arquivos sem dono em /home
-        result = subprocess.run(
-            ['find', '/home', '-nouser', '-o', '-nogroup', '-ls'],
-            capture_output=True,
-            text=True,
-            timeout=60
-        )
-        
-        if result.returncode == 0 and result.stdout.strip():
-            for line in result.stdout.strip().split('\n')[:30]:
-                parts = line.split()
-                if len(parts) >= 11:
-                    filepath = " ".join(parts[10:])
-                    unowned.append({
-                        "path": filepath,
-                        "permissions": parts[2],
-                        "severity": "info"
-                    })
-    except subprocess.TimeoutExpired:
-        unowned.append({"error": "Timeout"})
+        return _scan_for("unowned", config, scan)["results"]["unowned"][:30]
     except Exception as e:
-        unowned.append({"error": str(e)})
-    
-    return unowned
+        return [{"error": str(e)}]
+
+
+def check_file_integrity(config: Dict[str, Any], scan: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Integridade (SHA-256 contra a linha de base) de SUID/SGID, arquivos críticos e integrity_roots
+
+    Args:
+        scan: Varredura já feita (os SUID/SGID saem dela); sem ela, varre só SUID/SGID
+    """
+    try:
+        if scan is None:
+            scan = run_scan(config, ["suid", "sgid"])
+        privileged = [entry["path"] for check in ("suid", "sgid")
+                      for entry in scan.get("results", {}).get(check, []) if "path" in entry]
+        return check_integrity(config, privileged + list(CRITICAL_FILES))
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def verify_privileged_packages(config: Dict[str, Any], scan: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Confere SUID/SGID contra o pacote dono no rpmdb (dono, modo e digest)
+
+    Args:
+        scan: Varredura já feita (lista completa, sem o limite do relatório); sem ela, varre só SUID/SGID
+    """
+    try:
+        if scan is None:
+            scan = run_scan(config, ["suid", "sgid"])
+        privileged = sorted({entry["path"] for check in ("suid", "sgid")
+                             for entry in scan.get("results", {}).get(check, []) if "path" in entry})
+        return verify_rpm_files(config, privileged)
+    except Exception as e:
+        return {"error": str(e)}
 
 
 def check_ssh_key_permissions() -> List[Dict[str, Any]]:
@@ -272,14 +244,33 @@ def collect_permissions_metrics(config: Dict[str, Any]) -> Dict[str, Any]:
     """Coleta todas as métricas de permissões"""
     metrics = {}
     
-    if config.get("monitoring", {}).get("check_suid_files", True):
-        metrics["suid_files"] = find_suid_files()
+    # Uma única varredura serve a todas as verificações de modo/dono
+    enabled = {
+        "suid": config.get("monitoring", {}).get("check_suid_files", True),
+        "sgid": config.get("monitoring", {}).get("check_sgid_files", True),
+        "world_writable": config.get("monitoring", {}).get("check_world_writable", True),
+        "unowned": config.get("monitoring", {}).get("check_unowned_files", False)  # Desabilitado por padrão (lento)
+    }
+    checks = [check for check, on in enabled.items() if on]
+    scan = None
+    if checks:
+        try:
+            scan = run_scan(config, checks, config.get("monitoring", {}).get("use_scan_index", False))
+            metrics["scan"] = {k: v for k, v in scan.items() if k != "results"}
+            if "index" in scan:
+                metrics["permission_changes"] = scan["index"]["changes"][:100]
+        except Exception as e:
+            metrics["scan"] = {"error": str(e)}
+            scan = {"results": {check: [{"error": str(e)}] for check in checks}}
     
-    if config.get("monitoring", {}).get("check_sgid_files", True):
-        metrics["sgid_files"] = find_sgid_files()
+    if enabled["suid"]:
+        metrics["suid_files"] = find_suid_files(config, scan)
     
-    if config.get("monitoring", {}).get("check_world_writable", True):
-        metrics["world_writable_files"] = find_world_writable_files()
+    if enabled["sgid"]:
+        metrics["sgid_files"] = find_sgid_files(config, scan)
+    
+    if enabled["world_writable"]:
+        metrics["world_writable_files"] = find_world_writable_files(config, scan)
     
     if config.get("monitoring", {}).get("check_critical_files", True):
         metrics["critical_file_permissions"] = check_critical_file_permissions()
@@ -290,8 +281,14 @@ def collect_permissions_metrics(config: Dict[str, Any]) -> Dict[str, Any]:
     if config.get("monitoring", {}).get("check_ssh_keys", True):
         metrics["ssh_key_permissions"] = check_ssh_key_permissions()
     
-    if config.get("monitoring", {}).get("check_unowned_files", False):  # Desabilitado por padrão (lento)
-        metrics["unowned_files"] = find_unowned_files()
+    if enabled["unowned"]:
+        metrics["unowned_files"] = find_unowned_files(config, scan)
+    
+    if config.get("monitoring", {}).get("check_integrity", True):
+        metrics["integrity"] = check_file_integrity(config, scan if enabled["suid"] and enabled["sgid"] else None)
+    
+    if config.get("monitoring", {}).get("verify_suid_packages", True):
+        metrics["suid_verification"] = verify_privileged_packages(config, scan if enabled["suid"] and enabled["sgid"] else None)
     
     # Resumo
     critical_issues = len([c for c in metrics.get("critical_file_permissions", []) 
@@ -302,7 +299,13 @@ def collect_permissions_metrics(config: Dict[str, Any]) -> Dict[str, Any]:
         "world_writable_found": len([f for f in metrics.get("world_writable_files", []) if isinstance(f, dict)]),
         "critical_permission_issues": critical_issues,
         "ssh_key_issues": len(metrics.get("ssh_key_permissions", [])),
-        "has_critical_issues": critical_issues > 0
+        "has_critical_issues": critical_issues > 0,
+        "new_flagged_files": len(metrics.get("permission_changes", [])),
+        "integrity_modified": metrics.get("integrity", {}).get("counts", {}).get("modified", 0),
+        "integrity_added": metrics.get("integrity", {}).get("counts", {}).get("added", 0),
+        "integrity_removed": metrics.get("integrity", {}).get("counts", {}).get("removed", 0),
+        "suid_unowned": metrics.get("suid_verification", {}).get("counts", {}).get("unowned", 0),
+        "suid_modified": metrics.get("suid_verification", {}).get("counts", {}).get("modified", 0)
     }
     
     return metrics
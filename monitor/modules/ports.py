@@ -6,6 +6,8 @@ import psutil
 import socket
 from typing import Dict, List, Any
 
+from .procinfo import get_process_info
+
 
 def get_listening_ports() -> List[Dict[str, Any]]:
     """Obtém todas as portas em estado LISTEN"""
@@ -19,15 +21,7 @@ def get_listening_ports() -> List[Dict[str, Any]]:
                 # Obter informações do processo
                 process_info = "unknown"
                 if conn.pid:
-                    try:
-                        proc = psutil.Process(conn.pid)
-                        process_info = {
-                            "pid": conn.pid,
-                            "name": proc.name(),
-                            "cmdline": " ".join(proc.cmdline()[:3])  # Limitar tamanho
-                        }
-                    except (psutil.NoSuchProcess, psutil.AccessDenied):
-                        process_info = {"pid": conn.pid, "name": "unknown"}
+                    process_info = get_process_info(conn.pid)
                 
                 port_info = {
                     "protocol": "tcp" if conn.type == socket.SOCK_STREAM else "udp",
@@ -72,14 +66,11 @@ def get_established_connections() -> Dict[str, Any]:
                 
                 # Contar por processo
                 if conn.pid:
-                    try:
-                        proc = psutil.Process(conn.pid)
-                        proc_name = proc.name()
+                    proc_name = get_process_info(conn.pid)["name"]
+                    if proc_name != "unknown":
                         if proc_name not in connections_data["by_process"]:
                             connections_data["by_process"][proc_name] = 0
                         connections_data["by_process"][proc_name] += 1
-                    except (psutil.NoSuchProcess, psutil.AccessDenied):
-                        pass
         
         # Top IPs remotos
         sorted_ips = sorted(
@@ -102,20 +93,29 @@ def get_established_connections() -> Dict[str, Any]:
     return connections_data
 
 
+# Portas comumente usadas em ataques
+SUSPICIOUS_PORTS = {
+    22: "SSH - Alvo comum de ataques de força bruta",
+    23: "Telnet - Protocolo inseguro (não criptografado)",
+    3306: "MySQL - Não deve estar exposto publicamente",
+    5432: "PostgreSQL - Não deve estar exposto publicamente",
+    6379: "Redis - Não deve estar exposto publicamente",
+    27017: "MongoDB - Não deve estar exposto publicamente",
+    3389: "RDP - Alvo de ataques",
+    445: "SMB - Vulnerável a ataques",
+    1433: "MS SQL Server - Não deve estar exposto",
+    5900: "VNC - Não deve estar exposto"
+}
+
+
 def check_suspicious_ports() -> List[Dict[str, Any]]:
-    """Verifica portas comumente usadas em ataques"""
-    suspicious_ports = {
-        22: "SSH - Alvo comum de ataques de força bruta",
-        23: "Telnet - Protocolo inseguro (não criptografado)",
-        3306: "MySQL - Não deve estar exposto publicamente",
-        5432: "PostgreSQL - Não deve estar exposto publicamente",
-        6379: "Redis - Não deve estar exposto publicamente",
-        27017: "MongoDB - Não deve estar exposto publicamente",
-        3389: "RDP - Alvo de ataques",
-        445: "SMB - Vulnerável a ataques",
-        1433: "MS SQL Server - Não deve estar exposto",
-        5900: "VNC - Não deve estar exposto"
-    }
+    """
+    Verifica portas comumente usadas em ataques
+
+    A gravidade aqui considera só o endereço de escuta; o estágio de
+    exposição (exposure.py) a refina depois com a política do firewall.
+    """
+    suspicious_ports = SUSPICIOUS_PORTS
     
     alerts = []
     
@@ -139,6 +139,7 @@ def check_suspicious_ports() -> List[Dict[str, Any]]:
                         
                         alerts.append({
                             "port": port,
+                            "protocol": "tcp" if conn.type == socket.SOCK_STREAM else "udp",
                             "description": description,
                             "listening_on": conn.laddr.ip,
                             "is_public": is_public,
@@ -0,0 +1,94 @@
+"""
+Cache de metadados de processos (nome, linha de comando, unidade systemd)
+
+Vários coletores precisam dos mesmos dados por PID (portas em escuta,
+conexões, bibliotecas removidas ainda mapeadas). Em vez de cada um abrir
+o processo de novo, os dados vêm de uma leitura de /proc/<pid> e ficam em
+cache. A entrada guarda o starttime do processo (campo 22 de
+/proc/<pid>/stat), então um PID reutilizado por outro processo no modo
+daemon invalida o cache em vez de devolver dados errados.
+"""
+import threading
+from typing import Dict, Any, Optional
+
+
+PROC = "/proc"
+
+# Sufixos de unidade no caminho do cgroup (a mais profunda é a que importa)
+UNIT_SUFFIXES = (".service", ".scope", ".socket", ".mount", ".timer")
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _read_text(path: str) -> Optional[str]:
+    try:
+        with open(path, 'rb') as f:
+            return f.read().decode('utf-8', 'replace')
+    except OSError:
+        return None
+
+
+def _start_time(pid: int) -> Optional[str]:
+    stat = _read_text(f"{PROC}/{pid}/stat")
+    if stat is None:
+        return None
+    # O nome (campo 2) pode ter espaços e parênteses: os campos seguem o último ")"
+    fields = stat[stat.rfind(')') + 2:].split()
+    return fields[19] if len(fields) > 19 else None
+
+
+def unit_from_cgroup(cgroup: str) -> Optional[str]:
+    """
+    Extrai a unidade systemd de /proc/<pid>/cgroup
+
+    Ex.: "0::/system.slice/sshd.service" -> "sshd.service";
+    unidades de usuário ficam abaixo de user@UID.service e prevalecem.
+    """
+    for line in cgroup.splitlines():
+        path = line.split(':', 2)[-1]
+        for part in reversed(path.split('/')):
+            if part.endswith(UNIT_SUFFIXES):
+                return part
+    return None
+
+
+def get_process_info(pid: int) -> Dict[str, Any]:
+    """
+    Metadados do processo (com cache por PID + starttime)
+
+    Returns:
+        Dicionário com pid, name, cmdline e unit (None se fora de uma unidade)
+    """
+    start = _start_time(pid)
+    key = (pid, start)
+
+    with _cache_lock:
+        cached = _cache.get(pid)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+    if start is None:
+        return {"pid": pid, "name": "unknown", "cmdline": "", "unit": None}
+
+    comm = _read_text(f"{PROC}/{pid}/comm")
+    cmdline = _read_text(f"{PROC}/{pid}/cmdline") or ""
+    cgroup = _read_text(f"{PROC}/{pid}/cgroup") or ""
+
+    info = {
+        "pid": pid,
+        "name": comm.strip() if comm else "unknown",
+        # Limitar tamanho
+        "cmdline": " ".join(cmdline.split('\0')[:3]).strip(),
+        "unit": unit_from_cgroup(cgroup)
+    }
+
+    with _cache_lock:
+        _cache[pid] = (key, info)
+    return info
+
+
+def clear_process_cache() -> None:
+    """Esvazia o cache; chamado no início de cada coleta para que ele não cresça entre coletas"""
+    with _cache_lock:
+        _cache.clear()
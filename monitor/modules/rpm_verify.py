@@ -0,0 +1,158 @@
+"""
+Módulo de verificação de binários SUID/SGID contra o rpmdb (equivalente a rpm -Vf)
+
+Todos os caminhos encontrados pela varredura são resolvidos de uma vez no
+índice Basenames do rpmdb.sqlite (sem um rpm -qf por arquivo), e cada um é
+comparado com o que o header do pacote dono registra: modo, dono, grupo,
+tamanho e digest. Os digests são calculados em paralelo, com o algoritmo do
+próprio pacote (FILEDIGESTALGO), e só para arquivos cujo tamanho confere —
+tamanho diferente já basta para marcar o conteúdo como alterado.
+
+Um SUID/SGID que nenhum pacote instalou, ou cujo conteúdo/modo difere do
+pacote, é o rastro típico de uma backdoor de escalonamento de privilégio.
+"""
+import grp
+import os
+import pwd
+import sqlite3
+import stat
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any
+
+from .integrity import hash_file
+from .packages import (
+    FILE_VERIFY_TAGS, RPM_DIGEST_ALGOS, RPMTAG_FILEDIGESTALGO, RPMTAG_FILEDIGESTS,
+    RPMTAG_FILEGROUPNAME, RPMTAG_FILEMODES, RPMTAG_FILESIZES, RPMTAG_FILEUSERNAME,
+    RPMTAG_FILEVERIFYFLAGS, RPMVERIFY_FILEDIGEST, RPMVERIFY_FILESIZE, RPMVERIFY_GROUP,
+    RPMVERIFY_MODE, RPMVERIFY_USER, header_nevra, lookup_rpm_files
+)
+
+
+# Sem FILEDIGESTALGO o rpm grava MD5 (pacotes antigos)
+DEFAULT_DIGEST_ALGO = 1
+
+MAX_REPORTED_FILES = 100
+
+
+def _name(lookup, ident: int) -> str:
+    try:
+        return lookup(ident)[0]
+    except KeyError:
+        return str(ident)
+
+
+def _file_attr(header: Dict[int, Any], tag: int, idx: int, default=None):
+    values = header.get(tag)
+    return values[idx] if values is not None and idx < len(values) else default
+
+
+def compare_with_header(st: os.stat_result, header: Dict[int, Any], idx: int) -> Dict[str, Any]:
+    """
+    Compara o lstat do arquivo com a entrada idx do header
+
+    Returns:
+        Dicionário com problems (mode/owner/group/size) e, se o conteúdo
+        ainda precisa ser conferido, digest e algorithm esperados
+    """
+    flags = _file_attr(header, RPMTAG_FILEVERIFYFLAGS, idx, -1)
+    expected_mode = _file_attr(header, RPMTAG_FILEMODES, idx)
+    problems = []
+
+    if flags & RPMVERIFY_MODE and expected_mode is not None and st.st_mode != expected_mode:
+        problems.append("mode")
+    if flags & RPMVERIFY_USER and _file_attr(header, RPMTAG_FILEUSERNAME, idx) not in (None, _name(pwd.getpwuid, st.st_uid)):
+        problems.append("owner")
+    if flags & RPMVERIFY_GROUP and _file_attr(header, RPMTAG_FILEGROUPNAME, idx) not in (None, _name(grp.getgrgid, st.st_gid)):
+        problems.append("group")
+
+    result = {"problems": problems, "expected_mode": expected_mode}
+    digest = _file_attr(header, RPMTAG_FILEDIGESTS, idx, "")
+    if not flags & RPMVERIFY_FILEDIGEST or not digest:
+        # %ghost e %verify(not md5) não têm conteúdo a conferir
+        return result
+
+    expected_size = _file_attr(header, RPMTAG_FILESIZES, idx)
+    if flags & RPMVERIFY_FILESIZE and expected_size is not None and st.st_size != expected_size:
+        problems.append("size")
+        problems.append("digest")
+        return result
+
+    algo = header.get(RPMTAG_FILEDIGESTALGO, [DEFAULT_DIGEST_ALGO])[0]
+    result["digest"] = digest
+    result["algorithm"] = RPM_DIGEST_ALGOS.get(algo)
+    return result
+
+
+def verify_rpm_files(config: Dict[str, Any], paths: List[str]) -> Dict[str, Any]:
+    """
+    Verifica arquivos contra o pacote dono no rpmdb
+
+    Args:
+        config: Configuração do monitor (rpmdb_path, integrity_workers)
+        paths: Caminhos a verificar (binários SUID/SGID da varredura)
+
+    Returns:
+        Dicionário com unowned, modified, unverifiable (digest de algoritmo
+        desconhecido ou arquivo ilegível) e contagens
+    """
+    workers = config.get("monitoring", {}).get("integrity_workers") or os.cpu_count() or 4
+
+    stats = {}
+    for path in paths:
+        try:
+            stats[path] = os.lstat(path)
+        except OSError:
+            continue
+
+    try:
+        found = lookup_rpm_files(sorted(stats), config, FILE_VERIFY_TAGS)
+    except FileNotFoundError as e:
+        return {"error": f"rpmdb.sqlite não encontrado: {e}"}
+    except sqlite3.Error as e:
+        return {"error": str(e)}
+
+    unowned, modified = [], []
+    pending = {}
+    packages = {}
+    for path in sorted(stats):
+        st = stats[path]
+        match = found.get(path)
+        if match is None:
+            unowned.append({"path": path, "permissions": stat.filemode(st.st_mode),
+                            "uid": st.st_uid, "size": st.st_size})
+            continue
+        header, idx = match
+        packages[path] = header_nevra(header)
+        pending[path] = compare_with_header(st, header, idx)
+
+    # Digests em paralelo, cada um com o algoritmo do pacote dono
+    to_hash = [path for path, check in pending.items() if check.get("algorithm")]
+    unverifiable = [path for path, check in pending.items() if "digest" in check and not check.get("algorithm")]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        digests = dict(pool.map(hash_file, to_hash, [pending[path]["algorithm"] for path in to_hash]))
+    for path in to_hash:
+        if digests.get(path) is None:
+            unverifiable.append(path)
+        elif digests[path] != pending[path]["digest"]:
+            pending[path]["problems"].append("digest")
+
+    for path, check in pending.items():
+        if check["problems"]:
+            st = stats[path]
+            modified.append({
+                "path": path,
+                "package": packages[path],
+                "problems": check["problems"],
+                "permissions": stat.filemode(st.st_mode),
+                "expected_permissions": stat.filemode(check["expected_mode"]) if check["expected_mode"] is not None else None
+            })
+
+    return {
+        "source": "rpmdb",
+        "files_checked": len(stats),
+        "files_hashed": len(to_hash),
+        "counts": {"unowned": len(unowned), "modified": len(modified)},
+        "unowned": unowned[:MAX_REPORTED_FILES],
+        "modified": modified[:MAX_REPORTED_FILES],
+        "unverifiable": sorted(unverifiable)[:MAX_REPORTED_FILES]
+    }
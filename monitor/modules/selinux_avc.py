@@ -0,0 +1,279 @@
+"""
+Módulo de coleta de negações SELinux (registros AVC do audit.log)
+
+Lê o audit.log de forma incremental: o inode e o offset do ponto em que a
+última execução parou ficam no diretório de estado, e a leitura continua
+dali, inclusive atravessando rotações (audit.log.1, .2, ...). Cada bloco é
+varrido em busca de "avc:  denied" com a busca de bytes do próprio Python;
+só as linhas encontradas passam pela expressão regular, então o custo
+cresce com o tamanho do log em velocidade de memcpy e com o número de
+negações, não com o número de linhas.
+
+As negações são agregadas por (scontext, tcontext, tclass, permissão) em
+uma tabela Space-Saving de tamanho fixo, e um filtro de Bloom lembra toda
+tupla já vista para apontar negações novas desde a execução anterior.
+"""
+import os
+import re
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple
+
+from .bloom import BloomFilter
+from .state import load_state, save_state
+from .topk import SpaceSaving
+
+
+AUDIT_LOG = "/var/log/audit/audit.log"
+
+READ_CHUNK_SIZE = 4 * 1024 * 1024
+
+AVC_MARKER = b"avc:  denied"
+
+# type=AVC msg=audit(1700000000.123:456): avc:  denied  { read write } for  pid=... comm="httpd" ...
+#   scontext=system_u:system_r:httpd_t:s0 tcontext=unconfined_u:object_r:user_home_t:s0 tclass=file permissive=0
+AVC_HEAD_PATTERN = re.compile(rb'msg=audit\((\d+)\.\d+:\d+\): avc:  denied  \{ ([^}]*) \}')
+AVC_CONTEXT_PATTERN = re.compile(rb' scontext=(\S+) tcontext=(\S+) tclass=(\S+)(?: permissive=(\d))?')
+AVC_COMM_PATTERN = re.compile(rb' comm=("[^"]*"|\S+)')
+
+# Limites do relatório
+DEFAULT_TABLE_SIZE = 1000
+DEFAULT_TOP_DENIALS = 20
+MAX_REPORTED_NEW_DENIALS = 100
+
+
+def list_audit_logs(path: str = AUDIT_LOG) -> List[Tuple[str, os.stat_result]]:
+    """
+    Lista o audit.log atual e os rotacionados, do mais antigo ao mais novo
+
+    O auditd rotaciona renomeando audit.log -> audit.log.1 -> audit.log.2,
+    então o maior sufixo é o mais antigo.
+    """
+    directory, base = os.path.split(path)
+    rotated = []
+    try:
+        for name in os.listdir(directory):
+            suffix = name[len(base) + 1:]
+            if name.startswith(base + ".") and suffix.isdigit():
+                rotated.append((int(suffix), os.path.join(directory, name)))
+    except OSError:
+        pass
+
+    files = []
+    for _, rotated_path in sorted(rotated, reverse=True):
+        try:
+            files.append((rotated_path, os.stat(rotated_path)))
+        except OSError:
+            continue
+    try:
+        files.append((path, os.stat(path)))
+    except OSError:
+        pass
+    return files
+
+
+def plan_reads(files: List[Tuple[str, os.stat_result]], inode: Optional[int],
+               offset: int) -> Tuple[List[Tuple[str, int]], bool]:
+    """
+    Decide quais arquivos ler e a partir de qual offset
+
+    Returns:
+        (lista de (caminho, offset inicial), houve lacuna) — lacuna indica que
+        o arquivo onde a execução anterior parou já saiu da rotação
+    """
+    if inode is None:
+        return [(path, 0) for path, _ in files], False
+
+    for index, (path, st) in enumerate(files):
+        if st.st_ino == inode:
+            start = offset if offset <= st.st_size else 0
+            return [(path, start)] + [(p, 0) for p, _ in files[index + 1:]], False
+
+    return [(path, 0) for path, _ in files], True
+
+
+def parse_avc_line(line: bytes) -> List[Tuple[tuple, int, bool, bytes]]:
+    """
+    Extrai as negações de um registro AVC
+
+    Returns:
+        Lista de ((scontext, tcontext, tclass, permissão), timestamp, permissive, comm),
+        uma por permissão negada
+    """
+    head = AVC_HEAD_PATTERN.search(line)
+    if head is None:
+        return []
+    context = AVC_CONTEXT_PATTERN.search(line, head.end())
+    if context is None:
+        return []
+
+    comm = AVC_COMM_PATTERN.search(line, head.end())
+    comm = comm.group(1).strip(b'"') if comm else b""
+    timestamp = int(head.group(1))
+    permissive = context.group(4) == b"1"
+    scontext, tcontext, tclass = context.group(1), context.group(2), context.group(3)
+
+    return [
+        ((scontext, tcontext, tclass, permission), timestamp, permissive, comm)
+        for permission in head.group(2).split()
+    ]
+
+
+def scan_avc_denials(path: str, start: int, window: Dict[tuple, list]) -> Tuple[int, int]:
+    """
+    Agrega as negações de um arquivo a partir de `start` em `window`
+
+    Só linhas completas são consumidas: uma linha ainda sendo escrita fica
+    para a próxima execução.
+
+    Returns:
+        (offset final consumido, bytes lidos)
+    """
+    consumed = start
+    bytes_read = 0
+
+    with open(path, 'rb') as f:
+        f.seek(start)
+        pending = b""
+        while True:
+            chunk = f.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            bytes_read += len(chunk)
+
+            buffer = pending + chunk
+            end = buffer.rfind(b"\n") + 1
+            pending = buffer[end:]
+            if not end:
+                continue
+
+            position = buffer.find(AVC_MARKER, 0, end)
+            while position != -1:
+                line_start = buffer.rfind(b"\n", 0, position) + 1
+                line_end = buffer.find(b"\n", position, end)
+                for key, timestamp, permissive, comm in parse_avc_line(buffer[line_start:line_end]):
+                    entry = window.get(key)
+                    if entry is None:
+                        window[key] = [1, timestamp, permissive, comm]
+                    else:
+                        entry[0] += 1
+                        if timestamp >= entry[1]:
+                            entry[1] = timestamp
+                            entry[3] = comm
+                        entry[2] = entry[2] or permissive
+                position = buffer.find(AVC_MARKER, line_end, end)
+
+            consumed += end
+
+    return consumed, bytes_read
+
+
+def _denial_key(key: tuple) -> str:
+    return "\t".join(part.decode('utf-8', 'replace') for part in key)
+
+
+def _denial_entry(key: str, count: int, details: Dict[str, Any], error: int = 0) -> Dict[str, Any]:
+    scontext, tcontext, tclass, permission = key.split("\t")
+    entry = {
+        "scontext": scontext,
+        "tcontext": tcontext,
+        "tclass": tclass,
+        "permission": permission,
+        "count": count
+    }
+    if error:
+        entry["count_error"] = error
+    info = details.get(key)
+    if info:
+        entry["last_seen"] = datetime.fromtimestamp(info[0]).isoformat()
+        entry["comm"] = info[1]
+        entry["permissive"] = info[2]
+    return entry
+
+
+def collect_avc_denials(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Lê as negações AVC novas desde a última execução e atualiza o histórico
+
+    Returns:
+        Dicionário com totais da janela, negações mais frequentes (histórico
+        limitado) e tuplas nunca vistas antes
+    """
+    monitoring = config.get("monitoring", {})
+    audit_log = monitoring.get("audit_log_path", AUDIT_LOG)
+    table_size = monitoring.get("selinux_avc_table_size", DEFAULT_TABLE_SIZE)
+    top_n = monitoring.get("selinux_avc_top", DEFAULT_TOP_DENIALS)
+
+    files = list_audit_logs(audit_log)
+    if not files:
+        return {"error": f"{audit_log} não encontrado"}
+
+    state = load_state(config, "selinux_avc", default={}) or {}
+    is_baseline = not state
+    reads, gap = plan_reads(files, state.get("inode"), state.get("offset", 0))
+
+    window = {}
+    bytes_read = 0
+    offset = state.get("offset", 0)
+    try:
+        for path, start in reads:
+            offset, read = scan_avc_denials(path, start, window)
+            bytes_read += read
+    except PermissionError:
+        return {"error": "Permissão negada ao ler o audit.log. Execute com sudo."}
+    except OSError as e:
+        return {"error": str(e)}
+
+    table = SpaceSaving.from_dict(state.get("table"), table_size)
+    bloom = BloomFilter.from_dict(state.get("bloom"))
+    details = state.get("details", {})
+
+    total = 0
+    permissive = 0
+    new_denials = []
+    window_counts = {}
+    for raw_key, (count, timestamp, was_permissive, comm) in window.items():
+        key = _denial_key(raw_key)
+        window_counts[key] = count
+        total += count
+        if was_permissive:
+            permissive += count
+
+        table.add(key, count)
+        details[key] = [timestamp, comm.decode('utf-8', 'replace'), was_permissive]
+        if bloom.add(key) and not is_baseline:
+            new_denials.append(key)
+
+    # Detalhes só para as tuplas que continuam na tabela
+    details = {key: value for key, value in details.items() if key in table}
+
+    save_state(config, "selinux_avc", {
+        "inode": files[-1][1].st_ino,
+        "offset": offset,
+        "table": table.to_dict(),
+        "bloom": bloom.to_dict(),
+        "details": details
+    })
+
+    new_denials.sort(key=lambda key: window_counts[key], reverse=True)
+
+    result = {
+        "baseline": is_baseline,
+        "files_read": len(reads),
+        "bytes_read": bytes_read,
+        "denials": total,
+        "permissive_denials": permissive,
+        "distinct_denials": len(window),
+        "top_denials": [
+            _denial_entry(key, count, details, error)
+            for key, count, error in table.top(top_n)
+        ],
+        "new_denials": [
+            _denial_entry(key, window_counts[key], details)
+            for key in new_denials[:MAX_REPORTED_NEW_DENIALS]
+        ],
+        "new_denials_count": len(new_denials)
+    }
+    if gap:
+        result["gap"] = "o ponto da leitura anterior saiu da rotação; negações intermediárias podem ter sido perdidas"
+
+    return result
@@ -0,0 +1,130 @@
+"""
+Módulo de detecção de processos que ainda usam bibliotecas removidas
+
+Depois de uma atualização, processos antigos continuam com as versões
+anteriores das bibliotecas mapeadas em memória (aparecem como
+"/usr/lib64/libssl.so.3 (deleted)" em /proc/<pid>/maps) e seguem
+vulneráveis até serem reiniciados. Os arquivos maps são lidos inteiros,
+em paralelo, por um pool de threads (a leitura em /proc libera o GIL), e
+só os que contêm "(deleted)" são analisados linha a linha.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple
+
+from .packages import find_file_owners
+from .procinfo import PROC, get_process_info
+
+
+DELETED_MARKER = b" (deleted)"
+
+# Só arquivos de sistema contam (memfd, /dev/shm, /tmp e afins são normais)
+STALE_PATH_PREFIXES = (b"/usr/", b"/lib/", b"/lib64/", b"/bin/", b"/sbin/", b"/opt/")
+
+DEFAULT_WORKERS = 16
+
+# Limites do relatório
+MAX_REPORTED_UNITS = 100
+MAX_REPORTED_FILES_PER_ENTRY = 20
+
+
+def read_deleted_mappings(pid: int) -> Tuple[int, Optional[List[str]]]:
+    """
+    Arquivos de sistema removidos ainda mapeados pelo processo
+
+    Returns:
+        (pid, lista de caminhos) — lista None quando o maps não pôde ser lido
+    """
+    try:
+        with open(f"{PROC}/{pid}/maps", 'rb') as f:
+            data = f.read()
+    except OSError:
+        return pid, None
+
+    if DELETED_MARKER not in data:
+        return pid, []
+
+    deleted = set()
+    for line in data.split(b"\n"):
+        if not line.endswith(DELETED_MARKER):
+            continue
+        # endereço perms offset dev inode caminho (deleted)
+        fields = line.split(None, 5)
+        if len(fields) < 6:
+            continue
+        path = fields[5][:-len(DELETED_MARKER)]
+        if path.startswith(STALE_PATH_PREFIXES):
+            deleted.add(path.decode('utf-8', 'replace'))
+    return pid, sorted(deleted)
+
+
+def list_pids() -> List[int]:
+    """PIDs de todos os processos (exceto o próprio monitor)"""
+    own = os.getpid()
+    return [int(name) for name in os.listdir(PROC) if name.isdigit() and int(name) != own]
+
+
+def scan_stale_libraries(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Processos com bibliotecas/executáveis removidos, agrupados por unidade systemd
+
+    Returns:
+        Dicionário com contagens, unidades a reiniciar e pacotes envolvidos
+    """
+    workers = config.get("monitoring", {}).get("stale_library_workers", DEFAULT_WORKERS)
+
+    try:
+        pids = list_pids()
+    except OSError as e:
+        return {"error": str(e)}
+
+    unreadable = 0
+    affected = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for pid, deleted in pool.map(read_deleted_mappings, pids):
+            if deleted is None:
+                unreadable += 1
+            elif deleted:
+                affected[pid] = deleted
+
+    all_files = sorted({path for deleted in affected.values() for path in deleted})
+    owners = find_file_owners(all_files, config)
+
+    # Agrupar por unidade systemd (processos fora de unidades ficam por PID)
+    groups = {}
+    for pid, deleted in affected.items():
+        info = get_process_info(pid)
+        key = info["unit"] or f"pid:{pid}"
+        group = groups.setdefault(key, {
+            "unit": info["unit"],
+            "processes": [],
+            "files": set(),
+            "packages": set()
+        })
+        group["processes"].append({"pid": pid, "name": info["name"]})
+        group["files"].update(deleted)
+        group["packages"].update(owners[path] for path in deleted if owners.get(path))
+
+    entries = []
+    for group in groups.values():
+        files = sorted(group["files"])
+        entries.append({
+            "unit": group["unit"],
+            "processes": group["processes"][:MAX_REPORTED_FILES_PER_ENTRY],
+            "process_count": len(group["processes"]),
+            "files": files[:MAX_REPORTED_FILES_PER_ENTRY],
+            "file_count": len(files),
+            "packages": sorted(group["packages"])
+        })
+    entries.sort(key=lambda e: (e["unit"] is None, -e["process_count"]))
+
+    result = {
+        "processes_scanned": len(pids) - unreadable,
+        "unreadable_processes": unreadable,
+        "affected_processes": len(affected),
+        "affected_units": sorted(e["unit"] for e in entries if e["unit"]),
+        "entries": entries[:MAX_REPORTED_UNITS]
+    }
+    if unreadable and not affected and os.geteuid() != 0:
+        result["warning"] = "Sem permissão para ler /proc/<pid>/maps de outros usuários. Execute com sudo."
+    return result
@@ -0,0 +1,70 @@
+"""
+Módulo de persistência de estado entre execuções do monitor
+"""
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, Any
+
+
+def get_default_state_dir() -> str:
+    """Retorna diretório padrão para estado persistido"""
+    return str(Path.home() / ".bin/data/scripts-data/reports/security/state")
+
+
+def get_state_dir(config: Dict[str, Any]) -> Path:
+    """
+    Retorna (e cria se necessário) o diretório de estado
+
+    Prioridade: ENV SECURITY_MONITOR_STATE > config.json (state_dir) > default
+    """
+    state_dir = Path(os.getenv(
+        'SECURITY_MONITOR_STATE',
+        config.get('state_dir', get_default_state_dir())
+    )).expanduser()
+    state_dir.mkdir(parents=True, exist_ok=True)
+    return state_dir
+
+
+def get_state_path(config: Dict[str, Any], filename: str) -> Path:
+    """Retorna caminho de um arquivo dentro do diretório de estado"""
+    return get_state_dir(config) / filename
+
+
+def load_state(config: Dict[str, Any], name: str, default: Any = None) -> Any:
+    """
+    Carrega estado JSON salvo em execução anterior
+
+    Args:
+        config: Configuração do monitor
+        name: Nome lógico do estado (vira <name>.json)
+        default: Valor retornado se não existir ou estiver corrompido
+    """
+    path = get_state_path(config, f"{name}.json")
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return default
+
+
+def save_state(config: Dict[str, Any], name: str, data: Any) -> None:
+    """Salva estado JSON de forma atômica (arquivo temporário + rename)"""
+    path = get_state_path(config, f"{name}.json")
+    atomic_write(path, json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8', 'backslashreplace'))
+
+
+def atomic_write(path: Path, content: bytes) -> None:
+    """Escreve arquivo de forma atômica no mesmo diretório do destino"""
+    fd, tmp_path = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
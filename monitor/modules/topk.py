@@ -0,0 +1,94 @@
+"""
+Contagem aproximada dos itens mais frequentes em memória limitada
+"""
+import heapq
+from typing import Dict, List, Any, Optional, Tuple
+
+
+class SpaceSaving:
+    """
+    Algoritmo Space-Saving (Metwally et al.) com no máximo `capacity` contadores
+
+    Quando a tabela está cheia, um item novo herda o contador do menos
+    frequente (que é descartado) e registra esse valor como erro máximo.
+    Todo item com frequência real acima de total/capacity está garantidamente
+    na tabela, e count - error é um limite inferior da frequência real.
+    """
+
+    def __init__(self, capacity: int = 1000, counters: Optional[Dict[str, List[int]]] = None):
+        self.capacity = capacity
+        self.counters = counters if counters is not None else {}
+        # Heap de mínimos preguiçoso: entradas podem estar defasadas (contagem menor
+        # que a atual) e são corrigidas só quando chegam ao topo
+        self._heap = None
+
+    def __len__(self) -> int:
+        return len(self.counters)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.counters
+
+    def _pop_min(self) -> Tuple[str, int]:
+        if self._heap is None or len(self._heap) > 4 * self.capacity:
+            self._heap = [(entry[0], key) for key, entry in self.counters.items()]
+            heapq.heapify(self._heap)
+
+        while True:
+            count, key = heapq.heappop(self._heap)
+            entry = self.counters.get(key)
+            if entry is None:
+                continue
+            if entry[0] != count:
+                heapq.heappush(self._heap, (entry[0], key))
+                continue
+            del self.counters[key]
+            return key, count
+
+    def add(self, key: str, count: int = 1) -> Optional[str]:
+        """
+        Conta `count` ocorrências do item
+
+        Returns:
+            Item descartado para abrir espaço (ou None)
+        """
+        entry = self.counters.get(key)
+        if entry is not None:
+            entry[0] += count
+            return None
+
+        if len(self.counters) < self.capacity:
+            self.counters[key] = [count, 0]
+            evicted = None
+        else:
+            evicted, min_count = self._pop_min()
+            self.counters[key] = [min_count + count, min_count]
+
+        if self._heap is not None:
+            heapq.heappush(self._heap, (self.counters[key][0], key))
+        return evicted
+
+    def top(self, n: int = 10) -> List[Tuple[str, int, int]]:
+        """Retorna os n itens mais frequentes como (item, contagem, erro)"""
+        ranked = sorted(self.counters.items(), key=lambda x: x[1][0], reverse=True)[:n]
+        return [(key, entry[0], entry[1]) for key, entry in ranked]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serializa para JSON"""
+        return {"capacity": self.capacity, "counters": self.counters}
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]], capacity: int = 1000) -> 'SpaceSaving':
+        """Restaura tabela serializada (ou cria uma vazia se ausente/inválida)"""
+        if not data:
+            return cls(capacity)
+
+        try:
+            counters = {str(k): [int(v[0]), int(v[1])] for k, v in data["counters"].items()}
+        except (KeyError, ValueError, TypeError, IndexError, AttributeError):
+            return cls(capacity)
+
+        table = cls(capacity, counters)
+        # Capacidade reduzida na configuração: descarta os menos frequentes
+        while len(table.counters) > capacity:
+            table._pop_min()
+        return table
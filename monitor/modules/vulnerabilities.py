@@ -1,13 +1,62 @@
 """
 Módulo de verificação de vulnerabilidades e atualizações de segurança
 """
+import os
 import subprocess
 import re
-from typing import Dict, List, Any
+import time
+from datetime import datetime
+from typing import Dict, List, Any, Optional
 
+from .advisories import get_applicable_advisories, ensure_advisory_index, find_updateinfo_files, ADVISORY_CACHE_DIRS, INDEX_FILE
+from .dnf_history import read_update_history
+from .package_changes import track_package_changes
+from .packages import get_installed_packages, newest_package, rpmdb_signature
+from .stale_libraries import scan_stale_libraries
+from .state import load_state, save_state, get_state_path
 
-def get_security_updates() -> Dict[str, Any]:
-    """Obtém atualizações de segurança disponíveis"""
+
+def match_installed_advisories(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Casa os pacotes instalados contra o índice local de avisos
+
+    Returns:
+        Dicionário com advisories (lista ou None se o índice não está disponível) e index
+    """
+    try:
+        installed = get_installed_packages(config)
+    except (OSError, RuntimeError, subprocess.TimeoutExpired) as e:
+        return {"advisories": None, "index": {"error": f"Inventário de pacotes indisponível: {e}"}}
+
+    advisories, index = get_applicable_advisories(config, installed)
+    return {"advisories": advisories, "index": index}
+
+
+def get_security_updates(advisories: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """
+    Obtém atualizações de segurança disponíveis
+
+    Com avisos já casados pelo índice local, só filtra os de segurança;
+    sem eles, consulta o dnf.
+    """
+    if advisories is None:
+        return _get_security_updates_dnf()
+
+    available = [
+        {"advisory": advisory["advisory"], "severity": advisory["severity"], "package": package}
+        for advisory in advisories if advisory["type"] == "security"
+        for package in advisory["packages"]
+    ]
+    return {
+        "available": available,
+        "count": len(available),
+        "advisories": len({a["advisory"] for a in available}),
+        "source": "index"
+    }
+
+
+def _get_security_updates_dnf() -> Dict[str, Any]:
+    """Obtém atualizações de segurança disponíveis via dnf updateinfo"""
     security_updates = {
         "available": [],
         "count": 0
@@ -16,7 +65,7 @@ def get_security_updates() -> Dict[str, Any]:
     try:
         # Verificar atualizações de segurança via DNF
         result = subprocess.run(
-            ['dnf', 'updateinfo', 'list', 'security', '--available'],
+            ['dnf', 'updateinfo', 'list', 'security', '--available', '--cacheonly'],
             capture_output=True,
             text=True,
             timeout=60
@@ -49,7 +98,7 @@ def get_security_updates() -> Dict[str, Any]:
 
 
 def get_all_updates() -> Dict[str, Any]:
-    """Obtém todas as atualizações disponíveis"""
+    """Obtém todas as atualizações disponíveis (a partir dos metadados em cache, sem rede)"""
     updates = {
         "total_packages": 0,
         "packages": []
@@ -57,7 +106,7 @@ def get_all_updates() -> Dict[str, Any]:
     
     try:
         result = subprocess.run(
-            ['dnf', 'check-update', '--quiet'],
+            ['dnf', 'check-update', '--quiet', '--cacheonly'],
             capture_output=True,
             text=True,
             timeout=60
@@ -87,7 +136,7 @@ def get_all_updates() -> Dict[str, Any]:
     return updates
 
 
-def check_kernel_version() -> Dict[str, Any]:
+def check_kernel_version(config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     """Verifica se o kernel está atualizado"""
     kernel_info = {
         "running": "",
@@ -97,33 +146,20 @@ def check_kernel_version() -> Dict[str, Any]:
     
     try:
         # Kernel em execução
-        result = subprocess.run(
-            ['uname', '-r'],
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
-        if result.returncode == 0:
-            kernel_info["running"] = result.stdout.strip()
+        kernel_info["running"] = os.uname().release
         
-        # Último kernel instalado
-        result = subprocess.run(
-            ['rpm', '-q', '--last', 'kernel'],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
+        # Kernel mais novo instalado (inventário do rpmdb, sem subir o rpm)
+        packages = get_installed_packages(config)
+        kernels = [p for p in packages if p["name"] == "kernel"] or \
+                  [p for p in packages if p["name"] == "kernel-core"]
+        latest = newest_package(kernels)
         
-        if result.returncode == 0:
-            lines = result.stdout.strip().split('\n')
-            if lines:
-                # Primeira linha é o mais recente
-                latest = lines[0].split()[0]
-                kernel_info["latest_installed"] = latest.replace('kernel-', '')
-                
-                # Verificar se precisa reiniciar
-                if kernel_info["running"] not in kernel_info["latest_installed"]:
-                    kernel_info["reboot_required"] = True
+        if latest:
+            kernel_info["latest_installed"] = f"{latest['version']}-{latest['release']}.{latest['arch']}"
+            
+            # Verificar se precisa reiniciar
+            if kernel_info["running"] != kernel_info["latest_installed"]:
+                kernel_info["reboot_required"] = True
                     
     except Exception as e:
         kernel_info["error"] = str(e)
@@ -131,14 +167,27 @@ def check_kernel_version() -> Dict[str, Any]:
     return kernel_info
 
 
-def check_vulnerable_packages() -> List[Dict[str, Any]]:
+def check_vulnerable_packages(advisories: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
     """Verifica pacotes com vulnerabilidades conhecidas"""
+    if advisories is not None:
+        return [
+            {
+                "advisory": advisory["advisory"],
+                "type": advisory["severity"] + "/Sec.",
+                "severity": advisory["severity"],
+                "packages": " ".join(advisory["packages"]),
+                "fixed_in": advisory["fixed_in"],
+                "cves": advisory["cves"]
+            }
+            for advisory in advisories if advisory["type"] == "security"
+        ][:50]
+    
     vulnerable = []
     
     try:
         # Usar dnf updateinfo para listar CVEs
         result = subprocess.run(
-            ['dnf', 'updateinfo', 'list', 'sec', '--available'],
+            ['dnf', 'updateinfo', 'list', 'sec', '--available', '--cacheonly'],
             capture_output=True,
             text=True,
             timeout=60
@@ -163,39 +212,19 @@ def check_vulnerable_packages() -> List[Dict[str, Any]]:
     return vulnerable[:50]  # Limitar a 50
 
 
-def get_system_age() -> Dict[str, Any]:
-    """Calcula há quanto tempo o sistema não é atualizado"""
-    from datetime import datetime
-    
-    age_info = {
-        "last_update": None,
-        "days_since_update": None
-    }
-    
-    try:
-        # Verificar timestamp do último update do DNF
-        result = subprocess.run(
-            ['dnf', 'history', '--reverse', '|', 'head', '-n', '1'],
-            capture_output=True,
-            text=True,
-            shell=True,
-            timeout=15
-        )
-        
-        if result.returncode == 0:
-            lines = result.stdout.strip().split('\n')
-            # Procurar por linhas com data
-            for line in lines:
-                if '|' in line and any(char.isdigit() for char in line):
-                    parts = line.split('|')
-                    if len(parts) >= 3:
-                        date_str = parts[2].strip()
-                        age_info["last_update"] = date_str
-                        break
-    except Exception as e:
-        age_info["error"] = str(e)
-    
-    return age_info
+def get_system_age(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Calcula há quanto tempo o sistema não é atualizado
+
+    Lê o banco de histórico do dnf diretamente (sem subir o dnf). O índice
+    local de avisos, quando existe, permite reconhecer a última atualização
+    de segurança mesmo sem --security na linha de comando.
+    """
+    advisory_db = str(get_state_path(config, INDEX_FILE))
+    if not os.path.exists(advisory_db):
+        advisory_db = None
+
+    return read_update_history(config, advisory_db)
 
 
 def check_automatic_updates() -> Dict[str, Any]:
@@ -235,21 +264,145 @@ def check_automatic_updates() -> Dict[str, Any]:
     return auto_update
 
 
+PREFETCH_STATE = "vulnerability_prefetch"
+
+# Tempo máximo para o dnf atualizar os metadados no prefetch (depende dos espelhos)
+DEFAULT_PREFETCH_TIMEOUT = 600
+
+
+def refresh_metadata(timeout: int = DEFAULT_PREFETCH_TIMEOUT) -> Dict[str, Any]:
+    """Atualiza os metadados dos repositórios (única etapa que acessa a rede)"""
+    refresh = {"ok": False}
+    started = time.time()
+    
+    try:
+        result = subprocess.run(
+            ['dnf', 'makecache', '--quiet'],
+            capture_output=True,
+            text=True,
+            timeout=timeout
+        )
+        refresh["ok"] = result.returncode == 0
+        if result.returncode != 0:
+            refresh["error"] = result.stderr.strip()[-500:] or f"dnf makecache retornou {result.returncode}"
+    except subprocess.TimeoutExpired:
+        refresh["error"] = f"Timeout ({timeout}s) ao atualizar metadados"
+    except FileNotFoundError:
+        refresh["error"] = "DNF não encontrado"
+    
+    refresh["duration_seconds"] = round(time.time() - started, 1)
+    return refresh
+
+
+def prefetch_vulnerability_data(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Atualiza metadados e pré-calcula os resultados que dependem do dnf
+    
+    Executado fora da auditoria (--prefetch, via timer/cron): a auditoria
+    passa a só ler o que foi salvo aqui e o índice de avisos, então sua
+    duração não depende mais da velocidade dos espelhos.
+    """
+    timeout = config.get("monitoring", {}).get("prefetch_timeout", DEFAULT_PREFETCH_TIMEOUT)
+    now = datetime.now()
+    
+    previous = load_state(config, PREFETCH_STATE, default={}) or {}
+    prefetched = {
+        "timestamp": now.isoformat(),
+        "timestamp_unix": int(now.timestamp()),
+        "metadata_refresh": refresh_metadata(timeout)
+    }
+    # A idade dos dados conta a partir da última atualização que deu certo
+    if prefetched["metadata_refresh"]["ok"]:
+        prefetched["refreshed_unix"] = prefetched["timestamp_unix"]
+    elif previous.get("refreshed_unix"):
+        prefetched["refreshed_unix"] = previous["refreshed_unix"]
+    
+    index = ensure_advisory_index(config)
+    prefetched["advisory_index"] = {
+        key: index[key] for key in ("repos", "rebuilt", "stats", "error") if key in index
+    }
+    prefetched["all_updates"] = get_all_updates()
+    # Transações do rpm depois do prefetch invalidam all_updates
+    prefetched["rpmdb_signature"] = rpmdb_signature(config)
+    
+    save_state(config, PREFETCH_STATE, prefetched)
+    return prefetched
+
+
+def get_update_data_freshness(config: Dict[str, Any], prefetched: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Idade dos dados de atualização usados pela auditoria"""
+    if prefetched and prefetched.get("refreshed_unix"):
+        return {
+            "source": "prefetch",
+            "prefetched_at": prefetched.get("timestamp"),
+            "refreshed_at": datetime.fromtimestamp(prefetched["refreshed_unix"]).isoformat(),
+            "metadata_refresh_ok": prefetched.get("metadata_refresh", {}).get("ok", False),
+            "age_hours": round((time.time() - prefetched["refreshed_unix"]) / 3600, 1)
+        }
+    
+    # Sem prefetch: idade do updateinfo mais novo em cache (mantido pelo dnf-makecache.timer)
+    files = find_updateinfo_files(config.get("monitoring", {}).get("advisory_cache_dirs", ADVISORY_CACHE_DIRS))
+    if not files:
+        return {"source": "none", "age_hours": None}
+    
+    newest = max(f["mtime_ns"] for f in files) / 1e9
+    return {
+        "source": "dnf_cache",
+        "refreshed_at": datetime.fromtimestamp(newest).isoformat(),
+        "age_hours": round((time.time() - newest) / 3600, 1)
+    }
+
+
 def collect_vulnerability_metrics(config: Dict[str, Any]) -> Dict[str, Any]:
-    """Coleta todas as métricas de vulnerabilidades"""
+    """
+    Coleta todas as métricas de vulnerabilidades
+    
+    Não acessa a rede: usa os resultados do último --prefetch (quando
+    existem), o índice local de avisos e o cache do dnf.
+    """
     metrics = {}
     
+    prefetched = None
+    if config.get("monitoring", {}).get("use_prefetch", True):
+        prefetched = load_state(config, PREFETCH_STATE, default=None)
+    metrics["data_freshness"] = get_update_data_freshness(config, prefetched)
+    
+    # Índice local de avisos (uma consulta serve às duas verificações abaixo)
+    advisories = None
+    if config.get("monitoring", {}).get("use_advisory_index", True) and (
+            config.get("monitoring", {}).get("check_security_updates", True) or
+            config.get("monitoring", {}).get("check_vulnerable_packages", True)):
+        matched = match_installed_advisories(config)
+        advisories = matched["advisories"]
+        metrics["advisory_index"] = matched["index"]
+    
     if config.get("monitoring", {}).get("check_security_updates", True):
-        metrics["security_updates"] = get_security_updates()
+        metrics["security_updates"] = get_security_updates(advisories)
     
     if config.get("monitoring", {}).get("check_all_updates", True):
-        metrics["all_updates"] = get_all_updates()
+        # Depois de um dnf upgrade a lista do prefetch traria atualizações já instaladas
+        if prefetched and "all_updates" in prefetched and \
+                prefetched.get("rpmdb_signature") == rpmdb_signature(config):
+            metrics["all_updates"] = prefetched["all_updates"]
+        else:
+            if prefetched and "all_updates" in prefetched:
+                metrics["data_freshness"]["rpmdb_changed_since_prefetch"] = True
+            metrics["all_updates"] = get_all_updates()
     
     if config.get("monitoring", {}).get("check_kernel", True):
-        metrics["kernel"] = check_kernel_version()
+        metrics["kernel"] = check_kernel_version(config)
     
     if config.get("monitoring", {}).get("check_vulnerable_packages", True):
-        metrics["vulnerable_packages"] = check_vulnerable_packages()
+        metrics["vulnerable_packages"] = check_vulnerable_packages(advisories)
+    
+    if config.get("monitoring", {}).get("check_stale_libraries", True):
+        metrics["stale_libraries"] = scan_stale_libraries(config)
+    
+    if config.get("monitoring", {}).get("track_package_changes", True):
+        metrics["package_changes"] = track_package_changes(config)
+    
+    if config.get("monitoring", {}).get("check_update_history", True):
+        metrics["system_age"] = get_system_age(config)
     
     if config.get("monitoring", {}).get("check_automatic_updates", True):
         metrics["automatic_updates"] = check_automatic_updates()
@@ -260,7 +413,13 @@ def collect_vulnerability_metrics(config: Dict[str, Any]) -> Dict[str, Any]:
         "total_updates_available": metrics.get("all_updates", {}).get("total_packages", 0),
         "reboot_required": metrics.get("kernel", {}).get("reboot_required", False),
         "automatic_updates_enabled": metrics.get("automatic_updates", {}).get("configured", False),
-        "has_critical_vulnerabilities": metrics.get("security_updates", {}).get("count", 0) > 0
+        "has_critical_vulnerabilities": metrics.get("security_updates", {}).get("count", 0) > 0,
+        "update_data_age_hours": metrics["data_freshness"].get("age_hours"),
+        "processes_need_restart": metrics.get("stale_libraries", {}).get("affected_processes", 0),
+        "days_since_update": metrics.get("system_age", {}).get("days_since_update"),
+        "days_since_security_update": metrics.get("system_age", {}).get("days_since_security_update"),
+        "updates_last_30_days": metrics.get("system_age", {}).get("updates_last_30_days"),
+        "packages_changed": metrics.get("package_changes", {}).get("changed", False)
     }
     
     return metrics
@@ -0,0 +1,272 @@
+"""
+Módulo de monitoramento contínuo de permissões (inotify)
+
+Em vez de repetir a varredura de /etc e dos diretórios de binários, o
+watcher registra as raízes das verificações de permissões no inotify
+(recursivamente) e os diretórios dos arquivos críticos, recebe eventos de
+atributo e criação e reavalia só o caminho tocado: SUID/SGID, world-writable
+e permissões dos arquivos críticos. Um alerta sai assim que um caminho passa
+a violar uma regra que não violava antes (SUID legítimos já existentes na
+varredura inicial não geram alerta).
+
+A varredura completa vira uma checagem de consistência rara
+(watch_full_scan_hours), feita também quando a fila do inotify transborda.
+"""
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import signal
+import struct
+import time
+from datetime import datetime
+from typing import Dict, List, Any, Callable, Optional, Set
+
+from .fs_scanner import build_scan_plan, checks_for_path, evaluate_path
+from .permissions import CRITICAL_FILES, check_critical_file, run_scan
+
+
+# Máscaras de <sys/inotify.h>
+IN_ATTRIB = 0x00000004
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_EXCL_UNLINK = 0x04000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o0004000
+
+WATCH_MASK = IN_ATTRIB | IN_CREATE | IN_MOVED_TO | IN_DELETE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW | IN_EXCL_UNLINK
+
+# struct inotify_event: int wd; uint32 mask, cookie, len; char name[len]
+EVENT_HEADER = struct.Struct("iIII")
+
+# Verificações de modo acompanhadas pelo watcher (dono desconhecido exige varrer /home inteiro)
+WATCH_CHECKS = ["suid", "sgid", "world_writable"]
+
+DEFAULT_FULL_SCAN_HOURS = 24
+
+RULE_MESSAGES = {
+    "suid": ("critical", "Arquivo passou a ter SUID"),
+    "sgid": ("critical", "Arquivo passou a ter SGID"),
+    "world_writable": ("warning", "Arquivo passou a ser world-writable"),
+    "critical_permissions": ("critical", "Permissão insegura em arquivo crítico")
+}
+
+
+class Inotify:
+    """Interface mínima ao inotify via ctypes (sem dependências externas)"""
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_CLOEXEC | IN_NONBLOCK)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+    def add_watch(self, path: str, mask: int = WATCH_MASK) -> int:
+        """Registra um diretório; retorna o descritor do watch"""
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), ctypes.c_uint32(mask))
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return wd
+
+    def read_events(self) -> List[tuple]:
+        """Eventos pendentes como (wd, mask, nome)"""
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset + EVENT_HEADER.size <= len(data):
+                wd, mask, _cookie, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+                events.append((wd, mask, os.fsdecode(name)))
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class PermissionWatcher:
+    """Reavalia caminhos das raízes de permissões a cada evento do inotify"""
+
+    def __init__(self, config: Dict[str, Any], emit: Callable[[Dict[str, Any]], None]):
+        self.config = config
+        self.emit = emit
+        self.plan = build_scan_plan(config, WATCH_CHECKS)
+        self.inotify = Inotify()
+        self.watches = {}
+        self.known = {}
+        self.watch_errors = 0
+        self.seeded = False
+        self.full_scan_requested = True
+
+    def _add_tree(self, root: str) -> List[str]:
+        """Registra o diretório e os subdiretórios; retorna os diretórios registrados"""
+        added = []
+        stack = [root]
+        while stack:
+            path = stack.pop()
+            try:
+                wd = self.inotify.add_watch(path)
+            except OSError as e:
+                # ENOSPC: limite fs.inotify.max_user_watches atingido
+                self.watch_errors += 1
+                if e.errno == errno.ENOSPC:
+                    return added
+                continue
+            self.watches[wd] = path
+            added.append(path)
+            try:
+                with os.scandir(path) as it:
+                    stack.extend(entry.path for entry in it if entry.is_dir(follow_symlinks=False))
+            except OSError:
+                pass
+        return added
+
+    def setup(self) -> Dict[str, Any]:
+        """Registra as raízes e os diretórios dos arquivos críticos"""
+        for root in sorted(self.plan):
+            if os.path.isdir(root) and not os.path.islink(root):
+                self._add_tree(root)
+        for parent in sorted({os.path.dirname(path) for path in CRITICAL_FILES}):
+            if parent not in self.watches.values() and os.path.isdir(parent):
+                try:
+                    self.watches[self.inotify.add_watch(parent)] = parent
+                except OSError:
+                    self.watch_errors += 1
+        return {"watches": len(self.watches), "errors": self.watch_errors}
+
+    def evaluate(self, path: str) -> Set[str]:
+        """Regras violadas pelo caminho agora"""
+        hits = set(evaluate_path(path, checks_for_path(self.plan, path) & set(WATCH_CHECKS)))
+        if path in CRITICAL_FILES:
+            check = check_critical_file(path)
+            if check is not None and check.get("severity") == "critical":
+                hits.add("critical_permissions")
+        return hits
+
+    def _update(self, path: str, hits: Set[str]) -> None:
+        """Atualiza o estado conhecido e alerta sobre violações novas"""
+        new = hits - self.known.get(path, set())
+        if hits:
+            self.known[path] = hits
+        else:
+            self.known.pop(path, None)
+
+        for rule in sorted(new):
+            severity, message = RULE_MESSAGES[rule]
+            try:
+                st = os.lstat(path)
+                details = {"path": path, "rule": rule, "mode": oct(st.st_mode), "uid": st.st_uid, "gid": st.st_gid}
+            except OSError:
+                details = {"path": path, "rule": rule}
+            self.emit({
+                "timestamp": datetime.now().isoformat(),
+                "category": "permissions",
+                "severity": severity,
+                "message": f"{message}: {path}",
+                "recommendation": "Confirme a origem da mudança (rpm -V, ausearch -f) e reverta se não for esperada",
+                "details": details
+            })
+
+    def full_scan(self) -> None:
+        """Varredura completa: reconcilia o estado conhecido (e alerta sobre o que o inotify perdeu)"""
+        # Sem o índice incremental: é a checagem de consistência (e o índice é da auditoria)
+        scan = run_scan(self.config, WATCH_CHECKS)
+        found = {}
+        for check in WATCH_CHECKS:
+            for entry in scan["results"].get(check, []):
+                found.setdefault(entry["path"], set()).add(check)
+        for path in CRITICAL_FILES:
+            if "critical_permissions" in self.evaluate(path):
+                found.setdefault(path, set()).add("critical_permissions")
+
+        # Primeira varredura só estabelece o que já existia
+        if not self.seeded:
+            self.known = found
+            self.seeded = True
+        else:
+            for path in set(self.known) | set(found):
+                self._update(path, found.get(path, set()))
+        self.full_scan_requested = False
+
+    def handle_events(self) -> int:
+        """Processa os eventos pendentes; retorna quantos caminhos foram reavaliados"""
+        touched = set()
+        for wd, mask, name in self.inotify.read_events():
+            if mask & IN_Q_OVERFLOW:
+                self.full_scan_requested = True
+                continue
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            directory = self.watches.get(wd)
+            if directory is None:
+                continue
+            path = os.path.join(directory, name) if name else directory
+
+            # Diretório novo dentro de uma raiz: registrar e avaliar o que já foi criado nele
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO) and checks_for_path(self.plan, path):
+                for added in self._add_tree(path):
+                    try:
+                        with os.scandir(added) as it:
+                            touched.update(entry.path for entry in it if not entry.is_dir(follow_symlinks=False))
+                    except OSError:
+                        pass
+            touched.add(path)
+
+        for path in touched:
+            self._update(path, self.evaluate(path))
+        return len(touched)
+
+    def run(self, should_stop: Callable[[], bool]) -> None:
+        """Laço principal: eventos do inotify e varredura completa periódica"""
+        hours = self.config.get("monitoring", {}).get("watch_full_scan_hours", DEFAULT_FULL_SCAN_HOURS)
+        poller = select.poll()
+        poller.register(self.inotify.fd, select.POLLIN)
+        next_full = 0.0
+
+        while not should_stop():
+            if self.full_scan_requested or time.monotonic() >= next_full:
+                self.full_scan()
+                next_full = time.monotonic() + hours * 3600
+            if poller.poll(1000):
+                self.handle_events()
+
+    def close(self) -> None:
+        self.inotify.close()
+
+
+def run_watcher(config: Dict[str, Any], emit: Callable[[Dict[str, Any]], None],
+                on_ready: Optional[Callable[[Dict[str, Any]], None]] = None) -> None:
+    """
+    Executa o watcher até SIGINT/SIGTERM
+
+    Args:
+        emit: Recebe cada alerta (mesmo formato dos alertas do relatório, com timestamp)
+        on_ready: Chamado com {watches, errors} depois do registro das raízes
+    """
+    stop = []
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.append(True))
+
+    watcher = PermissionWatcher(config, emit)
+    try:
+        ready = watcher.setup()
+        if on_ready is not None:
+            on_ready(ready)
+        watcher.run(lambda: bool(stop))
+    finally:
+        watcher.close()
@@ -15,7 +15,8 @@ from typing import Dict, List, Any
 # Adicionar o diretório modules ao path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from modules import ports, auth, firewall, vulnerabilities, network, permissions, alerts
+from modules import ports, auth, firewall, vulnerabilities, network, permissions, alerts, ipmeta, exposure, integrity, watcher, procinfo
+from modules.firewall_query import build_query_engine, parse_port_spec
 
 
 def get_default_output_dir() -> str:
@@ -52,6 +53,9 @@ def collect_all_metrics(config: Dict[str, Any]) -> Dict[str, Any]:
     
     metrics = {}
     
+    # Cache de processos vale só para a coleta atual (compartilhado entre portas e bibliotecas)
+    procinfo.clear_process_cache()
+    
     # Coletar métricas de portas e serviços
     print("  🔌 Portas e serviços...")
     try:
@@ -100,6 +104,24 @@ def collect_all_metrics(config: Dict[str, Any]) -> Dict[str, Any]:
         print(f"    ⚠️  Erro: {e}")
         metrics["permissions"] = {"error": str(e)}
     
+    # Cruzar sockets em escuta com a política do firewall
+    if config.get("monitoring", {}).get("check_exposure", True) and "error" not in metrics.get("ports", {}):
+        print("  🧭 Exposição real das portas (sockets × firewall)...")
+        try:
+            metrics["exposure"] = exposure.build_exposure_matrix(metrics, config)
+        except Exception as e:
+            print(f"    ⚠️  Erro: {e}")
+            metrics["exposure"] = {"error": str(e)}
+    
+    # Enriquecer IPs do relatório com ASN/país a partir da base local de prefixos
+    if config.get("monitoring", {}).get("ip_prefix_db"):
+        print("  🗺️  Metadados de IPs (ASN/país)...")
+        try:
+            enrichment = ipmeta.enrich_metrics(metrics, config)
+            print(f"    {enrichment.get('ips_matched', 0)}/{enrichment.get('ips_looked_up', 0)} IPs identificados")
+        except Exception as e:
+            print(f"    ⚠️  Erro: {e}")
+    
     return metrics
 
 
@@ -218,16 +240,20 @@ def _get_hostname() -> str:
         return "unknown"
 
 
-def save_report(report: Dict[str, Any], config: Dict[str, Any]) -> str:
-    """Salva relatório em arquivo JSON"""
-    # Prioridade: ENV > config.json > default
+def get_output_dir(config: Dict[str, Any]) -> Path:
+    """Diretório dos relatórios (prioridade: ENV > config.json > default)"""
     output_dir_str = os.getenv(
         'SECURITY_MONITOR_OUTPUT',
         config.get('output_dir', get_default_output_dir())
     )
     
     # Expandir ~ se presente
-    output_dir = Path(output_dir_str).expanduser()
+    return Path(output_dir_str).expanduser()
+
+
+def save_report(report: Dict[str, Any], config: Dict[str, Any]) -> str:
+    """Salva relatório em arquivo JSON"""
+    output_dir = get_output_dir(config)
     
     # Criar diretório se não existir
     output_dir.mkdir(parents=True, exist_ok=True)
@@ -237,8 +263,8 @@ def save_report(report: Dict[str, Any], config: Dict[str, Any]) -> str:
     filename = f"security_{timestamp}.json"
     filepath = output_dir / filename
     
-    # Salvar JSON
-    with open(filepath, 'w', encoding='utf-8') as f:
+    # Salvar JSON (nomes de arquivo que não são UTF-8 viram escapes \udcXX válidos em JSON)
+    with open(filepath, 'w', encoding='utf-8', errors='backslashreplace') as f:
         json.dump(report, f, indent=2, ensure_ascii=False)
     
     return str(filepath)
@@ -324,6 +350,134 @@ def print_summary(report: Dict[str, Any]):
     print("\n" + "="*70)
 
 
+def _load_firewall_state(config: Dict[str, Any], report_path: str = None) -> Dict[str, Any]:
+    """
+    Métricas de firewall e portas para o motor de consultas
+    
+    Usa o relatório indicado, ou o mais recente do diretório de saída; sem
+    relatório, coleta um snapshot novo do firewall (uma única chamada).
+    """
+    if report_path is None:
+        reports = sorted(get_output_dir(config).glob("security_*.json"))
+        report_path = str(reports[-1]) if reports else None
+    
+    if report_path:
+        with open(report_path, 'r', encoding='utf-8') as f:
+            metrics = json.load(f).get("metrics", {})
+        if "firewall" in metrics:
+            print(f"📄 Política do firewall lida de: {report_path}")
+            return metrics
+    
+    print("🛡️  Coletando política do firewall...")
+    return {
+        "firewall": firewall.collect_firewall_metrics(config),
+        "ports": {"listening_ports": ports.get_listening_ports()}
+    }
+
+
+def run_firewall_queries(args: argparse.Namespace, config: Dict[str, Any]) -> int:
+    """Responde consultas "a porta X é acessível a partir de Y?" e sai"""
+    metrics = _load_firewall_state(config, args.fw_report)
+    engine = build_query_engine(metrics["firewall"])
+    
+    results = []
+    for source, port_spec in args.fw_query or []:
+        spec = parse_port_spec(port_spec)
+        if spec is None:
+            print(f"❌ Porta inválida: {port_spec}")
+            return 1
+        results.append(engine.query(source, spec[0], spec[1]))
+    
+    if args.fw_matrix:
+        with open(args.fw_matrix, 'r') as f:
+            networks = [
+                line.split('#', 1)[0].strip() for line in f
+                if line.split('#', 1)[0].strip()
+            ]
+        listeners = sorted({
+            (p["port"], p["protocol"])
+            for p in metrics.get("ports", {}).get("listening_ports", [])
+            if "error" not in p and not exposure.is_loopback_address(p.get("local_address", ""))
+        })
+        results.extend(engine.query_many(networks, listeners))
+    
+    icons = {"allowed": "🔴", "partial": "🟡", "denied": "🟢"}
+    for result in results:
+        zones = ", ".join(z["zone"] for z in result.get("zones", [])) or "-"
+        target = f"{result['port']}/{result['protocol']}"
+        print(f"  {icons.get(result['decision'], '❓')} {result['source']:<24} "
+              f"{target:<10} {result['decision']:<8} zonas: {zones}")
+        if "error" in result:
+            print(f"     ⚠️  {result['error']}")
+    
+    return 0
+
+
+def run_prefetch(config: Dict[str, Any]) -> int:
+    """Executa o prefetch de metadados/avisos e imprime o resultado"""
+    print("📥 Atualizando metadados do dnf e índice de avisos...")
+    prefetched = vulnerabilities.prefetch_vulnerability_data(config)
+    
+    refresh = prefetched["metadata_refresh"]
+    if refresh["ok"]:
+        print(f"   ✅ Metadados atualizados em {refresh['duration_seconds']}s")
+    else:
+        print(f"   ⚠️  Falha ao atualizar metadados: {refresh.get('error')}")
+    
+    index = prefetched["advisory_index"]
+    if "error" in index:
+        print(f"   ⚠️  Índice de avisos: {index['error']}")
+    else:
+        state = "reconstruído" if index.get("rebuilt") else "já atualizado"
+        print(f"   ✅ Índice de avisos {state} ({len(index.get('repos', []))} repositórios)")
+    
+    print(f"   📦 Atualizações disponíveis: {prefetched['all_updates'].get('total_packages', 0)}")
+    return 0 if refresh["ok"] and "error" not in index else 1
+
+
+def run_integrity_accept(config: Dict[str, Any]) -> int:
+    """Recalcula a integridade e aceita o estado atual como linha de base"""
+    print("🔏 Verificando integridade antes de aceitar a nova linha de base...")
+    result = permissions.check_file_integrity(config)
+    if "error" in result:
+        print(f"   ❌ {result['error']}")
+        return 1
+    
+    counts = result["counts"]
+    print(f"   Alterados: {counts['modified']}  Novos: {counts['added']}  Removidos: {counts['removed']}")
+    for entry in result["modified"][:20]:
+        print(f"     ~ {entry['path']} ({', '.join(entry['changes'])})")
+    
+    total = integrity.accept_integrity_baseline(config)
+    print(f"   ✅ Linha de base atualizada ({total} arquivos)")
+    return 0
+
+
+def run_watch(config: Dict[str, Any]) -> int:
+    """Modo daemon: alertas de permissão em tempo real via inotify"""
+    log_path = get_output_dir(config) / "watch_alerts.jsonl"
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    
+    def emit(alert: Dict[str, Any]) -> None:
+        line = json.dumps(alert, ensure_ascii=False).encode('utf-8', 'backslashreplace').decode('utf-8')
+        print(line, flush=True)
+        with open(log_path, 'a', encoding='utf-8') as f:
+            f.write(line + "\n")
+    
+    def on_ready(ready: Dict[str, Any]) -> None:
+        print(f"👁️  Monitorando {ready['watches']} diretórios (alertas em {log_path})", file=sys.stderr, flush=True)
+        if ready["errors"]:
+            print(f"   ⚠️  {ready['errors']} diretório(s) não registrados "
+                  "(permissão ou fs.inotify.max_user_watches)", file=sys.stderr, flush=True)
+    
+    try:
+        watcher.run_watcher(config, emit, on_ready)
+    except OSError as e:
+        print(f"❌ inotify indisponível: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
 def main():
     """Função principal"""
     # Parser de argumentos
@@ -337,8 +491,58 @@ def main():
         default=None
     )
     
+    parser.add_argument(
+        '--prefetch',
+        action='store_true',
+        help='Atualiza metadados do dnf e o índice de avisos em segundo plano (para timer/cron) e sai'
+    )
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help='Modo daemon: monitora as raízes de permissões via inotify e emite alertas (JSON por linha) até SIGTERM'
+    )
+    parser.add_argument(
+        '--integrity-accept',
+        action='store_true',
+        help='Aceita o estado atual dos arquivos monitorados como nova linha de base de integridade e sai'
+    )
+    parser.add_argument(
+        '--fw-query',
+        nargs=2,
+        action='append',
+        metavar=('ORIGEM', 'PORTA[/PROTO]'),
+        help='Consulta se a porta é acessível a partir da origem (CIDR, IP ou "any"); pode repetir'
+    )
+    parser.add_argument(
+        '--fw-matrix',
+        type=str,
+        metavar='ARQUIVO',
+        help='Avalia todas as portas em escuta contra as redes do arquivo (um CIDR por linha)'
+    )
+    parser.add_argument(
+        '--fw-report',
+        type=str,
+        metavar='RELATORIO',
+        help='Relatório JSON com a política do firewall (padrão: o mais recente)',
+        default=None
+    )
+    
     args = parser.parse_args()
     
+    # Prefetch: única etapa que acessa a rede; a auditoria só lê o resultado
+    if args.prefetch:
+        sys.exit(run_prefetch(load_config()))
+    
+    if args.watch:
+        sys.exit(run_watch(load_config()))
+    
+    if args.integrity_accept:
+        sys.exit(run_integrity_accept(load_config()))
+    
+    # Consultas ao firewall: respondem e saem sem executar a auditoria
+    if args.fw_query or args.fw_matrix:
+        sys.exit(run_firewall_queries(args, load_config()))
+    
     print("🔒 Security Monitor - Iniciando auditoria de segurança...")
     if args.session:
         print(f"   🔗 Modo sessão: {args.session}")
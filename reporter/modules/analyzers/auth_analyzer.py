@@ -3,6 +3,7 @@
 Auth Analyzer - Analisa autenticação, logins e uso de sudo
 """
 
+import ipaddress
 from typing import Dict, Any
 from .base_analyzer import BaseAnalyzer
 
@@ -22,7 +23,8 @@ class AuthAnalyzer(BaseAnalyzer):
         failed_logins = auth_data.get('failed_logins', [])
         brute_force = auth_data.get('brute_force_analysis', {})
         successful_logins = auth_data.get('successful_logins', [])
-        sudo_usage = auth_data.get('sudo_usage', [])
+        sudo_usage = self._normalize_sudo(auth_data.get('sudo_usage', {}))
+        login_anomalies = auth_data.get('login_anomalies', {}).get('anomalies', [])
         
         brute_force_detected = brute_force.get('brute_force_detected', False)
         suspicious_ips = brute_force.get('suspicious_ips', [])
@@ -50,6 +52,8 @@ class AuthAnalyzer(BaseAnalyzer):
         
         # Detalhes
         details = self._generate_details(failed_logins, successful_logins, sudo_usage)
+        for anomaly in login_anomalies[:5]:
+            details.append(f"Login incomum: {anomaly.get('user')} via {anomaly.get('auth_method')} de {anomaly.get('source_ip')}")
         
         # Recomendações
         recommendations = self._generate_recommendations(brute_force_detected, failed_logins, suspicious_ips)
@@ -66,11 +70,40 @@ class AuthAnalyzer(BaseAnalyzer):
                 'brute_force_detected': brute_force_detected,
                 'suspicious_ips': len(suspicious_ips),
                 'successful_logins': len(successful_logins),
-                'sudo_commands': len(sudo_usage)
+                'login_anomalies': len(login_anomalies),
+                'sudo_commands': sudo_usage.get('total_events', 0),
+                'sudo_new_commands': len(sudo_usage.get('new_commands', []))
             }
         }
     
-    def _generate_message(self, failed: list, brute_force: dict, sudo: list) -> str:
+    def _normalize_sudo(self, sudo_usage) -> dict:
+        """Converte formato antigo (lista de comandos) para o formato estruturado por usuário"""
+        if isinstance(sudo_usage, dict):
+            return sudo_usage
+        
+        by_user = {}
+        for cmd in sudo_usage or []:
+            if not isinstance(cmd, dict) or 'error' in cmd:
+                continue
+            user = cmd.get('user', 'unknown')
+            command = (cmd.get('command') or 'unknown').split()[0]
+            commands = by_user.setdefault(user, {})
+            commands[command] = commands.get(command, 0) + 1
+        
+        return {
+            'total_events': sum(sum(c.values()) for c in by_user.values()),
+            'by_user': [
+                {
+                    'user': user,
+                    'events': sum(commands.values()),
+                    'top_commands': [{'command': c, 'count': n} for c, n in commands.items()]
+                }
+                for user, commands in by_user.items()
+            ],
+            'new_commands': []
+        }
+    
+    def _generate_message(self, failed: list, brute_force: dict, sudo: dict) -> str:
         """Gera análise sobre autenticação"""
         
         brute_force_detected = brute_force.get('brute_force_detected', False)
@@ -82,7 +115,13 @@ class AuthAnalyzer(BaseAnalyzer):
             msg += "Este é um padrão típico de ataque automatizado tentando adivinhar credenciais. "
             
             if suspicious_ips:
-                msg += f"\n\nIPs mais agressivos: {', '.join(suspicious_ips[:3])}. "
+                msg += f"\n\nIPs mais agressivos: {', '.join(ip.get('ip', '?') for ip in suspicious_ips[:3])}. "
+            
+            suspicious_prefixes = brute_force.get('suspicious_prefixes', [])
+            if suspicious_prefixes:
+                msg += f"\n\nTambém foi detectado um **ataque distribuído**: {len(suspicious_prefixes)} rede(s) "
+                msg += "com muitos IPs diferentes fazendo poucas tentativas cada, padrão típico de botnets. "
+                msg += f"Redes mais ativas: {', '.join(p.get('prefix', '?') for p in suspicious_prefixes[:3])}. "
             
             msg += "\n\n**Ação Imediata Necessária**: Bloqueie esses IPs no firewall e considere implementar fail2ban "
             msg += "para proteção automática contra ataques de força bruta."
@@ -102,17 +141,26 @@ class AuthAnalyzer(BaseAnalyzer):
             msg += "Isso indica que não há atividade suspeita de tentativa de acesso não autorizado ao sistema."
         
         # Análise de sudo
-        if sudo:
-            msg += f"\n\n**Uso de Sudo**: Foram registrados **{len(sudo)} comandos executados com privilégios elevados**. "
+        sudo_total = sudo.get('total_events', 0)
+        if sudo_total:
+            msg += f"\n\n**Uso de Sudo**: Foram registrados **{sudo_total} comandos executados com privilégios elevados**"
+            msg += f" por {self._pluralize(len(sudo.get('by_user', [])), 'usuário')}. "
             
             # Analisar padrões
-            users = set(cmd.get('user', 'unknown') for cmd in sudo)
-            if 'root' in users:
+            targets = set(t for u in sudo.get('by_user', []) for t in u.get('target_users', {}))
+            if 'root' in targets:
                 msg += "Alguns comandos foram executados diretamente como root. "
             
+            new_commands = sudo.get('new_commands', [])
+            if new_commands:
+                msg += f"⚠️ **{self._pluralize(len(new_commands), 'comando inédito', 'comandos inéditos')}** "
+                msg += "(nunca executados antes pelo mesmo usuário) apareceram no histórico. "
+            
             # Verificar comandos suspeitos
             suspicious_cmds = ['rm -rf', 'chmod 777', 'chown', '/etc/passwd', '/etc/shadow']
-            has_suspicious = any(any(susp in cmd.get('command', '') for susp in suspicious_cmds) for cmd in sudo)
+            command_lines = [c.get('command', '') for u in sudo.get('by_user', []) for c in u.get('top_commands', [])]
+            command_lines += [' '.join(n.get('argv', [])) for n in new_commands]
+            has_suspicious = any(any(susp in line for susp in suspicious_cmds) for line in command_lines)
             
             if has_suspicious:
                 msg += "⚠️ **Atenção**: Foram detectados comandos potencialmente perigosos executados com sudo. Revise o histórico."
@@ -121,7 +169,7 @@ class AuthAnalyzer(BaseAnalyzer):
         
         return msg
     
-    def _generate_details(self, failed: list, successful: list, sudo: list) -> list:
+    def _generate_details(self, failed: list, successful: list, sudo: dict) -> list:
         """Gera detalhes adicionais"""
         details = []
         
@@ -139,19 +187,32 @@ class AuthAnalyzer(BaseAnalyzer):
         if successful:
             details.append(f"Logins bem-sucedidos: {len(successful)}")
         
-        if sudo:
+        if sudo.get('by_user'):
             # Comandos mais comuns
             commands = {}
-            for cmd in sudo:
-                command = cmd.get('command', '').split()[0]  # Pegar só o comando base
-                commands[command] = commands.get(command, 0) + 1
+            for user_stats in sudo.get('by_user', []):
+                for cmd in user_stats.get('top_commands', []):
+                    command = cmd.get('command', 'unknown')
+                    commands[command] = commands.get(command, 0) + cmd.get('count', 0)
             
             if commands:
                 top_cmd = max(commands.items(), key=lambda x: x[1])
                 details.append(f"Comando sudo mais usado: {top_cmd[0]} ({top_cmd[1]}x)")
+            
+            for new_cmd in sudo.get('new_commands', [])[:3]:
+                details.append(f"Comando sudo inédito: {new_cmd.get('user')} → {new_cmd.get('command')}")
         
         return details
     
+    @staticmethod
+    def _rich_rule_family(address: str) -> str:
+        """Família da rich rule do firewalld (ipv4/ipv6) para um IP ou prefixo"""
+        try:
+            return f"ipv{ipaddress.ip_network(address, strict=False).version}"
+        except ValueError:
+            # Endereço anonimizado pelo sanitizer: decide pelo separador
+            return "ipv6" if ":" in (address or "") else "ipv4"
+    
     def _generate_recommendations(self, brute_force: bool, failed: list, suspicious_ips: list) -> list:
         """Gera recomendações de segurança"""
         recommendations = []
@@ -165,12 +226,13 @@ class AuthAnalyzer(BaseAnalyzer):
             })
             
             if suspicious_ips:
-                ips_str = ' '.join(suspicious_ips[:5])
+                first_ip = suspicious_ips[0].get('ip')
                 recommendations.append({
                     'title': 'Bloquear IPs Atacantes no Firewall',
                     'description': f'Bloqueie imediatamente os IPs suspeitos identificados.',
                     'priority': 'critical',
-                    'command': f'sudo firewall-cmd --permanent --add-rich-rule="rule family=ipv4 source address={suspicious_ips[0]} reject"'
+                    'command': f'sudo firewall-cmd --permanent --add-rich-rule="rule family={self._rich_rule_family(first_ip)} '
+                               f'source address={first_ip} reject"'
                 })
         
         if len(failed) > 0:
@@ -57,9 +57,51 @@ class FirewallAnalyzer(BaseAnalyzer):
             details.append(f"Firewall: firewalld ativo")
         if selinux_mode:
             details.append(f"SELinux: {selinux_mode}")
+        if selinux_data.get('policy', 'unknown') != 'unknown':
+            policy = f"Política SELinux: {selinux_data['policy']}"
+            if selinux_data.get('policy_version'):
+                policy += f" (versão {selinux_data['policy_version']})"
+            if selinux_data.get('modules', {}).get('total'):
+                policy += f", {selinux_data['modules']['total']} módulos"
+            details.append(policy)
+        if selinux_data.get('booleans', {}).get('total'):
+            booleans = selinux_data['booleans']
+            details.append(f"Booleanos SELinux: {booleans.get('enabled', 0)} de {booleans['total']} ativos")
+        if selinux_data.get('mode_matches_config') is False:
+            details.append(f"SELinux configurado como {selinux_data.get('config_mode')} em /etc/selinux/config")
         if zones:
             details.append(f"Zonas configuradas: {len(zones)}")
         
+        nftables = firewall_data.get('nftables', {})
+        if nftables.get('total_rules'):
+            details.append(f"nftables: {nftables['total_rules']} regras em {nftables.get('chains', 0)} chains")
+            if nftables.get('shadowed_count'):
+                details.append(f"Regras nftables sombreadas (nunca alcançadas): {nftables['shadowed_count']}")
+            if nftables.get('duplicates_count'):
+                details.append(f"Regras nftables duplicadas: {nftables['duplicates_count']}")
+            if nftables.get('broad_rules_count'):
+                details.append(f"Regras nftables muito amplas: {nftables['broad_rules_count']}")
+        
+        avc = firewall_data.get('selinux_avc', {})
+        if avc.get('denials'):
+            details.append(
+                f"Negações SELinux desde a última execução: {avc['denials']} "
+                f"({avc.get('distinct_denials', 0)} distintas, {avc.get('new_denials_count', 0)} novas)"
+            )
+        for denial in avc.get('top_denials', [])[:5]:
+            details.append(
+                f"AVC {denial.get('count', 0)}x: {denial.get('comm') or '?'} {denial.get('permission')} "
+                f"{denial.get('tclass')} ({denial.get('scontext')} → {denial.get('tcontext')})"
+            )
+        
+        changes = firewall_data.get('changes', {})
+        if changes.get('default_zone'):
+            details.append(
+                f"Zona padrão alterada: {changes['default_zone'].get('from')} → {changes['default_zone'].get('to')}"
+            )
+        for change in changes.get('zones', []):
+            details.append(self._describe_zone_change(change))
+        
         # Recomendações
         recommendations = self._generate_recommendations(firewall_active, selinux_mode)
         
@@ -73,10 +115,41 @@ class FirewallAnalyzer(BaseAnalyzer):
             'metrics': {
                 'firewall_active': firewall_active,
                 'selinux_mode': selinux_mode,
-                'zones_count': len(zones)
+                'zones_count': len(zones),
+                'nft_shadowed_rules': nftables.get('shadowed_count', 0),
+                'nft_broad_rules': nftables.get('broad_rules_count', 0),
+                'changed_zones': changes.get('changed_zones', 0),
+                'selinux_denials': avc.get('denials', 0)
             }
         }
     
+    def _describe_zone_change(self, change: Dict[str, Any]) -> str:
+        """Resumo de uma linha da mudança de zona desde a execução anterior"""
+        zone = change.get('zone', 'unknown')
+        if change.get('change') == 'added':
+            return f"Zona {zone} criada desde a última execução"
+        if change.get('change') == 'removed':
+            return f"Zona {zone} removida desde a última execução"
+        
+        parts = []
+        if 'target' in change:
+            parts.append(f"target {change['target'].get('from')} → {change['target'].get('to')}")
+        if 'masquerade' in change:
+            parts.append(f"masquerade {'ativado' if change['masquerade'].get('to') else 'desativado'}")
+        for field, label in (('services', 'serviços'), ('ports', 'portas'), ('rich_rules', 'rich rules'),
+                             ('sources', 'origens'), ('interfaces', 'interfaces'), ('protocols', 'protocolos'),
+                             ('source_ports', 'portas de origem'), ('forward_ports', 'redirecionamentos'),
+                             ('icmp_blocks', 'bloqueios ICMP')):
+            if field in change:
+                added = change[field].get('added', [])
+                removed = change[field].get('removed', [])
+                if added:
+                    parts.append(f"+{label}: {', '.join(added)}")
+                if removed:
+                    parts.append(f"-{label}: {', '.join(removed)}")
+        
+        return f"Zona {zone} alterada: " + "; ".join(parts)
+    
     def _generate_message(self, firewall: bool, selinux: str, zones: list) -> str:
         """Gera mensagem sobre firewall"""
         
@@ -42,6 +42,44 @@ class PermissionsAnalyzer(BaseAnalyzer):
             f"World-writable: {len(world_writable)}"
         ]
         
+        if perms_data.get('scan', {}).get('index', {}).get('possibly_stale'):
+            details.append("Varredura incremental: chmod em arquivos já existentes só aparece na próxima verificação completa")
+        
+        changes = perms_data.get('permission_changes', [])
+        if changes:
+            details.append(f"Novos/alterados com SUID/SGID/world-writable desde a última varredura: {len(changes)}")
+            for change in changes[:10]:
+                previous = f" (antes {change['previous_permissions']})" if change.get('previous_permissions') else ''
+                details.append(f"  {change.get('path')}: {change.get('permissions')}{previous}")
+        
+        integrity = perms_data.get('integrity', {})
+        if integrity.get('baseline_created'):
+            details.append(f"Integridade: linha de base criada ({integrity.get('files_monitored', 0)} arquivos)")
+        elif integrity.get('counts'):
+            counts = integrity['counts']
+            details.append(
+                f"Integridade ({integrity.get('files_monitored', 0)} arquivos): {counts.get('modified', 0)} alterado(s), "
+                f"{counts.get('added', 0)} novo(s), {counts.get('removed', 0)} removido(s)"
+            )
+            for entry in integrity.get('modified', [])[:10]:
+                details.append(f"  ~ {entry['path']} ({', '.join(entry.get('changes', []))})")
+            for entry in integrity.get('added', [])[:5]:
+                details.append(f"  + {entry['path']}")
+            for path in integrity.get('removed', [])[:5]:
+                details.append(f"  - {path}")
+        
+        verification = perms_data.get('suid_verification', {})
+        if verification.get('counts'):
+            counts = verification['counts']
+            details.append(
+                f"SUID/SGID contra o rpmdb ({verification.get('files_checked', 0)} arquivos): "
+                f"{counts.get('unowned', 0)} sem pacote dono, {counts.get('modified', 0)} diferente(s) do pacote"
+            )
+            for entry in verification.get('unowned', [])[:10]:
+                details.append(f"  ? {entry['path']} ({entry.get('permissions')})")
+            for entry in verification.get('modified', [])[:10]:
+                details.append(f"  ~ {entry['path']} [{entry.get('package')}] ({', '.join(entry.get('problems', []))})")
+        
         recommendations = self._generate_recommendations(suid_files, world_writable)
         
         return {
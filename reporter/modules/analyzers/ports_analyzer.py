@@ -20,7 +20,12 @@ class PortsAnalyzer(BaseAnalyzer):
         ports_data = self._get_metric('ports', default={})
         
         listening_ports = ports_data.get('listening_ports', [])
-        suspicious_ports = ports_data.get('suspicious_ports', [])
+        # Portas suspeitas bloqueadas pelo firewall (gravidade info) não contam como expostas
+        suspicious_ports = [
+            p for p in ports_data.get('suspicious_ports', [])
+            if isinstance(p, dict) and p.get('severity', 'warning') in ('critical', 'warning')
+        ]
+        exposure = self._get_metric('exposure', default={})
         connections = ports_data.get('established_connections', {})
         network_services = ports_data.get('network_services', [])
         
@@ -29,10 +34,14 @@ class PortsAnalyzer(BaseAnalyzer):
         total_connections = connections.get('total', 0)
         
         # Determinar status
-        if total_suspicious > 0:
+        if any(p.get('severity') == 'critical' for p in suspicious_ports):
             status = 'critical'
             status_text = '🚨 PORTAS SUSPEITAS DETECTADAS'
             severity = 'critical'
+        elif total_suspicious > 0:
+            status = 'warning'
+            status_text = '⚠️ PORTAS SUSPEITAS COM ACESSO RESTRITO'
+            severity = 'high'
         elif total_listening > 10:
             status = 'warning'
             status_text = '⚠️ MUITAS PORTAS ABERTAS'
@@ -51,6 +60,13 @@ class PortsAnalyzer(BaseAnalyzer):
         
         # Detalhes
         details = self._generate_details(listening_ports, connections)
+        by_exposure = exposure.get('by_exposure', {}) if isinstance(exposure, dict) else {}
+        if by_exposure:
+            details.append(
+                f"Exposição real (firewall considerado): {by_exposure.get('public', 0)} públicas, "
+                f"{by_exposure.get('restricted', 0)} restritas, {by_exposure.get('blocked', 0)} bloqueadas, "
+                f"{by_exposure.get('local', 0)} locais"
+            )
         
         # Recomendações
         recommendations = self._generate_recommendations(listening_ports, suspicious_ports, network_services)
@@ -55,6 +55,42 @@ class VulnerabilitiesAnalyzer(BaseAnalyzer):
             f"Auto-update: {'✅ Ativo' if auto_enabled else '❌ Inativo'}"
         ]
         
+        system_age = vuln_data.get('system_age', {})
+        if system_age.get('days_since_update') is not None:
+            details.append(f"Última atualização: há {system_age['days_since_update']} dia(s)")
+            if system_age.get('days_since_security_update') is not None:
+                details.append(f"Última atualização de segurança: há {system_age['days_since_security_update']} dia(s)")
+            details.append(f"Atualizações nos últimos 30 dias: {system_age.get('updates_last_30_days', 0)}")
+        
+        package_changes = vuln_data.get('package_changes', {})
+        last_change = package_changes.get('last_change') or {}
+        if last_change.get('counts'):
+            counts = last_change['counts']
+            when = 'desde a auditoria anterior' if package_changes.get('changed') else f"em {last_change.get('timestamp', '?')[:16]}"
+            details.append(
+                f"Mudanças de pacotes {when}: {counts.get('installed', 0)} instalado(s), "
+                f"{counts.get('removed', 0)} removido(s), {counts.get('upgraded', 0)} atualizado(s), "
+                f"{counts.get('downgraded', 0)} rebaixado(s)"
+            )
+            for change in last_change.get('upgraded', [])[:5]:
+                details.append(f"  ⬆ {change['name']}.{change['arch']}: {change['from']} → {change['to']}")
+            for change in last_change.get('downgraded', [])[:5]:
+                details.append(f"  ⬇ {change['name']}.{change['arch']}: {change['from']} → {change['to']}")
+            for nevra in last_change.get('installed', [])[:5]:
+                details.append(f"  + {nevra}")
+            for nevra in last_change.get('removed', [])[:5]:
+                details.append(f"  - {nevra}")
+        
+        stale = vuln_data.get('stale_libraries', {})
+        if stale.get('affected_processes'):
+            details.append(
+                f"Processos com bibliotecas removidas (precisam reiniciar): {stale['affected_processes']}"
+            )
+            for entry in stale.get('entries', [])[:5]:
+                target = entry.get('unit') or ', '.join(p.get('name', '?') for p in entry.get('processes', []))
+                packages = ', '.join(entry.get('packages', [])[:3]) or 'pacote desconhecido'
+                details.append(f"  {target}: {entry.get('file_count', 0)} arquivo(s) de {packages}")
+        
         recommendations = self._generate_recommendations(updates_available, security_updates, auto_enabled)
         
         return {
@@ -67,7 +103,9 @@ class VulnerabilitiesAnalyzer(BaseAnalyzer):
             'metrics': {
                 'updates_available': updates_available,
                 'security_updates': security_updates,
-                'auto_update_enabled': auto_enabled
+                'auto_update_enabled': auto_enabled,
+                'processes_need_restart': stale.get('affected_processes', 0),
+                'days_since_update': system_age.get('days_since_update')
             }
         }
     
@@ -67,6 +67,8 @@ class DataSanitizer:
         for key, value in metrics.items():
             if key == "ports":
                 sanitized[key] = self._sanitize_ports(value)
+            elif key == "exposure":
+                sanitized[key] = self._sanitize_exposure(value)
             elif key == "authentication":
                 sanitized[key] = self._sanitize_authentication(value)
             elif key == "network":
@@ -107,6 +109,25 @@ class DataSanitizer:
         
         return sanitized
     
+    def _sanitize_exposure(self, exposure_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Sanitiza matriz de exposição (endereços locais e origens liberadas)"""
+        if not isinstance(exposure_data, dict):
+            return exposure_data
+        
+        sanitized = deepcopy(exposure_data)
+        
+        for entry in sanitized.get("matrix", []):
+            if isinstance(entry, dict):
+                if "local_address" in entry:
+                    entry["local_address"] = self._anonymize_ip(entry["local_address"], is_local=True)
+                for grant in entry.get("allowed_by", []):
+                    grant["sources"] = [
+                        source if source == "any" else self._anonymize_ip(source.split('/')[0], is_local=False)
+                        for source in grant.get("sources", [])
+                    ]
+        
+        return sanitized
+    
     def _sanitize_authentication(self, auth_data: Dict[str, Any]) -> Dict[str, Any]:
         """Sanitiza dados de autenticação (usernames e IPs)"""
         if not isinstance(auth_data, dict):
@@ -132,11 +153,38 @@ class DataSanitizer:
                     if "source_ip" in login:
                         login["source_ip"] = self._anonymize_ip(login["source_ip"], is_local=False)
         
-        # Sanitizar sudo_usage
-        if "sudo_usage" in sanitized:
-            for sudo in sanitized["sudo_usage"]:
-                if isinstance(sudo, dict) and "user" in sudo:
+        # Sanitizar login_anomalies
+        login_anomalies = sanitized.get("login_anomalies")
+        if isinstance(login_anomalies, dict):
+            for anomaly in login_anomalies.get("anomalies", []):
+                if isinstance(anomaly, dict):
+                    if "user" in anomaly:
+                        anomaly["user"] = self._anonymize_username(anomaly["user"])
+                    if "source_ip" in anomaly:
+                        anomaly["source_ip"] = self._anonymize_ip(anomaly["source_ip"], is_local=False)
+                    if "source_prefix" in anomaly:
+                        anomaly["source_prefix"] = self._anonymize_ip(anomaly["source_prefix"].split('/')[0], is_local=False)
+        
+        # Sanitizar sudo_usage (formato estruturado por usuário ou lista antiga)
+        sudo_usage = sanitized.get("sudo_usage")
+        if isinstance(sudo_usage, dict):
+            sudo_entries = sudo_usage.get("by_user", []) + sudo_usage.get("new_commands", [])
+        else:
+            sudo_entries = sudo_usage or []
+        for sudo in sudo_entries:
+            if isinstance(sudo, dict):
+                if "user" in sudo:
                     sudo["user"] = self._anonymize_username(sudo["user"])
+                if "target_user" in sudo:
+                    sudo["target_user"] = self._anonymize_username(sudo["target_user"])
+                if isinstance(sudo.get("target_users"), dict):
+                    sudo["target_users"] = {
+                        self._anonymize_username(target): count for target, count in sudo["target_users"].items()
+                    }
+                if "cwd" in sudo:
+                    sudo["cwd"] = self._sanitize_path(sudo["cwd"])
+                if "argv" in sudo:
+                    sudo["argv"] = [self._sanitize_path(arg) for arg in sudo["argv"]]
         
         # Sanitizar active_sessions
         if "active_sessions" in sanitized:
@@ -159,6 +207,15 @@ class DataSanitizer:
                             ip_data["users_attempted"] = [
                                 self._anonymize_username(u) for u in ip_data["users_attempted"]
                             ]
+            if isinstance(bf, dict) and "suspicious_prefixes" in bf:
+                for prefix_data in bf["suspicious_prefixes"]:
+                    if isinstance(prefix_data, dict):
+                        if "prefix" in prefix_data:
+                            prefix_data["prefix"] = self._anonymize_ip(prefix_data["prefix"], is_local=False)
+                        if "users_attempted" in prefix_data:
+                            prefix_data["users_attempted"] = [
+                                self._anonymize_username(u) for u in prefix_data["users_attempted"]
+                            ]
         
         return sanitized
     